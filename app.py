@@ -3,15 +3,29 @@ from supabase import create_client, Client
 from sqlalchemy import create_engine, text
 from flask_cors import CORS
 from auth.user import get_user_id
+from catalog.snapshot import get_catalog_snapshot
+from recs.cursor import encode_cursor, decode_cursor
+from recs.cache import RankedResultCache, ranked_page, score_values
+from recs.data import UserContextLoader
+from recs.interactions import get_user_recommendations
+from catalog.details import MAX_BATCH_KEYS, PropertyCache, apartment_detail
+from catalog.geo import MAX_RADIUS_MILES, check_coordinates
+from catalog.amenities import detail_filters
+from catalog.search import get_search_index
+from catalog.facets import describe as describe_facets
+from catalog.fields import FIELD_SETS, build_card, card_sql, parse_fields
+from web.encoder import FastJSONProvider, NDJSON_MIMETYPE, ndjson_response
+from recs.versions import get_version_stamps, make_etag
+from recs.registry import ModelRegistry
+import itertools
 import traceback
 import os
 from dotenv import dotenv_values
 import json
-from joblib import load
-import pandas as pd
 
 app = Flask(__name__)
-CORS(app, resources={r'/*': {'origins': '*'}})
+app.json = FastJSONProvider(app)
+CORS(app, resources={r'/*': {'origins': '*'}}, expose_headers=['X-Next-Cursor', 'ETag'])
 
 config = {
     **dotenv_values(".env"),  # load development variables
@@ -20,122 +34,370 @@ config = {
 
 supabase = create_client(config['SUPABASE_URL'], config['SUPABASE_KEY'])
 engine = create_engine(config['SQLALCHEMY_DATABASE_URL'])
-
-def get_recs_query(prefs, user_id, page, limit):
+ranked_cache = RankedResultCache.from_config(config)
+user_context = UserContextLoader(engine, prefs_ttl=int(config.get('PREFS_CACHE_TTL', 60)))
+model_registry = ModelRegistry(
+    engine,
+    artifact_dir=config.get('MODEL_ARTIFACT_DIR', 'artifacts'),
+    fallback_path=config.get('KNN_INDEX_PATH', 'knn_index'),
+    backend=config.get('KNN_BACKEND', 'exact'),
+    poll_interval=int(config.get('MODEL_POLL_INTERVAL', 30)),
+)
+property_cache = PropertyCache(max_entries=int(config.get('PROPERTY_CACHE_SIZE', 512)))
+
+def get_recs_query(prefs, user_id, page, limit, cursor=None, fields=None, stream=False):
     """
     Generate and execute a raw SQL query to find property recommendations based on user preferences.
 
     Args:
         prefs (dict): User preferences including weights for miles, square footage, and rent,
-                      as well as filters for campus name, maximum rent, and minimum square footage.
+                      as well as filters for campus name, maximum rent, and minimum square footage,
+                      and optionally `amenities`, `beds` and `min_beds` (see `get_detail_filters`).
         user_id (str): User ID.
-        page (int): Page number for pagination.
+        page (int): Page number for pagination. Ignored when a cursor is given.
         limit (int): Number of items per page.
+        cursor (tuple, optional): Decoded (score, rental_key) position to resume after.
+        fields (list of str, optional): Card fields to project. Defaults to the `card` field set.
+        stream (bool): Return a generator reading rows from a server-side cursor instead of a list.
 
     Returns:
-        list of dicts: List of recommended properties with details and calculated scores.
+        list of dicts: Recommended units with `property_id`, `rental_key`, the projected `card`,
+                       `score` and `isSaved`.
     """
+    if fields is None:
+        fields = FIELD_SETS['card']
+
     offset = (page - 1) * limit
+    seek = ''
+    if cursor is not None:
+        offset = 0
+        if cursor[0] is None:
+            seek = 'AND weighted_score IS NULL AND rental_key > :cursor_key'
+        else:
+            seek = '''AND (
+                weighted_score < :cursor_score
+                OR weighted_score IS NULL
+                OR (weighted_score = :cursor_score AND rental_key > :cursor_key)
+            )'''
+
+    detail_filter = ''
+    if prefs.get('amenities'):
+        detail_filter += 'AND amenities @> CAST(:amenities AS VARCHAR[])'
+    if prefs.get('beds') and prefs.get('min_beds') is not None:
+        detail_filter += ' AND (beds = ANY(:beds) OR beds >= :min_beds)'
+    elif prefs.get('beds'):
+        detail_filter += ' AND beds = ANY(:beds)'
+    elif prefs.get('min_beds') is not None:
+        detail_filter += ' AND beds >= :min_beds'
+
     query = text(f'''
         SELECT
             p.id AS property_id,
-            p.data AS property_data,
-            rental_object,
-            (
-                ({prefs.get("miles_weight", 0.5)} * -1 * 1000 * (c.college->>'miles')::float) +
-                ({prefs.get("sqft_weight", 0.5)} * 1 * 800 * (rental_object->>'squareFeet')::int) +
-                ({prefs.get("rent_weight", 0.5)} * -1 * (rental_object->>'rent')::int)
-            ) AS weighted_score,
+            ru.rental_key,
+            {card_sql(fields)} AS card,
+            ru.weighted_score,
             CASE WHEN ua.rental_key IS NOT NULL
                 THEN 1
                 ELSE 0
             END AS isSaved
-        FROM
-            properties p,
-            jsonb_array_elements(p.data->'schools'->'colleges') AS c(college)
-        CROSS JOIN LATERAL
-            jsonb_array_elements(p.data->'rentals') AS rental_object
+        FROM (
+            SELECT *
+            FROM (
+                SELECT
+                    property_id,
+                    rental_key,
+                    rental_index,
+                    (
+                        (:miles_weight * -1 * 1000 * miles) +
+                        (:sqft_weight * 1 * 800 * sqft) +
+                        (:rent_weight * -1 * rent)
+                    ) AS weighted_score
+                FROM
+                    rental_units
+                WHERE
+                    campus = :campus
+                    AND rent <= :max_rent
+                    AND sqft >= :min_sqft
+                    {detail_filter}
+            ) scored
+            WHERE TRUE
+                {seek}
+            ORDER BY weighted_score DESC NULLS LAST, rental_key
+            LIMIT :limit
+            OFFSET :offset
+        ) ru
+        JOIN
+            properties p ON p.id = ru.property_id
         LEFT JOIN
-            user_apartment ua ON CAST(rental_object->>'key' AS VARCHAR) = ua.rental_key AND ua.user_id = '{user_id}'
-        WHERE
-            c.college @> '{{"name": "{prefs.get("campus", "Texas A&M University")}"}}'
-            AND (rental_object->>'rent')::int <= {prefs.get("max_rent", 10000)}
-            AND (rental_object->>'squareFeet')::int >= {prefs.get("min_sqft", 0)}
-        ORDER BY weighted_score DESC
-        LIMIT {limit}
-        OFFSET {offset};
+            user_apartment ua ON ru.rental_key = ua.rental_key AND ua.user_id = :user_id
+        ORDER BY ru.weighted_score DESC NULLS LAST, ru.rental_key;
     ''')
+    params = {
+        'miles_weight': prefs.get("miles_weight", 0.5),
+        'sqft_weight': prefs.get("sqft_weight", 0.5),
+        'rent_weight': prefs.get("rent_weight", 0.5),
+        'campus': prefs.get("campus", "Texas A&M University"),
+        'max_rent': prefs.get("max_rent", 10000),
+        'min_sqft': prefs.get("min_sqft", 0),
+        'user_id': user_id,
+        'limit': limit,
+        'offset': offset,
+        'amenities': prefs.get('amenities'),
+        'beds': prefs.get('beds'),
+        'min_beds': prefs.get('min_beds'),
+    }
+    if cursor is not None:
+        params['cursor_score'], params['cursor_key'] = cursor
+
+    def rows():
+        with engine.connect() as connection:
+            for row in connection.execution_options(stream_results=True).execute(query, params):
+                yield {
+                    "property_id": row[0],
+                    "rental_key": row[1],
+                    "card": row[2],
+                    "score": row[3],
+                    "isSaved": bool(row[4]),
+                }
+
+    return rows() if stream else list(rows())
+
+def get_recs_snapshot(prefs, user_id, page, limit, cursor=None, saved_keys=None, fields=None, stream=False, user_version=None):
+    """
+    Rank recommendations against the in-memory catalog snapshot and fetch only the page's rows.
 
-    with engine.connect() as connection:
-        result = connection.execute(query).fetchall()
+    The top of the ranking for the user's preferences is kept in `ranked_cache`, so later pages
+    are slices of it; pages past the cached depth are ranked from the cursor. The database is
+    only asked for the card fields of the page's units, and for the user's saved keys when they
+    are not cached.
+
+    Args:
+        prefs (dict): User preferences, as for `get_recs_query`.
+        user_id (str): User ID.
+        page (int): Page number for pagination. Ignored when a cursor is given.
+        limit (int): Number of items per page.
+        cursor (tuple, optional): Decoded (score, rental_key) position to resume after.
+        saved_keys (set of str, optional): The user's saved rental keys, if already loaded.
+        fields (list of str, optional): Card fields to project. Defaults to the `card` field set.
+        stream (bool): Return a generator of rows instead of a list. The card query runs before
+                       it is returned, so a failure still raises here and not mid-response.
+        user_version (int, optional): The user's state version, so cached saved keys that
+                                      predate it are reloaded.
+
+    Returns:
+        list of dicts: Same shape as `get_recs_query`.
+    """
+    snapshot = get_catalog_snapshot(engine)
+
+    ranking = ranked_cache.get(user_id, prefs, snapshot.version)
+    if ranking is None:
+        units, scores = snapshot.rank(prefs, ranked_cache.depth)
+        ranking = ranked_cache.put(user_id, prefs, snapshot.version, units, scores)
 
-    data = []
-    for row in result:
-        row_data = {
-            "property_id": row[0],
-            "property_data": row[1],
-            "rental_object": row[2],
-            "score": row[3],
-            "isSaved": bool(row[4]),
-        }
+    units, scores = ranked_page(ranking, snapshot, prefs, page, limit, cursor)
+
+    if saved_keys is None:
+        saved_keys = ranked_cache.get_saved(user_id, user_version)
+        if saved_keys is None:
+            saved_keys = get_saved_keys(user_id)
+            ranked_cache.put_saved(user_id, saved_keys, user_version)
+    else:
+        ranked_cache.put_saved(user_id, saved_keys, user_version)
 
-        data.append(row_data)
+    rows = iter_unit_rows(snapshot, units, score_values(scores), user_id, saved_keys, fields)
+    if not stream:
+        return list(rows)
 
-    return data
+    # Pull the first row so the card query has run while the caller can still fall back.
+    first = next(rows, None)
+    return rows if first is None else itertools.chain([first], rows)
 
-def get_recs_query_v2(prefs, user_id):
+def get_recs_interactions(user_id, page, limit, cursor=None, fields=None, stream=False, filters=None):
     """
-    Generate and execute a raw SQL query to find property recommendations based on user preferences.
+    Serve a page of the user's precomputed interaction-based recommendations.
+
+    The batch job in `recs/interactions.py` writes each user's ranked rental keys to
+    `user_recommendations`, so a page is a primary-key lookup and a slice.
 
     Args:
-        prefs (dict): User preferences including filters for campus name, maximum rent, and minimum square footage.
+        user_id (str): User ID.
+        page (int): Page number for pagination. Ignored when a cursor is given.
+        limit (int): Number of items per page.
+        cursor (tuple, optional): Decoded (score, rental_key) position to resume after.
+        fields (list of str, optional): Card fields to project. Defaults to the `card` field set.
+        stream (bool): Return a generator of rows instead of a list.
+        filters (dict, optional): Amenity and bed filters from `get_detail_filters`.
 
     Returns:
-        list of dicts: List of properties with details.
+        list of dicts: Same shape as `get_recs_query`, or None when nothing was precomputed for the user.
+    """
+    with engine.connect() as connection:
+        ranking = get_user_recommendations(connection, user_id)
+    if ranking is None:
+        return None
+
+    snapshot = get_catalog_snapshot(engine)
+    keys, scores = ranking
+    details = snapshot.detail_mask(filters or {})
+    if details is not None:
+        ranked = [
+            (key, score) for key, score in zip(keys, scores)
+            if key in snapshot.key_units and details[snapshot.key_units[key]]
+        ]
+        keys, scores = [key for key, _ in ranked], [score for _, score in ranked]
+
+    start = (page - 1) * limit
+    if cursor is not None:
+        start = keys.index(cursor[1]) + 1 if cursor[1] in keys else len(keys)
+
+    page_rows = [
+        (snapshot.key_units[key], score)
+        for key, score in zip(keys[start:start + limit], scores[start:start + limit])
+        if key in snapshot.key_units
+    ]
+    units = [unit for unit, _ in page_rows]
+    rows = iter_unit_rows(snapshot, units, [score for _, score in page_rows], user_id, fields=fields)
+    return rows if stream else list(rows)
+
+def get_saved_keys(user_id):
     """
+    Retrieve the rental keys a user has saved.
+
+    Args:
+        user_id (str): User ID.
+
+    Returns:
+        set of str: Saved rental keys.
+    """
+    with engine.connect() as connection:
+        return set(connection.execute(
+            text('SELECT rental_key FROM user_apartment WHERE user_id = :user_id'),
+            {'user_id': user_id},
+        ).scalars())
+
+def iter_unit_rows(snapshot, units, scores, user_id, saved_keys=None, fields=None):
+    """
+    Fetch the projected cards and saved flags for snapshot units.
+
+    Rows are yielded in `units` order as they are read from a server-side cursor, so a streamed
+    response can start before the page has been read.
+
+    Args:
+        snapshot (CatalogSnapshot): Snapshot the units were ranked from.
+        units (list of int): Unit indices, in output order.
+        scores (list of float): Scores aligned with `units`. None for units that sort last.
+        user_id (str): User ID.
+        saved_keys (set of str, optional): The user's saved rental keys. Queried for the page when omitted.
+        fields (list of str, optional): Card fields to project. Defaults to the `card` field set.
+
+    Returns:
+        generator of dicts: Same shape as `get_recs_query`.
+    """
+    if len(units) == 0:
+        return
+
+    if fields is None:
+        fields = FIELD_SETS['card']
+
+    property_ids = [str(property_id) for property_id in snapshot.property_ids[snapshot.unit_property[units]]]
+    rental_indexes = [int(rental_index) for rental_index in snapshot.rental_index[units]]
+    rental_keys = list(snapshot.rental_keys[units])
+    scores = list(scores)
+
     query = text(f'''
-        SELECT
-            p.id AS property_id,
-            p.data AS property_data,
-            rental_object,
-            CASE WHEN ua.rental_key IS NOT NULL
-                THEN 1
-                ELSE 0
-            END AS isSaved
-        FROM
-            properties p,
-            jsonb_array_elements(p.data->'schools'->'colleges') AS c(college)
-        CROSS JOIN LATERAL
-            jsonb_array_elements(p.data->'rentals') AS rental_object
-        LEFT JOIN
-            user_apartment ua ON CAST(rental_object->>'key' AS VARCHAR) = ua.rental_key AND ua.user_id = '{user_id}'
-        WHERE
-            c.college @> '{{"name": "{prefs.get("campus", "Texas A&M University")}"}}'
-            AND (rental_object->>'rent')::int <= {prefs.get("max_rent", 10000)}
-            AND (rental_object->>'squareFeet')::int >= {prefs.get("min_sqft", 0)}
-        LIMIT 100
-        OFFSET (1 - 1) * 50;
+        SELECT u.position, {card_sql(fields, 'p', "p.data->'rentals'->u.rental_index")}
+        FROM unnest(:property_ids, :rental_indexes) WITH ORDINALITY AS u(property_id, rental_index, position)
+        JOIN properties p ON p.id = u.property_id
+        ORDER BY u.position
     ''')
-    
+
     with engine.connect() as connection:
-        result = connection.execute(query).fetchall()
+        if saved_keys is None:
+            saved_keys = set(connection.execute(
+                text('SELECT rental_key FROM user_apartment WHERE user_id = :user_id AND rental_key = ANY(:rental_keys)'),
+                {'user_id': user_id, 'rental_keys': rental_keys},
+            ).scalars())
+
+        result = connection.execution_options(stream_results=True).execute(
+            query, {'property_ids': property_ids, 'rental_indexes': rental_indexes}
+        )
+        for position, card in result:
+            i = position - 1
+            yield {
+                "property_id": property_ids[i],
+                "rental_key": rental_keys[i],
+                "card": card,
+                "score": scores[i],
+                "isSaved": rental_keys[i] in saved_keys,
+            }
 
-    data = []
-    for row in result:
-        row_data = {
-            "property_id": row[0],
-            "property_data": row[1],
-            "rental_object": row[2],
-            "isSaved": bool(row[3]),
-        }
-        data.append(row_data)
+def wants_ndjson():
+    """
+    Whether the client asked for a streamed `application/x-ndjson` response via the Accept header.
+    """
+    return request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+def get_detail_filters():
+    """
+    Read the `amenities=` and `beds=` filters from the query string (see `catalog.amenities.detail_filters`).
+
+    Raises:
+        ValueError: If `beds` cannot be read.
+    """
+    return detail_filters(request.args)
+
+def get_listing_etag(endpoint, user_id, include_recommendations=False, ranked=False):
+    """
+    Derive the ETag of a listing response from version stamps, without computing the response.
+
+    The tag covers the catalog content version, the user's state version (saved apartments and
+    `User` row), the precomputed recommendations when they are served, and every query argument
+    and the response format. Rankings come from this worker's catalog snapshot, which can lag the
+    catalog version, so ranked responses also cover the snapshot's version. The user state
+    version is returned too: the body must be rendered from preferences and saved keys read at
+    that version, not from older cache entries.
+
+    Args:
+        endpoint (str): Endpoint name.
+        user_id (str): User ID.
+        include_recommendations (bool): Whether the response serves precomputed interaction recommendations.
+        ranked (bool): Whether the response is ranked against the catalog snapshot.
+
+    Returns:
+        tuple: (ETag value, user state version), both None when the stamps could not be read.
+    """
+    try:
+        stamps = get_version_stamps(engine, user_id, include_recommendations)
+    except Exception:
+        traceback.print_exc()
+        return None, None
+
+    snapshot_version = None
+    if ranked:
+        try:
+            snapshot_version = get_catalog_snapshot(engine).version
+        except Exception:
+            traceback.print_exc()
 
-    return data
+    etag = make_etag(endpoint, user_id, stamps, snapshot_version, sorted(request.args.items(multi=True)), wants_ndjson())
+    return etag, stamps[1]
 
+def etag_headers(etag):
+    if etag is None:
+        return {}
+    return {'ETag': f'W/"{etag}"', 'Cache-Control': 'private, no-cache'}
+
+def not_modified(etag):
+    """
+    Whether the request's If-None-Match already holds `etag`.
+    """
+    return etag is not None and request.if_none_match.contains_weak(etag)
 
 def get_prefs_query(id):
     """
-	Retrieve user preferences from the Supabase 'User' table by user ID.
+	Retrieve user preferences from the 'User' table by user ID.
+
+	Served from the short-TTL preferences cache in `user_context` when possible.
 
 	Args:
     	id (int): User ID.
@@ -143,11 +405,7 @@ def get_prefs_query(id):
 	Returns:
     	dict: User preferences stored in the database.
 	"""
-    result = supabase.table("User").select("preferences").eq("id", id).execute()
-
-    preferences = result.data[0]['preferences']
-
-    return preferences
+    return user_context.get_preferences(id)
 
 # Execute the raw SQL query
 @app.route('/get_recommendations', methods=['GET'])
@@ -156,6 +414,14 @@ def get_recs_api():
 	API endpoint to get property recommendations for a user based on their stored preferences.
 
 	Expects an 'id' header with the user's ID.
+	`mode=interactions` serves the user's precomputed interaction-based recommendations instead,
+	falling back to preferences when none were computed for the user.
+	`fields=` selects the card fields (see `catalog/fields.py`); the default is the slim `card` set
+	and `fields=full` returns every field.
+	`amenities=` and `beds=` keep only units with every listed amenity and an allowed bed count.
+	With `Accept: application/x-ndjson` the cards are streamed one per line as they are read from
+	the database; streamed responses carry no X-Next-Cursor header, so page with `page=`.
+	Responses carry an ETag; a matching If-None-Match gets a 304 before anything is ranked.
 	Returns a JSON response with simplified property recommendation details or an error message.
 	"""
     authorization = request.headers.get('Authorization', None)
@@ -172,65 +438,67 @@ def get_recs_api():
         traceback.print_exc()
         return jsonify({ 'error': { 'status': 500, 'code': 'OC.AUTHENTICATION.TOKEN_ERROR', 'message': 'Token failed to be verified' }, 'results': [] }), 500
 
+    mode = request.args.get('mode', 'preferences')
+    if mode not in ('preferences', 'interactions'):
+        return jsonify({ 'error': { 'status': 400, 'code': 'OC.BUSINESS.INVALID_MODE', 'message': 'mode must be preferences or interactions.' }, 'results': [] }), 400
+
+    try:
+        fields = parse_fields(request.args.get('fields'), full='recommendations')
+    except ValueError as e:
+        return jsonify({ 'error': { 'status': 400, 'code': 'OC.BUSINESS.INVALID_FIELDS', 'message': str(e) }, 'results': [] }), 400
+
+    try:
+        filters = get_detail_filters()
+    except ValueError as e:
+        return jsonify({ 'error': { 'status': 400, 'code': 'OC.BUSINESS.INVALID_FILTER', 'message': str(e) }, 'results': [] }), 400
 
     page = int(request.args.get('page', 1))
     limit = int(request.args.get('limit', 10))
-    try:
-        prefs = get_prefs_query(user_id)
-        recs = get_recs_query(prefs, user_id, page, limit)
-    
 
-        simplified_recs = []
-        for rec in recs:
-            
+    cursor = request.args.get('cursor', None)
+    if cursor:
+        try:
+            cursor = decode_cursor(cursor)
+        except ValueError:
+            return jsonify({ 'error': { 'status': 400, 'code': 'OC.BUSINESS.INVALID_CURSOR', 'message': 'The supplied cursor could not be read.' }, 'results': [] }), 400
+    else:
+        cursor = None
+
+    stream = wants_ndjson()
+
+    etag, user_version = get_listing_etag('get_recommendations', user_id, include_recommendations=mode == 'interactions', ranked=True)
+    if not_modified(etag):
+        return '', 304, etag_headers(etag)
+
+    try:
+        recs = None
+        if mode == 'interactions':
+            recs = get_recs_interactions(user_id, page, limit, cursor, fields, stream, filters)
 
-            apt_latitude = ''
-            apt_longitude = ''
+        if recs is None:
+            prefs, saved_keys = user_context.load(user_id, user_version)
+            prefs = {**prefs, **filters}
             try:
-                apt_latitude = rec['property_data']['coordinates']['latitude']
-                apt_longitude = rec['property_data']['coordinates']['longitude']
-            except:
-                apt_latitude = 'N/A'
-                apt_longitude = 'N/A'
-
-            price = rec['property_data']['models'][0].get('rentLabel', 'N/A')
-            price_cleaned = price.replace('/ Person', '').strip()
-            simplified_rec = {
-                'propertyId': rec['property_id'],
-                'key': rec['rental_object'].get('key'),
-                'name': rec['property_data'].get('propertyName', 'N/A'),
-                'modelName': rec['rental_object'].get('modelName'),
-                'rent': rec['rental_object'].get('rent'),
-                'modelImage': rec['rental_object'].get('image'),
-                'address': rec['property_data']['location'].get('fullAddress', 'N/A'),
-                'price': price_cleaned,
-                'score': rec['score'],
-                'photos': rec['property_data'].get('photos', []),
-                'details': rec['rental_object'].get('details', {}),
-                'squareFeet': rec['rental_object'].get('squareFeet'),
-                'availableDate': rec['rental_object'].get('availableDate'),
-                'isNew': rec['rental_object'].get('isNew'),
-                'features': rec['rental_object'].get('interiorAmenities'),
-                'rating': rec['property_data'].get('rating'),
-                'hasKnownAvailabilities': rec['rental_object'].get('hasKnownAvailabilities'),
-                'isSaved': rec['isSaved'],
-                'phoneNumber': rec['property_data']['contact'].get('phone'),
-                'description': rec['property_data'].get('description'),
-                'apt_latitude': apt_latitude,
-                'apt_longitude': apt_longitude
-            }
-           
-            simplified_recs.append(simplified_rec)
+                recs = get_recs_snapshot(prefs, user_id, page, limit, cursor, saved_keys, fields, stream, user_version)
+            except Exception:
+                traceback.print_exc()
+                recs = get_recs_query(prefs, user_id, page, limit, cursor, fields, stream)
 
-        return jsonify(simplified_recs), 200
+        if stream:
+            return ndjson_response((build_card(rec['card'], fields, rec['score'], rec['isSaved']) for rec in recs), etag_headers(etag))
+
+        simplified_recs = [build_card(rec['card'], fields, rec['score'], rec['isSaved']) for rec in recs]
+
+        headers = etag_headers(etag)
+        if len(recs) == limit:
+            headers['X-Next-Cursor'] = encode_cursor(recs[-1]['score'], recs[-1]['rental_key'])
+
+        return jsonify(simplified_recs), 200, headers
     
     except Exception as e:
         print(e)
         return jsonify({'error': str(e)}), 500
 
-preprocessor = load('preprocessor.joblib')
-knn_model = load('knn_model.joblib')
-
 @app.route('/get_recommendations/v2', methods=['GET'])
 def data_test():
     """
@@ -253,73 +521,250 @@ def data_test():
         traceback.print_exc()
         return jsonify({ 'error': { 'status': 500, 'code': 'OC.AUTHENTICATION.TOKEN_ERROR', 'message': 'Token failed to be verified' }, 'results': [] }), 500
 
+    try:
+        fields = parse_fields(request.args.get('fields'), full='recommendations_v2')
+    except ValueError as e:
+        return jsonify({ 'error': { 'status': 400, 'code': 'OC.BUSINESS.INVALID_FIELDS', 'message': str(e) }, 'results': [] }), 400
+
+    try:
+        filters = get_detail_filters()
+    except ValueError as e:
+        return jsonify({ 'error': { 'status': 400, 'code': 'OC.BUSINESS.INVALID_FILTER', 'message': str(e) }, 'results': [] }), 400
+
     try:
         prefs = get_prefs_query(user_id)
-        recs = get_recs_query_v2(prefs, user_id)
-    
+        snapshot = get_catalog_snapshot(engine)
+        knn_index = model_registry.index_for(snapshot.version)
+        details = snapshot.detail_mask(filters)
+        allowed = None if details is None else snapshot.rental_keys[details]
+        keys = knn_index.query(prefs, n_neighbors=20, allowed=allowed)
+        units = [snapshot.key_units[key] for key in keys if key in snapshot.key_units]
+        recs = iter_unit_rows(snapshot, units, [None] * len(units), user_id, fields=fields)
+        cards = (build_card(rec['card'], fields, rec['score'], rec['isSaved']) for rec in recs)
+        if wants_ndjson():
+            return ndjson_response(cards)
+
+        simplified_recs = list(cards)
 
-        simplified_recs = []
-        for rec in recs:
-            price = rec['property_data']['models'][0].get('rentLabel', 'N/A')
-            price_cleaned = price.replace('/ Person', '').strip()
-            simplified_rec = {
-                'propertyId': rec['property_id'],
-                'key': rec['rental_object'].get('key'),
-                'name': rec['property_data'].get('propertyName', 'N/A'),
-                'modelName': rec['rental_object'].get('modelName'),
-                'rent': rec['rental_object'].get('rent'),
-                'modelImage': rec['rental_object'].get('image'),
-                'address': rec['property_data']['location'].get('fullAddress', 'N/A'),
-                'latitude': rec['property_data']['coordinates'].get('latitude', 'N/A'),
-                'longitude': rec['property_data']['coordinates'].get('longitude', 'N/A'),
-                'walkScore': rec['property_data']['scores'].get('walkScore', 'N/A'),
-                'price': price_cleaned,
-                'photos': rec['property_data'].get('photos', []),
-                'details': rec['rental_object'].get('details', {}),
-                'squareFeet': rec['rental_object'].get('squareFeet'),
-                'availableDate': rec['rental_object'].get('availableDate'),
-                'isNew': rec['rental_object'].get('isNew'),
-                'features': rec['rental_object'].get('interiorAmenities'),
-                'rating': rec['property_data'].get('rating'),
-                'hasKnownAvailabilities': rec['rental_object'].get('hasKnownAvailabilities'),
-                'isSaved': rec['isSaved'],
-            }
-            simplified_recs.append(simplified_rec)
-
-        pref_rent = prefs.get("rent")
-        pref_sqft = prefs.get("squareFeet")
-        pref_details = prefs.get("details")
-        property_data = pd.DataFrame(simplified_recs)
-
-        user_query = pd.DataFrame({ 
-            'details': pref_details,
-            'rent': pref_rent,  
-            'walkScore': [40],
-            'squareFeet': pref_sqft,
-            'rating': [4.2],
-            'latitude': [30.5], 
-            'longitude': [-96.3],
-        })
-
-        user_query_transformed = preprocessor.transform(user_query)
-
-        distances, indices = knn_model.kneighbors(user_query_transformed, n_neighbors=20)
-        user_preferences = {
-        'rent': pref_rent
-        }
-
-        filtered_indices = []
-        for i in indices[0]:
-            if property_data.iloc[i]['rent'] <= user_preferences['rent']:
-                filtered_indices.append(i)
-
-        filtered_data = [property_data.iloc[i].to_dict() for i in filtered_indices]
-        return jsonify(filtered_data), 200
+        return jsonify(simplified_recs), 200
     
     except Exception as e:
         print(e)
         return jsonify({'error': str(e)}), 500
 
+@app.route('/search/nearby', methods=['GET'])
+def search_nearby():
+    """
+	API endpoint to find rental units near a point or inside a map viewport.
+
+	Expects an 'Authorization' header with the user's JWT token, and either `lat`, `lon` and
+	`radius` (miles, default 2) or `bbox=min_lat,min_lon,max_lat,max_lon`.
+	`max_rent`, `min_sqft`, `amenities` and `beds` filter the units, which are ordered by distance from (lat, lon),
+	or from the box centre when only a box is given, and paged with `page` and `limit`.
+	Distances are computed from the property coordinates against the snapshot's spatial grid,
+	so any point can be searched, not only campuses with a scraped distance.
+	`fields=` selects the card fields; the default `map` set adds coordinates and `distance`.
+	Returns a JSON response with the matching units or an error message.
+	"""
+    authorization = request.headers.get('Authorization', None)
+
+    if authorization is None:
+        return jsonify({ 'error': { 'status': 401, 'code': 'OC.AUTHENTICATION.UNAUTHORIZED', 'message': 'Bearer token not supplied in nearby search request.' } }), 401
+
+    jwt_token = authorization.split()[1]
+
+    user_id = ''
+    try:
+        user_id = get_user_id(jwt_token)
+    except:
+        traceback.print_exc()
+        return jsonify({ 'error': { 'status': 500, 'code': 'OC.AUTHENTICATION.TOKEN_ERROR', 'message': 'Token failed to be verified' }, 'results': [] }), 500
+
+    try:
+        fields = parse_fields(request.args.get('fields') or 'map', full='map')
+    except ValueError as e:
+        return jsonify({ 'error': { 'status': 400, 'code': 'OC.BUSINESS.INVALID_FIELDS', 'message': str(e) }, 'results': [] }), 400
+
+    try:
+        lat = request.args.get('lat', None, type=float)
+        lon = request.args.get('lon', None, type=float)
+        radius = float(request.args.get('radius', 2))
+        bbox = request.args.get('bbox', None)
+        if bbox is not None:
+            bbox = tuple(float(value) for value in bbox.split(','))
+            if len(bbox) != 4:
+                raise ValueError('bbox must be min_lat,min_lon,max_lat,max_lon')
+            check_coordinates(bbox[0], bbox[1])
+            check_coordinates(bbox[2], bbox[3])
+        elif lat is None or lon is None:
+            raise ValueError('lat and lon, or bbox, are required')
+        if lat is not None and lon is not None:
+            check_coordinates(lat, lon)
+        if not 0 < radius <= MAX_RADIUS_MILES:
+            raise ValueError(f'radius must be between 0 and {MAX_RADIUS_MILES} miles')
+    except ValueError as e:
+        return jsonify({ 'error': { 'status': 400, 'code': 'OC.BUSINESS.INVALID_LOCATION', 'message': str(e) }, 'results': [] }), 400
+
+    try:
+        filters = get_detail_filters()
+        max_rent = float(request.args.get('max_rent', 10000))
+        min_sqft = float(request.args.get('min_sqft', 0))
+    except ValueError as e:
+        return jsonify({ 'error': { 'status': 400, 'code': 'OC.BUSINESS.INVALID_FILTER', 'message': str(e) }, 'results': [] }), 400
+
+    page = int(request.args.get('page', 1))
+    limit = int(request.args.get('limit', 10))
+
+    try:
+        snapshot = get_catalog_snapshot(engine)
+        units, distances = snapshot.nearby(lat, lon, radius, bbox, max_rent=max_rent, min_sqft=min_sqft, filters=filters)
+        start = (page - 1) * limit
+        units, distances = units[start:start + limit], distances[start:start + limit]
+
+        # Distances ride in the rows' score slot.
+        recs = iter_unit_rows(snapshot, units, distances.tolist(), user_id, fields=fields)
+        cards = (build_card(rec['card'], fields, is_saved=rec['isSaved'], distance=rec['score']) for rec in recs)
+        if wants_ndjson():
+            return ndjson_response(cards)
+
+        return jsonify(list(cards)), 200
+
+    except Exception as e:
+        print(e)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/search', methods=['GET'])
+def search_apartments():
+    """
+	API endpoint for full-text search over property names, descriptions, neighborhoods,
+	amenities and nearby places.
+
+	Expects an 'Authorization' header with the user's JWT token and the search text in `q`.
+	The last term matches as a prefix for typeahead unless `prefix=false`. Results are limited to
+	the user's campus, max_rent and min_sqft preferences, each of which can be overridden in the
+	query string, and to `amenities=`/`beds=`. Units are ranked by the BM25 score of their
+	property, returned as `score`, and paged with `page` and `limit`.
+	Returns a JSON response with the matching units or an error message.
+	"""
+    authorization = request.headers.get('Authorization', None)
+
+    if authorization is None:
+        return jsonify({ 'error': { 'status': 401, 'code': 'OC.AUTHENTICATION.UNAUTHORIZED', 'message': 'Bearer token not supplied in search request.' } }), 401
+
+    jwt_token = authorization.split()[1]
+
+    user_id = ''
+    try:
+        user_id = get_user_id(jwt_token)
+    except:
+        traceback.print_exc()
+        return jsonify({ 'error': { 'status': 500, 'code': 'OC.AUTHENTICATION.TOKEN_ERROR', 'message': 'Token failed to be verified' }, 'results': [] }), 500
+
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({ 'error': { 'status': 400, 'code': 'OC.BUSINESS.PARAMETER_NOT_GIVEN', 'message': 'Search text was not supplied.' }, 'results': [] }), 400
+
+    try:
+        fields = parse_fields(request.args.get('fields'), full='recommendations')
+    except ValueError as e:
+        return jsonify({ 'error': { 'status': 400, 'code': 'OC.BUSINESS.INVALID_FIELDS', 'message': str(e) }, 'results': [] }), 400
+
+    try:
+        filters = get_detail_filters()
+        for name in ('max_rent', 'min_sqft'):
+            if name in request.args:
+                filters[name] = float(request.args[name])
+    except ValueError as e:
+        return jsonify({ 'error': { 'status': 400, 'code': 'OC.BUSINESS.INVALID_FILTER', 'message': str(e) }, 'results': [] }), 400
+
+    if 'campus' in request.args:
+        filters['campus'] = request.args['campus']
+
+    prefix = request.args.get('prefix', 'true').lower() != 'false'
+    page = int(request.args.get('page', 1))
+    limit = int(request.args.get('limit', 10))
+
+    try:
+        prefs = {**get_prefs_query(user_id), **filters}
+        snapshot = get_catalog_snapshot(engine)
+        search_index = get_search_index(engine, snapshot)
+        start = (page - 1) * limit
+        units, scores = search_index.search(query, snapshot.filter(prefs), start + limit, prefix)
+        units, scores = units[start:start + limit], scores[start:start + limit]
+
+        recs = iter_unit_rows(snapshot, units, scores.tolist(), user_id, fields=fields)
+        cards = (build_card(rec['card'], fields, rec['score'], rec['isSaved']) for rec in recs)
+        if wants_ndjson():
+            return ndjson_response(cards)
+
+        return jsonify(list(cards)), 200
+
+    except Exception as e:
+        print(e)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/facets', methods=['GET'])
+def get_facets():
+    """
+	API endpoint for the facet counts of a campus: rent and square footage histograms, unit
+	counts by beds and baths, and availability by month.
+
+	Expects an 'Authorization' header with the user's JWT token. `campus` defaults to the user's
+	campus preference. `max_rent`, `min_sqft`, `amenities` and `beds` narrow the counts; each
+	facet ignores its own filter so the alternatives to the current choice stay visible.
+	Unfiltered counts are precomputed when the catalog snapshot loads.
+	Returns a JSON response with the facet counts or an error message.
+	"""
+    authorization = request.headers.get('Authorization', None)
+
+    if authorization is None:
+        return jsonify({ 'error': { 'status': 401, 'code': 'OC.AUTHENTICATION.UNAUTHORIZED', 'message': 'Bearer token not supplied in facets request.' } }), 401
+
+    jwt_token = authorization.split()[1]
+
+    user_id = ''
+    try:
+        user_id = get_user_id(jwt_token)
+    except:
+        traceback.print_exc()
+        return jsonify({ 'error': { 'status': 500, 'code': 'OC.AUTHENTICATION.TOKEN_ERROR', 'message': 'Token failed to be verified' }, 'results': [] }), 500
+
+    try:
+        filters = get_detail_filters()
+        for name in ('max_rent', 'min_sqft'):
+            if name in request.args:
+                filters[name] = float(request.args[name])
+    except ValueError as e:
+        return jsonify({ 'error': { 'status': 400, 'code': 'OC.BUSINESS.INVALID_FILTER', 'message': str(e) }, 'results': [] }), 400
+
+    try:
+        campus = request.args.get('campus', None)
+        if campus is None:
+            campus = get_prefs_query(user_id).get("campus", "Texas A&M University")
+
+        counts = get_catalog_snapshot(engine).facet_counts(campus, filters)
+        if counts is None:
+            return jsonify({ 'error': { 'status': 404, 'code': 'OC.BUSINESS.CAMPUS_NOT_FOUND', 'message': 'No units are listed near the supplied campus.' }, 'results': [] }), 404
+
+        return jsonify({'campus': campus, **describe_facets(counts)}), 200
+
+    except Exception as e:
+        print(e)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/models/active', methods=['GET'])
+def get_active_model():
+    """
+    API endpoint reporting the KNN model version currently serving `/get_recommendations/v2`.
+
+    Returns a JSON response with the model version, when it was loaded and the catalog version its index covers.
+    """
+    try:
+        return jsonify(model_registry.current().to_dict()), 200
+    except Exception as e:
+        print(e)
+        return jsonify({'error': str(e)}), 500
+
 @app.post('/apartments/save')
 def save_apartment():
     authorization = request.headers.get('Authorization', None)
@@ -352,6 +797,7 @@ def save_apartment():
         return jsonify({ 'error': { 'status': 500, 'code': 'OC.APARTMENT.SAVE_FAILURE', 'message': 'Failed to update database with saved apartment' }, 'results': [] }), 500
 
     if data[1] and len(data[1]) > 0:
+        ranked_cache.invalidate_saved(user_id)
         return jsonify({ 'results': [{ 'code': 'OC.MESSAGE.SUCCESS', 'message': 'Successfully saved apartment' }], 'data': data[1] }), 200
 
     return jsonify({ 'error': { 'status': 500, 'code': 'OC.BUSINESS.DATABASE_FAILURE', 'message': 'Failed to update database for an unknown reason' }, 'results': [] }), 500
@@ -389,50 +835,52 @@ def remove_saved_apartment():
         return jsonify({ 'error': { 'status': 500, 'code': 'OC.APARTMENT.REMOVE_FAILURE', 'message': 'Failed to remove saved apartment from user account.' }, 'results': [] }), 500
 
     if data[1] and len(data[1]) > 0:
+        ranked_cache.invalidate_saved(user_id)
         return jsonify({ 'results': [{ 'code': 'OC.MESSAGE.SUCCESS', 'message': 'Successfully removed apartment from user.' }], 'data': data[1] })
 
     return jsonify({ 'error': { 'status': 500, 'code': 'OC.BUSINESS.DATABASE_FAILURE', 'message': 'Failed to update database for an unknown reason' }, 'results': [] }), 500
 
-def get_saved_apartments(user_id):
+def get_saved_apartments(user_id, fields=None, stream=False):
     """
     Retrieve all saved apartments for a user from the Supabase 'user_apartment' table.
 
     Args:
         user_id (int): User ID.
+        fields (list of str, optional): Card fields to project. Defaults to the `card` field set.
+        stream (bool): Return a generator reading rows from a server-side cursor instead of a list.
 
     Returns:
-        list of dicts: List of saved apartments with details.
+        list of dicts: Saved apartments with `property_id`, `rental_key`, the projected `card` and `isSaved`.
     """
+    if fields is None:
+        fields = FIELD_SETS['card']
+
     query = text(f'''
-        SELECT
+        SELECT DISTINCT ON (ua.rental_key)
             p.id AS property_id,
-            p.data AS property_data,
-            rental_object
+            ua.rental_key,
+            {card_sql(fields)} AS card
         FROM
             user_apartment ua
         JOIN
-            properties p ON ua.property_id = p.id
-        CROSS JOIN LATERAL
-            jsonb_array_elements(p.data->'rentals') AS rental_object
+            rental_units ru ON ru.rental_key = ua.rental_key AND ru.property_id = ua.property_id
+        JOIN
+            properties p ON ru.property_id = p.id
         WHERE
-            ua.user_id = '{user_id}'
-            AND CAST(rental_object->>'key' AS VARCHAR) = ua.rental_key
+            ua.user_id = :user_id
     ''')
 
-    with engine.connect() as connection:
-        result = connection.execute(query).fetchall()
-
-    data = []
-    for row in result:
-        row_data = {
-            "property_id": row[0],
-            "property_data": row[1],
-            "rental_object": row[2],
-            "isSaved": True,
-        }
-        data.append(row_data)
+    def rows():
+        with engine.connect() as connection:
+            for row in connection.execution_options(stream_results=True).execute(query, {'user_id': user_id}):
+                yield {
+                    "property_id": row[0],
+                    "rental_key": row[1],
+                    "card": row[2],
+                    "isSaved": True,
+                }
 
-    return data
+    return rows() if stream else list(rows())
 
 @app.route('/get_saved_apartments', methods=['GET'])
 def get_saved_apartments_api():
@@ -440,6 +888,7 @@ def get_saved_apartments_api():
     API endpoint to get all saved apartments for a user.
 
     Expects an 'Authorization' header with the user's JWT token.
+    `fields=` selects the card fields, `Accept: application/x-ndjson` streams them and ETags work as for `/get_recommendations`.
     Returns a JSON response with simplified saved apartment details or an error message.
     """
     authorization = request.headers.get('Authorization', None)
@@ -457,38 +906,24 @@ def get_saved_apartments_api():
         return jsonify({ 'error': { 'status': 500, 'code': 'OC.AUTHENTICATION.TOKEN_ERROR', 'message': 'Token failed to be verified' }, 'results': [] }), 500
 
     try:
-        saved_apartments = get_saved_apartments(user_id)
-
-        simplified_apartments = []
-        for apartment in saved_apartments:
-            price = apartment['property_data']['models'][0].get('rentLabel', 'N/A')
-            price_cleaned = price.replace('/ Person', '').strip()
-            simplified_apartment = {
-                'propertyId': apartment['property_id'],
-                'key': apartment['rental_object'].get('key'),
-                'name': apartment['property_data'].get('propertyName', 'N/A'),
-                'modelName': apartment['rental_object'].get('modelName'),
-                'rent': apartment['rental_object'].get('rent'),
-                'modelImage': apartment['rental_object'].get('image'),
-                'address': apartment['property_data']['location'].get('fullAddress', 'N/A'),
-                'price': price_cleaned,
-                'photos': apartment['property_data'].get('photos', []),
-                'details': apartment['rental_object'].get('details', {}),
-                'squareFeet': apartment['rental_object'].get('squareFeet'),
-                'availableDate': apartment['rental_object'].get('availableDate'),
-                'isNew': apartment['rental_object'].get('isNew'),
-                'features': apartment['rental_object'].get('interiorAmenities'),
-                'rating': apartment['property_data'].get('rating'),
-                'hasKnownAvailabilities': apartment['rental_object'].get('hasKnownAvailabilities'),
-                'isSaved': apartment['isSaved'], 
-                'phoneNumber': apartment['property_data']['contact'].get('phone'),
-                'description': apartment['property_data'].get('description')
-            }
-            simplified_apartments.append(simplified_apartment)
+        fields = parse_fields(request.args.get('fields'), full='saved')
+    except ValueError as e:
+        return jsonify({ 'error': { 'status': 400, 'code': 'OC.BUSINESS.INVALID_FIELDS', 'message': str(e) }, 'results': [] }), 400
 
+    etag, _ = get_listing_etag('get_saved_apartments', user_id)
+    if not_modified(etag):
+        return '', 304, etag_headers(etag)
 
-     
-        return jsonify(simplified_apartments), 200
+    try:
+        stream = wants_ndjson()
+        saved_apartments = get_saved_apartments(user_id, fields, stream)
+        cards = (build_card(apartment['card'], fields, is_saved=apartment['isSaved']) for apartment in saved_apartments)
+        if stream:
+            return ndjson_response(cards, etag_headers(etag))
+
+        simplified_apartments = list(cards)
+
+        return jsonify(simplified_apartments), 200, etag_headers(etag)
 
     except Exception as e:
         print(e)
@@ -496,6 +931,16 @@ def get_saved_apartments_api():
 
 @app.post('/apartments/details')
 def get_apartment_details():
+    """
+    API endpoint to get the detail view of one rental unit, or of several for comparison screens.
+
+    Expects an 'Authorization' header with the user's JWT token and a JSON body with either
+    `rental_key` or `rental_keys` (a list of up to MAX_BATCH_KEYS keys).
+    Keys are resolved through the catalog snapshot's rental key index, and only properties not
+    already cached are read from the database, in one query.
+    Returns the unit's details, a list of details in request order for `rental_keys` (unknown
+    keys are left out), or an error message.
+    """
     authorization = request.headers.get('Authorization', None)
 
     if authorization is None:
@@ -511,7 +956,49 @@ def get_apartment_details():
         return jsonify({ 'error': { 'status': 500, 'code': 'OC.AUTHENTICATION.TOKEN_ERROR', 'message': 'Token failed to be verified' }, 'results': [] }), 500
 
     body = request.get_json()
-    rental_key = body.get('rental_key', None)
+    rental_keys = body.get('rental_keys', None)
+    batch = rental_keys is not None
+    if not batch:
+        rental_key = body.get('rental_key', None)
+        if rental_key is None:
+            return jsonify({ 'error': { 'status': 400, 'code': 'OC.BUSINESS.PARAMETER_NOT_GIVEN', 'message': 'A rental unit key was not supplied.' }, 'results': [] }), 400
+        rental_keys = [rental_key]
+
+    if not isinstance(rental_keys, list) or not 0 < len(rental_keys) <= MAX_BATCH_KEYS:
+        return jsonify({ 'error': { 'status': 400, 'code': 'OC.BUSINESS.INVALID_PARAMETER', 'message': f'rental_keys must be a list of 1 to {MAX_BATCH_KEYS} keys.' }, 'results': [] }), 400
+
+    try:
+        snapshot = get_catalog_snapshot(engine)
+        located = [(rental_key, snapshot.locate(rental_key)) for rental_key in rental_keys]
+        located = [(rental_key, location) for rental_key, location in located if location is not None]
+
+        properties = property_cache.get_many(engine, [property_id for _, (property_id, _) in located], snapshot.content_version)
+        saved_keys = set()
+        if located:
+            with engine.connect() as connection:
+                saved_keys = set(connection.execute(
+                    text('SELECT rental_key FROM user_apartment WHERE user_id = :user_id AND rental_key = ANY(:rental_keys)'),
+                    {'user_id': user_id, 'rental_keys': [rental_key for rental_key, _ in located]},
+                ).scalars())
+
+        details = []
+        for rental_key, (property_id, rental_index) in located:
+            property_data = properties.get(property_id)
+            if property_data is None or rental_index >= len(property_data.get('rentals', [])):
+                continue
+            details.append(apartment_detail(property_id, property_data, property_data['rentals'][rental_index], rental_key in saved_keys))
+
+        if batch:
+            return jsonify(details), 200
+
+        if not details:
+            return jsonify({ 'error': { 'status': 404, 'code': 'OC.BUSINESS.APARTMENT_NOT_FOUND', 'message': 'No rental unit exists with the supplied key.' }, 'results': [] }), 404
+
+        return jsonify(details[0]), 200
+
+    except Exception as e:
+        print(e)
+        return jsonify({'error': str(e)}), 500
 
 @app.post('/update_classes')
 def update_classes():
@@ -538,6 +1025,7 @@ def update_classes():
         return jsonify({'error': {'status': 400, 'code': 'OC.UPDATE.MISSING_FIELD', 'message': 'New classes value not provided.'}}), 400
 
     response = supabase.table("User").update({'classes': new_classes}).eq('id', user_id).execute()
+    user_context.invalidate(user_id)
 
         # Process the result as needed
     if response:
@@ -0,0 +1,562 @@
+from quart import Quart, Response, request, jsonify
+from quart_cors import cors
+from supabase import create_client
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from auth.user import get_user_id_async
+from catalog.snapshot import get_catalog_snapshot
+from catalog.amenities import detail_filters
+from catalog.fields import FIELD_SETS, build_card, card_sql, parse_fields
+from recs.cursor import encode_cursor, decode_cursor
+from recs.cache import RankedResultCache, ranked_page, score_values
+from recs.data import UserContextLoader
+from recs.interactions import get_user_recommendations
+from recs.versions import get_version_stamps_async, make_etag
+from web.encoder import FastJSONProvider, NDJSON_MIMETYPE, dumps_bytes
+import asyncio
+import httpx
+import traceback
+import os
+from dotenv import dotenv_values
+
+# Async variant of the listing and saved-apartment endpoints of `app.py`, served by an ASGI server:
+#
+#     hypercorn -k uvloop async_app:app
+#
+# Waits on the JWKS endpoint and the database are awaited instead of blocking a thread, and the
+# independent reads of a request run concurrently. Ranking stays on the in-memory catalog
+# snapshot and runs in a thread so it does not stall the loop, as do the Supabase writes.
+#
+# Both apps can serve the same users side by side. Cached preferences and saved keys are tagged
+# with the user's state version, which the database bumps on every write whichever app made it,
+# so a save in one app is seen by the other's next listing request.
+
+app = cors(Quart(__name__), allow_origin='*', expose_headers=['X-Next-Cursor', 'ETag'])
+app.json = FastJSONProvider(app)
+
+config = {
+    **dotenv_values(".env"),  # load development variables
+    **os.environ,  # override loaded values with environment variables
+}
+
+def async_database_url(config):
+    """
+    URL for the async engine: `ASYNC_DATABASE_URL`, or `SQLALCHEMY_DATABASE_URL` with the asyncpg driver.
+    """
+    if config.get('ASYNC_DATABASE_URL'):
+        return config['ASYNC_DATABASE_URL']
+    return make_url(config['SQLALCHEMY_DATABASE_URL']).set(drivername='postgresql+asyncpg')
+
+supabase = create_client(config['SUPABASE_URL'], config['SUPABASE_KEY'])
+# The sync engine is only used to load catalog snapshots, off the event loop.
+engine = create_engine(config['SQLALCHEMY_DATABASE_URL'])
+async_engine = create_async_engine(
+    async_database_url(config),
+    pool_size=int(config.get('ASYNC_POOL_SIZE', 20)),
+    max_overflow=int(config.get('ASYNC_POOL_OVERFLOW', 10)),
+)
+ranked_cache = RankedResultCache.from_config(config)
+user_context = UserContextLoader(engine, prefs_ttl=int(config.get('PREFS_CACHE_TTL', 60)))
+http_client = None
+
+@app.before_serving
+async def open_http_client():
+    global http_client
+    http_client = httpx.AsyncClient(timeout=float(config.get('JWKS_TIMEOUT', 5)))
+
+@app.after_serving
+async def close_clients():
+    await http_client.aclose()
+    await async_engine.dispose()
+
+async def get_recs_snapshot(snapshot_task, user_id, page, limit, cursor=None, fields=None, filters=None, user_version=None):
+    """
+    Rank recommendations against the in-memory catalog snapshot and fetch only the page's rows.
+
+    Same as `app.get_recs_snapshot`, with the user's preferences and the catalog snapshot loaded
+    concurrently.
+
+    Args:
+        snapshot_task (Task): Task loading the catalog snapshot.
+        user_id (str): User ID.
+        page (int): Page number for pagination. Ignored when a cursor is given.
+        limit (int): Number of items per page.
+        cursor (tuple, optional): Decoded (score, rental_key) position to resume after.
+        fields (list of str, optional): Card fields to project. Defaults to the `card` field set.
+        filters (dict, optional): Amenity and bed filters from `detail_filters`.
+        user_version (int, optional): The user's state version from the ETag stamps.
+
+    Returns:
+        async generator of dicts: Same shape as `app.get_recs_query`.
+    """
+    (prefs, saved_keys), snapshot = await asyncio.gather(
+        user_context.load_async(user_id, async_engine, user_version), snapshot_task
+    )
+    prefs = {**prefs, **(filters or {})}
+
+    # The cache may be Redis, and ranking is CPU-bound; both run off the event loop.
+    def rank():
+        ranking = ranked_cache.get(user_id, prefs, snapshot.version)
+        if ranking is None:
+            units, scores = snapshot.rank(prefs, ranked_cache.depth)
+            ranking = ranked_cache.put(user_id, prefs, snapshot.version, units, scores)
+        return ranked_page(ranking, snapshot, prefs, page, limit, cursor)
+
+    units, scores = await asyncio.to_thread(rank)
+
+    if saved_keys is None:
+        saved_keys = await asyncio.to_thread(ranked_cache.get_saved, user_id, user_version)
+        if saved_keys is None:
+            saved_keys = await get_saved_keys(user_id)
+            await asyncio.to_thread(ranked_cache.put_saved, user_id, saved_keys, user_version)
+    else:
+        await asyncio.to_thread(ranked_cache.put_saved, user_id, saved_keys, user_version)
+
+    return iter_unit_rows(snapshot, units, score_values(scores), user_id, saved_keys, fields)
+
+async def get_recs_interactions(snapshot_task, user_id, page, limit, cursor=None, fields=None, filters=None):
+    """
+    Serve a page of the user's precomputed interaction-based recommendations, as `app.get_recs_interactions`.
+
+    Returns:
+        async generator of dicts: Same shape as `app.get_recs_query`, or None when nothing was
+                                  precomputed for the user.
+    """
+    async def read_ranking():
+        async with async_engine.connect() as connection:
+            return await connection.run_sync(get_user_recommendations, user_id)
+
+    ranking, snapshot = await asyncio.gather(read_ranking(), snapshot_task)
+    if ranking is None:
+        return None
+
+    keys, scores = ranking
+    details = snapshot.detail_mask(filters or {})
+    if details is not None:
+        ranked = [
+            (key, score) for key, score in zip(keys, scores)
+            if key in snapshot.key_units and details[snapshot.key_units[key]]
+        ]
+        keys, scores = [key for key, _ in ranked], [score for _, score in ranked]
+
+    start = (page - 1) * limit
+    if cursor is not None:
+        start = keys.index(cursor[1]) + 1 if cursor[1] in keys else len(keys)
+
+    page_rows = [
+        (snapshot.key_units[key], score)
+        for key, score in zip(keys[start:start + limit], scores[start:start + limit])
+        if key in snapshot.key_units
+    ]
+    units = [unit for unit, _ in page_rows]
+    return iter_unit_rows(snapshot, units, [score for _, score in page_rows], user_id, fields=fields)
+
+async def get_saved_keys(user_id):
+    """
+    Retrieve the rental keys a user has saved.
+    """
+    async with async_engine.connect() as connection:
+        result = await connection.execute(
+            text('SELECT rental_key FROM user_apartment WHERE user_id = :user_id'),
+            {'user_id': user_id},
+        )
+        return set(result.scalars())
+
+async def iter_unit_rows(snapshot, units, scores, user_id, saved_keys=None, fields=None):
+    """
+    Fetch the projected cards and saved flags for snapshot units, as `app.iter_unit_rows`.
+
+    Rows are yielded in `units` order as they are read from a server-side cursor.
+    """
+    if len(units) == 0:
+        return
+
+    if fields is None:
+        fields = FIELD_SETS['card']
+
+    property_ids = [str(property_id) for property_id in snapshot.property_ids[snapshot.unit_property[units]]]
+    rental_indexes = [int(rental_index) for rental_index in snapshot.rental_index[units]]
+    rental_keys = list(snapshot.rental_keys[units])
+    scores = list(scores)
+
+    # asyncpg prepares statements, so the unnest arguments need explicit array types.
+    query = text(f'''
+        SELECT u.position, {card_sql(fields, 'p', "p.data->'rentals'->u.rental_index")}
+        FROM unnest(CAST(:property_ids AS VARCHAR[]), CAST(:rental_indexes AS INTEGER[]))
+            WITH ORDINALITY AS u(property_id, rental_index, position)
+        JOIN properties p ON p.id = u.property_id
+        ORDER BY u.position
+    ''')
+
+    async with async_engine.connect() as connection:
+        if saved_keys is None:
+            result = await connection.execute(
+                text('SELECT rental_key FROM user_apartment WHERE user_id = :user_id AND rental_key = ANY(:rental_keys)'),
+                {'user_id': user_id, 'rental_keys': rental_keys},
+            )
+            saved_keys = set(result.scalars())
+
+        result = await connection.stream(query, {'property_ids': property_ids, 'rental_indexes': rental_indexes})
+        async for position, card in result:
+            i = position - 1
+            yield {
+                "property_id": property_ids[i],
+                "rental_key": rental_keys[i],
+                "card": card,
+                "score": scores[i],
+                "isSaved": rental_keys[i] in saved_keys,
+            }
+
+async def get_saved_apartments(user_id, fields=None):
+    """
+    Retrieve all saved apartments for a user, as `app.get_saved_apartments`.
+
+    Returns:
+        async generator of dicts: Saved apartments with `property_id`, `rental_key`, the projected `card` and `isSaved`.
+    """
+    if fields is None:
+        fields = FIELD_SETS['card']
+
+    query = text(f'''
+        SELECT DISTINCT ON (ua.rental_key)
+            p.id AS property_id,
+            ua.rental_key,
+            {card_sql(fields)} AS card
+        FROM
+            user_apartment ua
+        JOIN
+            rental_units ru ON ru.rental_key = ua.rental_key AND ru.property_id = ua.property_id
+        JOIN
+            properties p ON ru.property_id = p.id
+        WHERE
+            ua.user_id = :user_id
+    ''')
+
+    async with async_engine.connect() as connection:
+        result = await connection.stream(query, {'user_id': user_id})
+        async for row in result:
+            yield {
+                "property_id": row[0],
+                "rental_key": row[1],
+                "card": row[2],
+                "isSaved": True,
+            }
+
+def ndjson_response(rows, headers=None):
+    """
+    Stream rows as newline-delimited JSON, as `web.encoder.ndjson_response` for an async iterable.
+    """
+    async def generate():
+        async for row in rows:
+            yield dumps_bytes(row) + b'\n'
+
+    return Response(generate(), mimetype=NDJSON_MIMETYPE, headers=headers)
+
+def wants_ndjson():
+    """
+    Whether the client asked for a streamed `application/x-ndjson` response via the Accept header.
+    """
+    return request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+async def get_listing_etag(endpoint, user_id, include_recommendations=False, snapshot_task=None):
+    """
+    Derive the ETag of a listing response from version stamps, as `app.get_listing_etag`.
+
+    Ranked responses pass the task loading the catalog snapshot, whose version the tag also covers.
+
+    Returns:
+        tuple: (ETag value, user state version), both None when the stamps could not be read.
+    """
+    try:
+        stamps = await get_version_stamps_async(async_engine, user_id, include_recommendations)
+    except Exception:
+        traceback.print_exc()
+        return None, None
+
+    snapshot_version = None
+    if snapshot_task is not None:
+        try:
+            snapshot_version = (await snapshot_task).version
+        except Exception:
+            traceback.print_exc()
+
+    etag = make_etag(endpoint, user_id, stamps, snapshot_version, sorted(request.args.items(multi=True)), wants_ndjson())
+    return etag, stamps[1]
+
+def etag_headers(etag):
+    if etag is None:
+        return {}
+    return {'ETag': f'W/"{etag}"', 'Cache-Control': 'private, no-cache'}
+
+def not_modified(etag):
+    """
+    Whether the request's If-None-Match already holds `etag`.
+    """
+    return etag is not None and request.if_none_match.contains_weak(etag)
+
+def background(coroutine):
+    """
+    Run a coroutine as a task that a request may return without awaiting, e.g. on a 304 or an
+    auth error, without its result or exception being reported as never retrieved.
+    """
+    task = asyncio.create_task(coroutine)
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    return task
+
+def load_snapshot():
+    """
+    Start loading the catalog snapshot in a thread. Usually finishes at once from the worker's copy.
+    """
+    return background(asyncio.to_thread(get_catalog_snapshot, engine))
+
+@app.route('/get_recommendations', methods=['GET'])
+async def get_recs_api():
+    """
+	API endpoint to get property recommendations for a user based on their stored preferences.
+
+	Same parameters and responses as `/get_recommendations` of `app.py`. The token is verified
+	and the ETag stamps are read while the catalog snapshot is checked, and in interactions mode
+	the precomputed recommendations are read alongside the stamps. Users whose ranking fails on
+	the snapshot get an error instead of the raw SQL fallback of the WSGI app.
+	"""
+    authorization = request.headers.get('Authorization', None)
+
+    if authorization is None:
+        return jsonify({ 'error': { 'status': 401, 'code': 'OC.AUTHENTICATION.UNAUTHORIZED', 'message': 'Bearer token not supplied in save apartments request.' } }), 401
+
+    jwt_token = authorization.split()[1]
+
+    snapshot_task = load_snapshot()
+
+    user_id = ''
+    try:
+        user_id = await get_user_id_async(jwt_token, http_client)
+    except:
+        traceback.print_exc()
+        return jsonify({ 'error': { 'status': 500, 'code': 'OC.AUTHENTICATION.TOKEN_ERROR', 'message': 'Token failed to be verified' }, 'results': [] }), 500
+
+    mode = request.args.get('mode', 'preferences')
+    if mode not in ('preferences', 'interactions'):
+        return jsonify({ 'error': { 'status': 400, 'code': 'OC.BUSINESS.INVALID_MODE', 'message': 'mode must be preferences or interactions.' }, 'results': [] }), 400
+
+    try:
+        fields = parse_fields(request.args.get('fields'), full='recommendations')
+    except ValueError as e:
+        return jsonify({ 'error': { 'status': 400, 'code': 'OC.BUSINESS.INVALID_FIELDS', 'message': str(e) }, 'results': [] }), 400
+
+    try:
+        filters = detail_filters(request.args)
+    except ValueError as e:
+        return jsonify({ 'error': { 'status': 400, 'code': 'OC.BUSINESS.INVALID_FILTER', 'message': str(e) }, 'results': [] }), 400
+
+    page = int(request.args.get('page', 1))
+    limit = int(request.args.get('limit', 10))
+
+    cursor = request.args.get('cursor', None)
+    if cursor:
+        try:
+            cursor = decode_cursor(cursor)
+        except ValueError:
+            return jsonify({ 'error': { 'status': 400, 'code': 'OC.BUSINESS.INVALID_CURSOR', 'message': 'The supplied cursor could not be read.' }, 'results': [] }), 400
+    else:
+        cursor = None
+
+    stream = wants_ndjson()
+
+    try:
+        if mode == 'interactions':
+            (etag, user_version), recs = await asyncio.gather(
+                get_listing_etag('get_recommendations', user_id, True, snapshot_task),
+                get_recs_interactions(snapshot_task, user_id, page, limit, cursor, fields, filters),
+            )
+        else:
+            # The preferences are read after the stamps: cached preferences are only used when
+            # they were stored at the same user state version the ETag covers.
+            etag, user_version = await get_listing_etag('get_recommendations', user_id, snapshot_task=snapshot_task)
+            recs = None
+
+        if not_modified(etag):
+            return '', 304, etag_headers(etag)
+
+        if recs is None:
+            recs = await get_recs_snapshot(snapshot_task, user_id, page, limit, cursor, fields, filters, user_version)
+
+        if stream:
+            return ndjson_response((build_card(rec['card'], fields, rec['score'], rec['isSaved']) async for rec in recs), etag_headers(etag))
+
+        recs = [rec async for rec in recs]
+        simplified_recs = [build_card(rec['card'], fields, rec['score'], rec['isSaved']) for rec in recs]
+
+        headers = etag_headers(etag)
+        if len(recs) == limit:
+            headers['X-Next-Cursor'] = encode_cursor(recs[-1]['score'], recs[-1]['rental_key'])
+
+        return jsonify(simplified_recs), 200, headers
+
+    except Exception as e:
+        print(e)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/get_saved_apartments', methods=['GET'])
+async def get_saved_apartments_api():
+    """
+    API endpoint to get all saved apartments for a user.
+
+    Same parameters and responses as `/get_saved_apartments` of `app.py`.
+    """
+    authorization = request.headers.get('Authorization', None)
+
+    if authorization is None:
+        return jsonify({ 'error': { 'status': 401, 'code': 'OC.AUTHENTICATION.UNAUTHORIZED', 'message': 'Bearer token not supplied in get saved apartments request.' } }), 401
+
+    jwt_token = authorization.split()[1]
+
+    user_id = ''
+    try:
+        user_id = await get_user_id_async(jwt_token, http_client)
+    except:
+        traceback.print_exc()
+        return jsonify({ 'error': { 'status': 500, 'code': 'OC.AUTHENTICATION.TOKEN_ERROR', 'message': 'Token failed to be verified' }, 'results': [] }), 500
+
+    try:
+        fields = parse_fields(request.args.get('fields'), full='saved')
+    except ValueError as e:
+        return jsonify({ 'error': { 'status': 400, 'code': 'OC.BUSINESS.INVALID_FIELDS', 'message': str(e) }, 'results': [] }), 400
+
+    etag, _ = await get_listing_etag('get_saved_apartments', user_id)
+    if not_modified(etag):
+        return '', 304, etag_headers(etag)
+
+    try:
+        cards = (build_card(apartment['card'], fields, is_saved=apartment['isSaved']) async for apartment in get_saved_apartments(user_id, fields))
+        if wants_ndjson():
+            return ndjson_response(cards, etag_headers(etag))
+
+        simplified_apartments = [card async for card in cards]
+
+        return jsonify(simplified_apartments), 200, etag_headers(etag)
+
+    except Exception as e:
+        print(e)
+        return jsonify({'error': str(e)}), 500
+
+@app.post('/apartments/save')
+async def save_apartment():
+    """
+    API endpoint to save an apartment for a user.
+
+    Same body and responses as `/apartments/save` of `app.py`.
+    """
+    authorization = request.headers.get('Authorization', None)
+
+    if authorization is None:
+        return jsonify({ 'error': { 'status': 401, 'code': 'OC.AUTHENTICATION.UNAUTHORIZED', 'message': 'Bearer token not supplied in save apartments request.' } }), 401
+
+    jwt_token = authorization.split()[1]
+
+    user_id = ''
+    try:
+        user_id = await get_user_id_async(jwt_token, http_client)
+    except:
+        traceback.print_exc()
+        return jsonify({ 'error': { 'status': 500, 'code': 'OC.AUTHENTICATION.TOKEN_ERROR', 'message': 'Token failed to be verified' }, 'results': [] }), 500
+
+    body = await request.get_json()
+    property_id = body.get('property_id', None)
+    rental_key = body.get('rental_key', None)
+    if property_id is None:
+        return jsonify({ 'error': { 'status': 500, 'code': 'OC.BUSINESS.PARAMETER_NOT_GIVEN', 'message': 'A property id was not supplied. Failed to save apartment.' }, 'results': [] }), 500
+    if rental_key is None:
+        return jsonify({ 'error': { 'status': 500, 'code': 'OC.BUSINESS.PARAMETER_NOT_GIVEN', 'message': 'A rental unit id was not supplied. Failed to save apartment.' }, 'results': [] }), 500
+
+    saved_apartment = { 'user_id': user_id, 'property_id': property_id, 'rental_key': rental_key }
+
+    try:
+        data, count = await asyncio.to_thread(supabase.table('user_apartment').insert(saved_apartment).execute)
+    except:
+        return jsonify({ 'error': { 'status': 500, 'code': 'OC.APARTMENT.SAVE_FAILURE', 'message': 'Failed to update database with saved apartment' }, 'results': [] }), 500
+
+    if data[1] and len(data[1]) > 0:
+        await asyncio.to_thread(ranked_cache.invalidate_saved, user_id)
+        return jsonify({ 'results': [{ 'code': 'OC.MESSAGE.SUCCESS', 'message': 'Successfully saved apartment' }], 'data': data[1] }), 200
+
+    return jsonify({ 'error': { 'status': 500, 'code': 'OC.BUSINESS.DATABASE_FAILURE', 'message': 'Failed to update database for an unknown reason' }, 'results': [] }), 500
+
+@app.post('/apartments/remove')
+async def remove_saved_apartment():
+    """
+    API endpoint to remove a saved apartment from a user.
+
+    Same body and responses as `/apartments/remove` of `app.py`.
+    """
+    authorization = request.headers.get('Authorization', None)
+
+    if authorization is None:
+        return jsonify({ 'error': { 'status': 401, 'code': 'OC.AUTHENTICATION.UNAUTHORIZED', 'message': 'Bearer token not supplied in remove apartments request.' } }), 401
+
+    jwt_token = authorization.split()[1]
+
+    user_id = ''
+    try:
+        user_id = await get_user_id_async(jwt_token, http_client)
+    except:
+        traceback.print_exc()
+        return jsonify({ 'error': { 'status': 500, 'code': 'OC.AUTHENTICATION.TOKEN_ERROR', 'message': 'Token failed to be verified' }, 'results': [] }), 500
+
+    body = await request.get_json()
+    property_id = body.get('property_id', None)
+    rental_key = body.get('rental_key', None)
+    if property_id is None:
+        return jsonify({ 'error': { 'status': 500, 'code': 'OC.BUSINESS.PARAMETER_NOT_GIVEN', 'message': 'A property id was not supplied. Failed to remove saved apartment from user account.' }, 'results': [] }), 500
+    if rental_key is None:
+        return jsonify({ 'error': { 'status': 500, 'code': 'OC.BUSINESS.PARAMETER_NOT_GIVEN', 'message': 'A rental unit id was not supplied. Failed to remove saved apartment from user account.' }, 'results': [] }), 500
+
+    removed_apartment = { 'user_id': user_id, 'property_id': property_id, 'rental_key': rental_key }
+
+    try:
+        data, count = await asyncio.to_thread(supabase.table('user_apartment').delete().match(removed_apartment).execute)
+    except:
+        return jsonify({ 'error': { 'status': 500, 'code': 'OC.APARTMENT.REMOVE_FAILURE', 'message': 'Failed to remove saved apartment from user account.' }, 'results': [] }), 500
+
+    if data[1] and len(data[1]) > 0:
+        await asyncio.to_thread(ranked_cache.invalidate_saved, user_id)
+        return jsonify({ 'results': [{ 'code': 'OC.MESSAGE.SUCCESS', 'message': 'Successfully removed apartment from user.' }], 'data': data[1] })
+
+    return jsonify({ 'error': { 'status': 500, 'code': 'OC.BUSINESS.DATABASE_FAILURE', 'message': 'Failed to update database for an unknown reason' }, 'results': [] }), 500
+
+@app.post('/update_classes')
+async def update_classes():
+    """
+    API endpoint to replace a user's classes.
+
+    Same body and responses as `/update_classes` of `app.py`.
+    """
+    authorization = request.headers.get('Authorization', None)
+
+    if authorization is None:
+        return jsonify({ 'error': { 'status': 401, 'code': 'OC.AUTHENTICATION.UNAUTHORIZED', 'message': 'Bearer token not supplied in update classes request.' } }), 401
+
+    jwt_token = authorization.split()[1]
+
+    user_id = ''
+    try:
+        user_id = await get_user_id_async(jwt_token, http_client)
+    except:
+        traceback.print_exc()
+        return jsonify({ 'error': { 'status': 500, 'code': 'OC.AUTHENTICATION.TOKEN_ERROR', 'message': 'Token failed to be verified' }, 'results': [] }), 500
+
+    body = await request.get_json(silent=False)
+
+    new_classes = body.get('new_classes', None)
+
+    if new_classes is None:
+        return jsonify({'error': {'status': 400, 'code': 'OC.UPDATE.MISSING_FIELD', 'message': 'New classes value not provided.'}}), 400
+
+    response = await asyncio.to_thread(supabase.table("User").update({'classes': new_classes}).eq('id', user_id).execute)
+    user_context.invalidate(user_id)
+
+    if response:
+        return jsonify(response.data[0]['classes']), 200
+    else:
+        return jsonify({'error': {'status': 404, 'code': 'OC.UPDATE.NOT_FOUND', 'message': 'User not found.'}}), 404
@@ -0,0 +1,162 @@
+from jwt import PyJWKClient, PyJWKSet
+from jwt.exceptions import PyJWKClientError
+import asyncio
+import json
+import os
+import threading
+import time
+
+class JWKSKeyStore:
+    """
+    Signing keys by key id, refreshed from the JWKS endpoint in a background thread.
+
+    The store can be seeded from a local JWKS file so tests and cold starts can verify tokens
+    without waiting on the network. The endpoint is only fetched inline when a token names a
+    key id the store has never seen, and at most once every `min_refetch_interval` seconds after
+    a successful fetch. One fetch runs at a time; lookups that arrive while it runs wait for it
+    and then check the keys again, so a cold start's concurrent requests share the first fetch.
+    The background thread starts once the first lookup has finished.
+    """
+
+    def __init__(self, url, seed_path=None, refresh_interval=3600, min_refetch_interval=60):
+        self.url = url
+        self.client = PyJWKClient(url, cache_jwk_set=False)
+        self.refresh_interval = refresh_interval
+        self.min_refetch_interval = min_refetch_interval
+        self.keys = {}
+        self._last_fetch = None
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+        self._async_fetch_lock = asyncio.Lock()
+        self._refresher = None
+
+        if seed_path and os.path.exists(seed_path):
+            self.load_file(seed_path)
+
+    def load_file(self, path):
+        """
+        Add the keys of a local JWKS file.
+
+        Args:
+            path (str): Path to a JSON Web Key Set document.
+        """
+        with open(path) as f:
+            self._add_keys(json.load(f))
+
+    def refresh(self):
+        """
+        Fetch the JWKS endpoint and add its keys. Keys from earlier fetches or the seed file are kept.
+        """
+        with self._fetch_lock:
+            self._fetch()
+
+    async def refresh_async(self, http_client):
+        """
+        `refresh` for the async request path: fetch the JWKS endpoint without blocking the event loop.
+
+        Args:
+            http_client (httpx.AsyncClient): Shared async HTTP client.
+        """
+        async with self._async_fetch_lock:
+            await self._fetch_async(http_client)
+
+    def start_background_refresh(self):
+        """
+        Start the daemon thread that refreshes the keys every `refresh_interval` seconds.
+        """
+        with self._lock:
+            if self._refresher is not None:
+                return
+            self._refresher = threading.Thread(target=self._refresh_loop, name='jwks-refresh', daemon=True)
+            self._refresher.start()
+
+    def get_signing_key(self, kid):
+        """
+        Look up the signing key for a key id.
+
+        Args:
+            kid (str): Key id from the token header.
+
+        Returns:
+            PyJWK: The matching signing key.
+
+        Raises:
+            PyJWKClientError: If no key with that id is known, even after refetching the endpoint.
+        """
+        signing_key = self.keys.get(kid)
+        if signing_key is None:
+            with self._fetch_lock:
+                signing_key = self.keys.get(kid)
+                if signing_key is None and not self._fetched_within(self.min_refetch_interval):
+                    self._fetch()
+                    signing_key = self.keys.get(kid)
+
+        self.start_background_refresh()
+
+        if signing_key is None:
+            raise PyJWKClientError(f'Unable to find a signing key that matches: "{kid}"')
+
+        return signing_key
+
+    async def get_signing_key_async(self, kid, http_client):
+        """
+        `get_signing_key` for the async request path.
+
+        Args:
+            kid (str): Key id from the token header.
+            http_client (httpx.AsyncClient): Shared async HTTP client, used when the key id is unknown.
+
+        Returns:
+            PyJWK: The matching signing key.
+
+        Raises:
+            PyJWKClientError: If no key with that id is known, even after refetching the endpoint.
+        """
+        signing_key = self.keys.get(kid)
+        if signing_key is None:
+            async with self._async_fetch_lock:
+                signing_key = self.keys.get(kid)
+                if signing_key is None and not self._fetched_within(self.min_refetch_interval):
+                    await self._fetch_async(http_client)
+                    signing_key = self.keys.get(kid)
+
+        self.start_background_refresh()
+
+        if signing_key is None:
+            raise PyJWKClientError(f'Unable to find a signing key that matches: "{kid}"')
+
+        return signing_key
+
+    def _fetch(self):
+        # Stamped only once the keys are in, so a failed fetch is retried by the next lookup.
+        self._add_keys(self.client.fetch_data())
+        self._last_fetch = time.monotonic()
+
+    async def _fetch_async(self, http_client):
+        response = await http_client.get(self.url)
+        response.raise_for_status()
+        self._add_keys(response.json())
+        self._last_fetch = time.monotonic()
+
+    def _add_keys(self, data):
+        jwk_set = PyJWKSet.from_dict(data)
+        with self._lock:
+            keys = dict(self.keys)
+            for key in jwk_set.keys:
+                if key.public_key_use in ['sig', None] and key.key_id:
+                    keys[key.key_id] = key
+
+            # Swap the whole map so readers never see a partially updated one.
+            self.keys = keys
+
+    def _fetched_within(self, seconds):
+        return self._last_fetch is not None and time.monotonic() - self._last_fetch < seconds
+
+    def _refresh_loop(self):
+        while True:
+            if not self._fetched_within(self.refresh_interval):
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f'JWKS refresh failed: {e}')
+            time.sleep(min(self.refresh_interval, 60))
@@ -1,10 +1,70 @@
-from jwt import PyJWKClient, decode
+from jwt import decode, get_unverified_header
+from auth.jwks import JWKSKeyStore
+from collections import OrderedDict
+import hashlib
+import os
+import threading
+import time
+from dotenv import dotenv_values
 
-jwks_client = PyJWKClient('https://grand-skunk-35.clerk.accounts.dev/.well-known/jwks.json')
+JWKS_URL = 'https://grand-skunk-35.clerk.accounts.dev/.well-known/jwks.json'
 
-def get_user_id(token):
-    signing_key = jwks_client.get_signing_key_from_jwt(token)
-    user_data = decode(
+# Upper bound on how long verified claims are reused, for tokens without an `exp` claim.
+MAX_CLAIMS_TTL = 300
+
+class VerifiedTokenCache:
+    """
+    Verified JWT claims keyed by a hash of the token, kept until the token's `exp`.
+    """
+
+    def __init__(self, max_entries=4096, max_ttl=MAX_CLAIMS_TTL):
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def token_hash(token):
+        return hashlib.sha256(token.encode('utf-8')).digest()
+
+    def get(self, token):
+        key = self.token_hash(token)
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+
+            expires, claims = item
+            if expires <= time.time():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return claims
+
+    def put(self, token, claims):
+        now = time.time()
+        expires = now + self.max_ttl
+        if isinstance(claims.get('exp'), (int, float)):
+            expires = min(expires, claims['exp'])
+        if expires <= now:
+            return
+
+        with self._lock:
+            self._entries[self.token_hash(token)] = (expires, claims)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+config = {
+    **dotenv_values(".env"),  # load development variables
+    **os.environ,  # override loaded values with environment variables
+}
+
+jwks_keys = JWKSKeyStore(JWKS_URL, seed_path=config.get('JWKS_FILE'))
+verified_tokens = VerifiedTokenCache()
+
+def verify_token(token, signing_key):
+    claims = decode(
         token,
         signing_key.key,
         algorithms=['RS256'],
@@ -14,4 +74,25 @@ def get_user_id(token):
             'verify_exp': False
         }
     )
-    return user_data.get('sub')
\ No newline at end of file
+    verified_tokens.put(token, claims)
+    return claims
+
+def get_user_id(token):
+    claims = verified_tokens.get(token)
+    if claims is None:
+        signing_key = jwks_keys.get_signing_key(get_unverified_header(token).get('kid'))
+        claims = verify_token(token, signing_key)
+
+    return claims.get('sub')
+
+async def get_user_id_async(token, http_client):
+    """
+    `get_user_id` for the async request path: an unknown key id is fetched with `http_client`
+    instead of blocking the event loop.
+    """
+    claims = verified_tokens.get(token)
+    if claims is None:
+        signing_key = await jwks_keys.get_signing_key_async(get_unverified_header(token).get('kid'), http_client)
+        claims = verify_token(token, signing_key)
+
+    return claims.get('sub')
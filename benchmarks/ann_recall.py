@@ -0,0 +1,101 @@
+"""
+Recall@k and single-query throughput of the approximate (IVF) nearest-neighbour backend
+against exact search, on a synthetically scaled copy of the scraper dataset.
+
+The dataset's rentals are resampled with jittered rent, size, rating, walk score and location
+until the catalog has --rows rows, then encoded the way the serving index encodes them.
+
+Usage:
+    python benchmarks/ann_recall.py [--dataset dataset_apartments-scraper_*.json] [--rows 200000] [--queries 200] [--probes 1,2,4,8,16]
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recs.knn_index import CompactPreprocessor, feature_row
+from recs.neighbors import ExactNeighbors, IVFNeighbors
+
+NUMERIC_COLUMNS = ['rent', 'squareFeet', 'walkScore', 'rating', 'latitude', 'longitude']
+JITTER = {'rent': 0.1, 'squareFeet': 0.1, 'walkScore': 0.1, 'rating': 0.05}
+LOCATION_JITTER = 0.05
+
+def load_rows(path):
+    with open(path) as f:
+        properties = json.load(f)
+
+    return [feature_row(p, r) for p in properties for r in p.get('rentals', []) if r.get('key') is not None]
+
+def fit_preprocessor(rows):
+    numeric = np.array([[np.nan if row[c] is None else row[c] for c in NUMERIC_COLUMNS] for row in rows], dtype=np.float64)
+    mean = np.nanmean(numeric, axis=0)
+    scale = np.nanstd(numeric, axis=0)
+    scale[scale == 0] = 1.0
+
+    return CompactPreprocessor(
+        numeric_columns=NUMERIC_COLUMNS,
+        impute=mean,
+        mean=mean,
+        scale=scale,
+        categorical_column='details',
+        fill_value='missing',
+        vocabulary=sorted({row['details'] for row in rows}),
+    )
+
+def synthesize(rows, n, rng):
+    synthetic = []
+    for i in rng.integers(0, len(rows), n):
+        row = dict(rows[i])
+        for column, spread in JITTER.items():
+            if row[column] is not None:
+                row[column] = row[column] * (1 + rng.normal(0, spread))
+        row['latitude'] += rng.normal(0, LOCATION_JITTER)
+        row['longitude'] += rng.normal(0, LOCATION_JITTER)
+        synthetic.append(row)
+    return synthetic
+
+def single_query_qps(model, queries, k):
+    start = time.perf_counter()
+    results = [model.kneighbors(query[None, :], n_neighbors=k)[1][0] for query in queries]
+    return len(queries) / (time.perf_counter() - start), np.array(results)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dataset', default=None)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=20)
+    parser.add_argument('--probes', default='1,2,4,8,16')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    dataset = args.dataset or sorted(glob.glob('dataset_apartments-scraper_*.json'))[-1]
+    rng = np.random.default_rng(args.seed)
+
+    base = load_rows(dataset)
+    preprocessor = fit_preprocessor(base)
+    X = preprocessor.transform(synthesize(base, args.rows, rng))
+    queries = preprocessor.transform(synthesize(base, args.queries, rng))
+    print(f'{dataset}: {len(base)} rentals scaled to {len(X)} rows x {X.shape[1]} features, {len(queries)} queries, k={args.k}')
+
+    exact = ExactNeighbors().fit(X)
+    exact_qps, truth = single_query_qps(exact, queries, args.k)
+    print(f'exact          qps={exact_qps:9.1f}  recall@{args.k}=1.000')
+
+    for n_probe in [int(p) for p in args.probes.split(',')]:
+        start = time.perf_counter()
+        ivf = IVFNeighbors(n_probe=n_probe, seed=args.seed).fit(X)
+        fit_seconds = time.perf_counter() - start
+
+        qps, found = single_query_qps(ivf, queries, args.k)
+        recall = np.mean([len(np.intersect1d(a, b)) / args.k for a, b in zip(found, truth)])
+        print(f'ivf n_probe={n_probe:<3} qps={qps:9.1f}  recall@{args.k}={recall:.3f}  speedup={qps / exact_qps:5.1f}x  fit={fit_seconds:.1f}s')
+
+if __name__ == '__main__':
+    main()
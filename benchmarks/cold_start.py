@@ -0,0 +1,70 @@
+"""
+Compare worker cold start for the two ways of loading the v2 recommendation model.
+
+Each variant runs in a fresh interpreter, so the numbers include importing its dependencies:
+
+    joblib   imports sklearn/pandas and unpickles preprocessor.joblib + knn_model.joblib
+    compact  memory-maps the exported knn_index/ directory with NumPy only
+
+Usage:
+    python benchmarks/cold_start.py [--preprocessor preprocessor.joblib] [--model knn_model.joblib] [--index knn_index] [--runs 5]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+VARIANTS = {
+    'joblib': '''
+import time, resource
+start = time.perf_counter()
+import pandas
+from joblib import load
+load({preprocessor!r})
+load({model!r})
+elapsed = time.perf_counter() - start
+print(elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+''',
+    'compact': '''
+import time, resource
+start = time.perf_counter()
+from recs.knn_index import KNNServingIndex
+KNNServingIndex.load({index!r})
+elapsed = time.perf_counter() - start
+print(elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+''',
+}
+
+def run(code, runs):
+    timings = []
+    rss = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True, capture_output=True, text=True).stdout
+        elapsed, maxrss = output.split()
+        timings.append(float(elapsed))
+        rss.append(int(maxrss))
+
+    timings.sort()
+    return {'median_s': timings[len(timings) // 2], 'max_rss_mb': max(rss) / 1024}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--preprocessor', default='preprocessor.joblib')
+    parser.add_argument('--model', default='knn_model.joblib')
+    parser.add_argument('--index', default='knn_index')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    paths = {
+        'preprocessor': os.path.abspath(args.preprocessor),
+        'model': os.path.abspath(args.model),
+        'index': os.path.abspath(args.index),
+    }
+    results = {name: run(code.format(**paths), args.runs) for name, code in VARIANTS.items()}
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
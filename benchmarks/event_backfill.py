@@ -0,0 +1,86 @@
+"""
+Throughput of the event backfill (events.backfill) across worker counts, on synthetic
+Firehose objects.
+
+Objects are written to a temporary directory laid out like the event bucket
+(YYYY/MM/DD/HH/<object>), each holding --events concatenated analytics events. The backfill
+is run once per worker count and checked to give the same profiles as the single-worker run.
+
+Usage:
+    python benchmarks/event_backfill.py [--objects 64] [--events 5000] [--users 5000] [--properties 2000] [--workers 1,2,4,8]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from events.backfill import backfill
+from events.sources import LocalObjectStore
+
+ACTIONS = ['APARTMENT_DETAILS_VIEW_START', 'APARTMENT_DETAILS_VIEW_END', 'SAVE_APARTMENT']
+
+def synthetic_event(rng, n_users, n_properties):
+    return {
+        'userId': f'user-{rng.randrange(n_users)}',
+        'type': rng.choice(ACTIONS),
+        'metrics': {'totalTime': rng.randrange(120000)},
+        'apartmentProperty': {
+            'propertyId': f'property-{rng.randrange(n_properties)}',
+            'details': ['Pool', 'Gym', 'In Unit Washer & Dryer'][:rng.randrange(4)],
+            'rent': rng.randrange(500, 2500),
+            'squareFeet': rng.randrange(300, 1600),
+            'rating': rng.choice([None, 3.5, 4.0, 4.5]),
+        },
+    }
+
+def write_objects(root, n_objects, n_events, n_users, n_properties, seed):
+    rng = random.Random(seed)
+    size = 0
+    for i in range(n_objects):
+        partition = os.path.join(root, '2024', '04', f'{24 + i // 96:02d}', f'{(i // 4) % 24:02d}')
+        os.makedirs(partition, exist_ok=True)
+        path = os.path.join(partition, f'OffCampus-Analytics-1-{i:05d}')
+        with open(path, 'w') as f:
+            for _ in range(n_events):
+                f.write(json.dumps(synthetic_event(rng, n_users, n_properties)))
+        size += os.path.getsize(path)
+    return size
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--objects', type=int, default=64)
+    parser.add_argument('--events', type=int, default=5000)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--properties', type=int, default=2000)
+    parser.add_argument('--workers', default='1,2,4,8')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        size = write_objects(root, args.objects, args.events, args.users, args.properties, args.seed)
+        store = LocalObjectStore(root)
+        keys = list(store.list_keys())
+        print(f'{len(keys)} objects, {len(keys) * args.events} events, {size / 1e6:.1f} MB, {os.cpu_count()} CPUs')
+
+        baseline = None
+        for workers in [int(w) for w in args.workers.split(',')]:
+            start = time.perf_counter()
+            profiles, n_events = backfill(store, keys, workers)
+            elapsed = time.perf_counter() - start
+
+            result = profiles.to_profiles()
+            if baseline is None:
+                baseline, baseline_seconds = result, elapsed
+            elif result != baseline:
+                raise AssertionError(f'{workers} workers gave different profiles')
+
+            print(f'workers={workers:<3} {elapsed:6.2f}s  {n_events / elapsed:9.0f} events/s  '
+                  f'{size / 1e6 / elapsed:6.1f} MB/s  speedup={baseline_seconds / elapsed:4.1f}x')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+import numpy as np
+
+# Amenities are matched case- and whitespace-insensitively; `SYNC_RENTAL_UNITS_SQL` applies the
+# same normalization when it projects them into `rental_units.amenities`.
+def normalize_amenity(name):
+    """
+    Canonical form of an amenity or detail label, e.g. ' Washer/Dryer ' -> 'washer/dryer'.
+    """
+    return ' '.join(name.split()).lower()
+
+def parse_amenities(values):
+    """
+    Resolve `amenities=` query parameters to normalized amenity names.
+
+    Args:
+        values (list of str): Parameter values, each a comma-separated list of amenities.
+
+    Returns:
+        list of str: Normalized names without duplicates, sorted so equal filters hash alike.
+    """
+    names = {normalize_amenity(name) for value in values for name in value.split(',')}
+    names.discard('')
+    return sorted(names)
+
+def parse_beds(value):
+    """
+    Resolve a `beds=` query parameter, e.g. `studio,1`, `2` or `3+`.
+
+    Args:
+        value (str or None): Comma-separated bed counts. `studio` is 0 and `N+` means N or more.
+
+    Returns:
+        tuple: (sorted exact bed counts, minimum bed count or None). Both empty/None without a filter.
+
+    Raises:
+        ValueError: If a value is not a bed count.
+    """
+    beds = set()
+    min_beds = None
+    for part in (value or '').split(','):
+        part = part.strip().lower()
+        if not part:
+            continue
+
+        at_least = part.endswith('+')
+        part = part.rstrip('+')
+        try:
+            count = 0.0 if part == 'studio' else float(part)
+        except ValueError:
+            raise ValueError(f'Invalid bed count {part!r}')
+
+        if at_least:
+            min_beds = count if min_beds is None else min(min_beds, count)
+        else:
+            beds.add(count)
+
+    return sorted(beds), min_beds
+
+def detail_filters(args):
+    """
+    Read the `amenities=` and `beds=` filters from query arguments.
+
+    `amenities` is a comma-separated (or repeated) list of must-have amenities or unit details,
+    e.g. `amenities=washer/dryer,dishwasher`. `beds` takes bed counts, `studio` and `N+`, e.g. `beds=2`.
+
+    Args:
+        args (MultiDict): The request's query arguments.
+
+    Returns:
+        dict: `amenities`, `beds` and `min_beds`, only for the filters given, so unfiltered
+              requests keep the same preference hash.
+
+    Raises:
+        ValueError: If `beds` cannot be read.
+    """
+    filters = {}
+    amenities = parse_amenities(args.getlist('amenities'))
+    if amenities:
+        filters['amenities'] = amenities
+
+    beds, min_beds = parse_beds(args.get('beds'))
+    if beds:
+        filters['beds'] = beds
+    if min_beds is not None:
+        filters['min_beds'] = min_beds
+    return filters
+
+class AmenityIndex:
+    """
+    Vocabulary-encoded amenity bitsets, one row of packed uint64 words per unit.
+
+    Bit `vocabulary[name]` of a unit's row is set when the unit lists that amenity or detail, so a
+    must-have filter is an AND of a few words per unit. Built from the normalized amenity names
+    of each unit, in unit order.
+    """
+
+    def __init__(self, unit_amenities):
+        self.vocabulary = {}
+        units = []
+        bits = []
+        for unit, names in enumerate(unit_amenities):
+            for name in names:
+                bit = self.vocabulary.setdefault(name, len(self.vocabulary))
+                units.append(unit)
+                bits.append(bit)
+
+        n_words = max(1, (len(self.vocabulary) + 63) // 64)
+        self.bits = np.zeros((len(unit_amenities), n_words), dtype=np.uint64)
+        if units:
+            units = np.array(units, dtype=np.intp)
+            bits = np.array(bits, dtype=np.uint64)
+            np.bitwise_or.at(self.bits, (units, (bits // 64).astype(np.intp)), np.left_shift(np.uint64(1), bits % 64))
+
+    def __len__(self):
+        return len(self.vocabulary)
+
+    def mask(self, names, units=None):
+        """
+        Units having every one of the amenities.
+
+        Args:
+            names (list of str): Normalized amenity names.
+            units (numpy.ndarray, optional): Only test these units.
+
+        Returns:
+            numpy.ndarray: Boolean mask over units (or aligned with `units`). All False when a
+                           name is not in the vocabulary.
+        """
+        bits = self.bits if units is None else self.bits[units]
+        required = np.zeros(self.bits.shape[1], dtype=np.uint64)
+        for name in names:
+            bit = self.vocabulary.get(name)
+            if bit is None:
+                return np.zeros(len(bits), dtype=bool)
+            required[bit // 64] |= np.uint64(1) << np.uint64(bit % 64)
+
+        words = np.flatnonzero(required)
+        if len(words) == 0:
+            return np.ones(len(bits), dtype=bool)
+        return np.all((bits[:, words] & required[words]) == required[words], axis=1)
@@ -0,0 +1,111 @@
+from sqlalchemy import text
+from collections import OrderedDict
+import threading
+
+# Upper bound on keys per batch details request (comparison screens show a handful).
+MAX_BATCH_KEYS = 50
+
+class PropertyCache:
+    """
+    Bounded LRU of property JSON by id for the detail endpoint.
+
+    Entries are tagged with the catalog content version they were read at and ignored once the
+    catalog moves on, so an ingest or sync is picked up without explicit invalidation.
+    """
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, engine, property_ids, version):
+        """
+        Get property JSON for several ids, reading every uncached one in a single query.
+
+        Args:
+            engine (Engine): SQLAlchemy engine for the catalog database.
+            property_ids (iterable of str): Property ids.
+            version (int): Current catalog content version.
+
+        Returns:
+            dict: property_id -> property data, for the ids that exist.
+        """
+        found = {}
+        missing = []
+        with self._lock:
+            for property_id in dict.fromkeys(property_ids):
+                item = self._entries.get(property_id)
+                if item is not None and item[0] == version:
+                    self._entries.move_to_end(property_id)
+                    found[property_id] = item[1]
+                else:
+                    missing.append(property_id)
+
+        if not missing:
+            return found
+
+        with engine.connect() as connection:
+            rows = connection.execute(
+                text('SELECT id, data FROM properties WHERE id = ANY(:property_ids)'),
+                {'property_ids': missing},
+            ).fetchall()
+
+        with self._lock:
+            for property_id, data in rows:
+                found[property_id] = data
+                self._entries[property_id] = (version, data)
+                self._entries.move_to_end(property_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        return found
+
+def apartment_detail(property_id, property_data, rental_object, is_saved):
+    """
+    Detail view of one rental unit: the full listing card plus the property-level sections.
+
+    Args:
+        property_id (str): Property ID.
+        property_data (dict): Property JSON.
+        rental_object (dict): The unit's entry in `rentals`.
+        is_saved (bool): Whether the user saved the unit.
+
+    Returns:
+        dict: Detail payload.
+    """
+    price = (property_data.get('models') or [{}])[0].get('rentLabel', 'N/A')
+    return {
+        'propertyId': property_id,
+        'key': rental_object.get('key'),
+        'name': property_data.get('propertyName', 'N/A'),
+        'modelName': rental_object.get('modelName'),
+        'rent': rental_object.get('rent'),
+        'maxRent': rental_object.get('maxRent'),
+        'modelImage': rental_object.get('image'),
+        'address': property_data.get('location', {}).get('fullAddress', 'N/A'),
+        'latitude': property_data.get('coordinates', {}).get('latitude', 'N/A'),
+        'longitude': property_data.get('coordinates', {}).get('longitude', 'N/A'),
+        'price': price.replace('/ Person', '').strip(),
+        'photos': property_data.get('photos', []),
+        'details': rental_object.get('details', {}),
+        'beds': rental_object.get('beds'),
+        'baths': rental_object.get('baths'),
+        'squareFeet': rental_object.get('squareFeet'),
+        'availableDate': rental_object.get('availableDate'),
+        'availability': rental_object.get('availability'),
+        'isNew': rental_object.get('isNew'),
+        'features': rental_object.get('interiorAmenities'),
+        'unitDescription': rental_object.get('description'),
+        'applyNowUrl': rental_object.get('applyNowUrl'),
+        'hasKnownAvailabilities': rental_object.get('hasKnownAvailabilities'),
+        'rating': property_data.get('rating'),
+        'scores': property_data.get('scores'),
+        'phoneNumber': property_data.get('contact', {}).get('phone'),
+        'description': property_data.get('description'),
+        'neighborhoodDescription': property_data.get('neighborhoodDescription'),
+        'amenities': property_data.get('amenities'),
+        'fees': property_data.get('fees'),
+        'schools': property_data.get('schools'),
+        'transitAndPOI': property_data.get('transitAndPOI'),
+        'isSaved': is_saved,
+    }
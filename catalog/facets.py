@@ -0,0 +1,147 @@
+from datetime import date
+import numpy as np
+
+# Histogram bins: fixed-width buckets from 0, the last one open-ended.
+RENT_BIN_WIDTH = 100
+RENT_BINS = 50
+SQFT_BIN_WIDTH = 100
+SQFT_BINS = 30
+
+# Bed and bath counts are bucketed in half steps (1.5 baths) up to this count.
+MAX_ROOMS = 10
+
+def bin_codes(values, width, n_bins):
+    """
+    Histogram bucket of each value, -1 where the value is missing.
+    """
+    codes = np.full(len(values), -1, dtype=np.int16)
+    known = ~np.isnan(values)
+    codes[known] = np.clip(np.floor(values[known] / width), 0, n_bins - 1)
+    return codes
+
+def room_codes(values):
+    """
+    Half-step bucket of each bed or bath count (2 * count), -1 where the count is missing.
+    """
+    codes = np.full(len(values), -1, dtype=np.int16)
+    known = ~np.isnan(values)
+    codes[known] = np.clip(np.round(values[known] * 2), 0, MAX_ROOMS * 2)
+    return codes
+
+def month_code(day):
+    """
+    Months since year 0 of a date, the availability bucket key.
+    """
+    return day.year * 12 + day.month - 1
+
+def month_codes(days):
+    """
+    `month_code` of each date, -1 where the date is missing.
+    """
+    return np.array([-1 if day is None else month_code(day) for day in days], dtype=np.int32)
+
+class FacetIndex:
+    """
+    Per-unit facet bucket codes and per-campus rollups of them.
+
+    Bucket codes are computed once per catalog snapshot. The unfiltered counts of every campus are
+    rolled up at the same time, so a campus's facets are a list lookup; filtered facets are a
+    `bincount` over the codes of the campus's matching units only.
+
+    Facets are disjunctive: each facet is counted with every filter except its own, so e.g. the
+    bed counts still show the alternatives to the selected bed count.
+    """
+
+    FACETS = ('rent', 'squareFeet', 'beds', 'baths', 'availability')
+
+    def __init__(self, near, rent, sqft, beds, baths, available_month):
+        # Availability buckets are months counted from the earliest available date.
+        known = available_month >= 0
+        self.month_offset = int(available_month[known].min()) if known.any() else 0
+        available_month = np.where(known, available_month - self.month_offset, -1)
+
+        self.codes = {
+            'rent': bin_codes(rent, RENT_BIN_WIDTH, RENT_BINS),
+            'squareFeet': bin_codes(sqft, SQFT_BIN_WIDTH, SQFT_BINS),
+            'beds': room_codes(beds),
+            'baths': room_codes(baths),
+            'availability': available_month,
+        }
+        self.sizes = {facet: int(codes.max(initial=-1)) + 1 for facet, codes in self.codes.items()}
+        self.campus_units = [np.flatnonzero(near[:, campus]) for campus in range(near.shape[1])]
+        self.rollups = [self.count(units) for units in self.campus_units]
+
+    def count(self, units, base=None, filters=None):
+        """
+        Facet counts over a set of units, narrowed by filters.
+
+        Args:
+            units (numpy.ndarray): Unit indices in scope, e.g. a campus's `campus_units`.
+            base (numpy.ndarray, optional): Boolean mask aligned with `units` applied to every
+                                            facet, e.g. an amenity filter.
+            filters (dict, optional): Facet name -> boolean mask aligned with `units` of that
+                                      facet's own filter.
+
+        Returns:
+            dict: `total`, `month_offset` and, for each facet, bucket counts indexed by code.
+        """
+        filters = filters or {}
+        if base is None:
+            base = np.ones(len(units), dtype=bool)
+
+        counts = {'total': int(np.count_nonzero(self._apply(base, filters.values()))), 'month_offset': self.month_offset}
+        for facet in self.FACETS:
+            mask = self._apply(base, [f for name, f in filters.items() if name != facet])
+            codes = self.codes[facet][units[mask]]
+            counts[facet] = np.bincount(codes[codes >= 0], minlength=self.sizes[facet])
+        return counts
+
+    @staticmethod
+    def _apply(base, masks):
+        for mask in masks:
+            base = base & mask
+        return base
+
+def describe(counts, today=None):
+    """
+    JSON shape of facet counts.
+
+    Histograms are trimmed to the range of non-empty buckets. Availability months up to the
+    current one are reported together as `now`.
+
+    Args:
+        counts (dict): Counts from `FacetIndex.count`.
+        today (date, optional): Date the `now` bucket is relative to. Defaults to today.
+
+    Returns:
+        dict: Total, histograms and bucket counts.
+    """
+    def histogram(values, width, n_bins):
+        nonzero = np.flatnonzero(values)
+        if len(nonzero) == 0:
+            return []
+        return [
+            {'min': i * width, 'max': (i + 1) * width if i < n_bins - 1 else None, 'count': int(values[i])}
+            for i in range(nonzero[0], nonzero[-1] + 1)
+        ]
+
+    def rooms(values):
+        return [{'value': code / 2, 'count': int(count)} for code, count in enumerate(values) if count]
+
+    offset = counts['month_offset']
+    current = month_code(today or date.today()) - offset
+    availability = counts['availability']
+    months = [
+        {'month': f'{(code + offset) // 12:04d}-{(code + offset) % 12 + 1:02d}', 'count': int(availability[code])}
+        for code in range(max(current + 1, 0), len(availability)) if availability[code]
+    ]
+    available_now = int(availability[:max(current + 1, 0)].sum())
+
+    return {
+        'total': counts['total'],
+        'rent': histogram(counts['rent'], RENT_BIN_WIDTH, RENT_BINS),
+        'squareFeet': histogram(counts['squareFeet'], SQFT_BIN_WIDTH, SQFT_BINS),
+        'beds': rooms(counts['beds']),
+        'baths': rooms(counts['baths']),
+        'availability': ([{'month': 'now', 'count': available_now}] if available_now else []) + months,
+    }
@@ -0,0 +1,131 @@
+# Listing cards are projected in SQL: each output field maps to a jsonb expression over the
+# `properties` row (`{p}`) and the unit's rental object (`{r}`), and only the requested fields
+# are put into a `jsonb_build_object`, so the rest of `properties.data` never leaves Postgres.
+CARD_FIELDS = {
+    'propertyId': "to_jsonb({p}.id)",
+    'key': "{r}->'key'",
+    'name': "COALESCE({p}.data->'propertyName', '\"N/A\"')",
+    'modelName': "{r}->'modelName'",
+    'rent': "{r}->'rent'",
+    'modelImage': "{r}->'image'",
+    'address': "COALESCE({p}.data->'location'->'fullAddress', '\"N/A\"')",
+    'price': "to_jsonb(btrim(replace(COALESCE({p}.data->'models'->0->>'rentLabel', 'N/A'), '/ Person', '')))",
+    'photos': "COALESCE({p}.data->'photos', '[]')",
+    'details': "COALESCE({r}->'details', '{{}}')",
+    'squareFeet': "{r}->'squareFeet'",
+    'availableDate': "{r}->'availableDate'",
+    'isNew': "{r}->'isNew'",
+    'features': "{r}->'interiorAmenities'",
+    'rating': "{p}.data->'rating'",
+    'hasKnownAvailabilities': "{r}->'hasKnownAvailabilities'",
+    'phoneNumber': "{p}.data->'contact'->'phone'",
+    'description': "{p}.data->'description'",
+    'latitude': "COALESCE({p}.data->'coordinates'->'latitude', '\"N/A\"')",
+    'longitude': "COALESCE({p}.data->'coordinates'->'longitude', '\"N/A\"')",
+    'apt_latitude': "COALESCE({p}.data->'coordinates'->'latitude', '\"N/A\"')",
+    'apt_longitude': "COALESCE({p}.data->'coordinates'->'longitude', '\"N/A\"')",
+    'walkScore': "COALESCE({p}.data->'scores'->'walkScore', '\"N/A\"')",
+}
+
+# Fields filled in by the endpoint rather than read from the property JSON.
+COMPUTED_FIELDS = ['score', 'isSaved', 'distance']
+
+# Named field sets accepted by `fields=`. `card` is the default slim shape for listing views;
+# the others reproduce each endpoint's full legacy payload and are what `fields=full` selects.
+FIELD_SETS = {
+    'card': [
+        'propertyId', 'key', 'name', 'modelName', 'rent', 'modelImage', 'address', 'price', 'score',
+        'squareFeet', 'availableDate', 'rating', 'isSaved',
+    ],
+    'recommendations': [
+        'propertyId', 'key', 'name', 'modelName', 'rent', 'modelImage', 'address', 'price', 'score',
+        'photos', 'details', 'squareFeet', 'availableDate', 'isNew', 'features', 'rating',
+        'hasKnownAvailabilities', 'isSaved', 'phoneNumber', 'description', 'apt_latitude', 'apt_longitude',
+    ],
+    'recommendations_v2': [
+        'propertyId', 'key', 'name', 'modelName', 'rent', 'modelImage', 'address', 'latitude', 'longitude',
+        'walkScore', 'price', 'photos', 'details', 'squareFeet', 'availableDate', 'isNew', 'features',
+        'rating', 'hasKnownAvailabilities', 'isSaved',
+    ],
+    'map': [
+        'propertyId', 'key', 'name', 'modelName', 'rent', 'modelImage', 'address', 'price',
+        'squareFeet', 'availableDate', 'rating', 'latitude', 'longitude', 'distance', 'isSaved',
+    ],
+    'saved': [
+        'propertyId', 'key', 'name', 'modelName', 'rent', 'modelImage', 'address', 'price', 'photos',
+        'details', 'squareFeet', 'availableDate', 'isNew', 'features', 'rating', 'hasKnownAvailabilities',
+        'isSaved', 'phoneNumber', 'description',
+    ],
+}
+
+def parse_fields(value, full='card'):
+    """
+    Resolve a `fields=` query parameter to a list of card fields.
+
+    Args:
+        value (str or None): Comma-separated field names and/or set names. None selects `card`.
+        full (str): FIELD_SETS entry that `full` stands for on this endpoint.
+
+    Returns:
+        list of str: Requested fields, in request order without duplicates.
+
+    Raises:
+        ValueError: If a name is neither a field nor a field set.
+    """
+    if not value:
+        return list(FIELD_SETS['card'])
+
+    fields = []
+    for name in value.split(','):
+        name = name.strip()
+        if name == 'full':
+            name = full
+
+        if name in FIELD_SETS:
+            fields.extend(FIELD_SETS[name])
+        elif name in CARD_FIELDS or name in COMPUTED_FIELDS:
+            fields.append(name)
+        elif name:
+            raise ValueError(f'Unknown field {name!r}')
+
+    return list(dict.fromkeys(fields))
+
+def card_sql(fields, property_alias='p', rental_object="p.data->'rentals'->ru.rental_index"):
+    """
+    SQL expression building the stored part of a card as one jsonb object.
+
+    Args:
+        fields (list of str): Requested fields. Computed fields are skipped.
+        property_alias (str): Alias of the `properties` row in the query.
+        rental_object (str): SQL expression for the unit's rental object.
+
+    Returns:
+        str: A `jsonb_build_object(...)` expression.
+    """
+    arguments = [
+        f"'{field}', {CARD_FIELDS[field].format(p=property_alias, r=f'({rental_object})')}"
+        for field in fields if field in CARD_FIELDS
+    ]
+    return f"jsonb_build_object({', '.join(arguments)})"
+
+def build_card(card, fields, score=None, is_saved=False, distance=None):
+    """
+    Add the computed fields to a card projected by `card_sql`.
+
+    Args:
+        card (dict): Card read from the database.
+        fields (list of str): Requested fields.
+        score (float, optional): Recommendation score.
+        is_saved (bool): Whether the user saved the unit.
+        distance (float, optional): Distance in miles from a geo search's centre.
+
+    Returns:
+        dict: The card.
+    """
+    if 'score' in fields:
+        card['score'] = score
+    if 'isSaved' in fields:
+        card['isSaved'] = is_saved
+    if 'distance' in fields:
+        card['distance'] = distance
+    return card
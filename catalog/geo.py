@@ -0,0 +1,136 @@
+import numpy as np
+
+EARTH_RADIUS_MILES = 3958.8
+
+# Miles per degree of latitude; a degree of longitude is this times cos(latitude).
+MILES_PER_DEGREE = 69.05
+
+# Side of a grid cell in degrees, about 3.5 miles north-south. A campus-sized radius search
+# touches a handful of cells.
+DEFAULT_CELL_DEGREES = 0.05
+
+# Largest radius accepted by the nearby search endpoint.
+MAX_RADIUS_MILES = 50
+
+def check_coordinates(lat, lon):
+    """
+    Validate a latitude/longitude pair.
+
+    Raises:
+        ValueError: If the latitude is outside [-90, 90] or the longitude outside [-180, 180].
+    """
+    if not -90 <= lat <= 90:
+        raise ValueError(f'latitude {lat} must be between -90 and 90')
+    if not -180 <= lon <= 180:
+        raise ValueError(f'longitude {lon} must be between -180 and 180')
+
+def haversine_miles(lat, lon, latitudes, longitudes):
+    """
+    Great-circle distance in miles from one point to many.
+
+    Args:
+        lat (float): Latitude of the origin, in degrees.
+        lon (float): Longitude of the origin, in degrees.
+        latitudes (numpy.ndarray): Latitudes of the points, in degrees.
+        longitudes (numpy.ndarray): Longitudes of the points, in degrees.
+
+    Returns:
+        numpy.ndarray: Distances aligned with the points.
+    """
+    lat, lon = np.radians(lat), np.radians(lon)
+    latitudes, longitudes = np.radians(latitudes), np.radians(longitudes)
+    a = (
+        np.sin((latitudes - lat) / 2) ** 2 +
+        np.cos(lat) * np.cos(latitudes) * np.sin((longitudes - lon) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+def radius_bbox(lat, lon, radius):
+    """
+    Bounding box enclosing a circle of `radius` miles around a point.
+
+    Returns:
+        tuple: (min_lat, min_lon, max_lat, max_lon).
+    """
+    lat_delta = radius / MILES_PER_DEGREE
+    lon_delta = radius / (MILES_PER_DEGREE * max(np.cos(np.radians(lat)), 1e-6))
+    return lat - lat_delta, lon - lon_delta, lat + lat_delta, lon + lon_delta
+
+class GeoGrid:
+    """
+    Uniform latitude/longitude grid over a set of points.
+
+    Points are sorted by cell, row-major, so the cells of one grid row that overlap a query box
+    are a contiguous run of the sort order and each row is found with two binary searches.
+    Points without coordinates are left out.
+    """
+
+    def __init__(self, latitudes, longitudes, cell_degrees=DEFAULT_CELL_DEGREES):
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        self.cell_degrees = cell_degrees
+
+        points = np.flatnonzero(~np.isnan(latitudes) & ~np.isnan(longitudes))
+        rows = np.floor(latitudes[points] / cell_degrees).astype(np.int64)
+        cols = np.floor(longitudes[points] / cell_degrees).astype(np.int64)
+        self.min_row = int(rows.min()) if len(points) else 0
+        self.max_row = int(rows.max()) if len(points) else 0
+        self.min_col = int(cols.min()) if len(points) else 0
+        self.n_cols = int(cols.max()) - self.min_col + 1 if len(points) else 1
+
+        cells = (rows - self.min_row) * self.n_cols + (cols - self.min_col)
+        order = np.argsort(cells, kind='stable')
+        self.cells = cells[order]
+        self.points = points[order]
+
+    def __len__(self):
+        return len(self.points)
+
+    def within_bbox(self, min_lat, min_lon, max_lat, max_lon):
+        """
+        Points inside a bounding box.
+
+        Args:
+            min_lat, min_lon, max_lat, max_lon (float): Box corners, in degrees.
+
+        Returns:
+            numpy.ndarray: Point indices, in no particular order.
+        """
+        if len(self.points) == 0 or min_lat > max_lat or min_lon > max_lon:
+            return np.empty(0, dtype=np.intp)
+
+        first_row = max(int(np.floor(min_lat / self.cell_degrees)), self.min_row)
+        last_row = min(int(np.floor(max_lat / self.cell_degrees)), self.max_row)
+        first_col = max(int(np.floor(min_lon / self.cell_degrees)), self.min_col)
+        last_col = min(int(np.floor(max_lon / self.cell_degrees)), self.min_col + self.n_cols - 1)
+        # Clamped to the occupied rows and columns, so the work is bounded by the grid, not the box.
+        if first_row > last_row or first_col > last_col:
+            return np.empty(0, dtype=np.intp)
+
+        row_offsets = (np.arange(first_row, last_row + 1) - self.min_row) * self.n_cols
+        starts = np.searchsorted(self.cells, row_offsets + (first_col - self.min_col), side='left')
+        ends = np.searchsorted(self.cells, row_offsets + (last_col - self.min_col), side='right')
+        if not np.any(ends > starts):
+            return np.empty(0, dtype=np.intp)
+
+        candidates = np.concatenate([self.points[start:end] for start, end in zip(starts, ends) if end > start])
+        lat, lon = self.latitudes[candidates], self.longitudes[candidates]
+        inside = (lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)
+        return candidates[inside]
+
+    def within_radius(self, lat, lon, radius):
+        """
+        Points within `radius` miles of a point.
+
+        Args:
+            lat (float): Latitude of the centre, in degrees.
+            lon (float): Longitude of the centre, in degrees.
+            radius (float): Radius in miles.
+
+        Returns:
+            tuple of numpy.ndarray: Point indices and their distances in miles, in no particular order.
+        """
+        candidates = self.within_bbox(*radius_bbox(lat, lon, radius))
+        distances = haversine_miles(lat, lon, self.latitudes[candidates], self.longitudes[candidates])
+        inside = distances <= radius
+        return candidates[inside], distances[inside]
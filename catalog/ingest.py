@@ -0,0 +1,240 @@
+from sqlalchemy import create_engine, text
+from catalog.units import CATALOG_VERSION_DDL, bump_content_version, create_rental_units_table, project_rental_units
+from events.stream import ConcatenatedJSONReader
+import argparse
+import hashlib
+import json
+import os
+import time
+from dotenv import dotenv_values
+
+# Scraper fields that change on every run without the listing changing; left out of the hash.
+VOLATILE_FIELDS = ('scrapedAt', 'lastUpdated')
+
+# Property fields the `rental_units` projection and the KNN features are built from. A change
+# confined to other fields (descriptions, photos, contact details) does not change any ranking.
+RANKING_FIELDS = ('rentals', 'schools', 'coordinates', 'scores', 'rating')
+
+# A property object of a scraper dump is tens of kilobytes; this bounds a malformed one.
+MAX_PROPERTY_SIZE = 16 << 20
+
+PROPERTY_HASH_DDL = '''
+    ALTER TABLE properties ADD COLUMN IF NOT EXISTS content_hash VARCHAR;
+    ALTER TABLE properties ADD COLUMN IF NOT EXISTS ranking_hash VARCHAR;
+'''
+
+# Properties still projected into `rental_units` although they were deleted by a run without a sync.
+ORPHANED_UNITS_SQL = text('''
+    SELECT DISTINCT property_id FROM rental_units ru
+    WHERE NOT EXISTS (SELECT 1 FROM properties p WHERE p.id = ru.property_id)
+''')
+
+def content_hash(property_data):
+    """
+    Hash of a property's normalized payload: keys sorted, volatile fields dropped.
+
+    Args:
+        property_data (dict): Property JSON from a scraper dump.
+
+    Returns:
+        str: Hex digest.
+    """
+    normalized = {key: value for key, value in property_data.items() if key not in VOLATILE_FIELDS}
+    return json_hash(normalized)
+
+def ranking_hash(property_data):
+    """
+    Hash of the RANKING_FIELDS of a property.
+
+    Args:
+        property_data (dict): Property JSON from a scraper dump.
+
+    Returns:
+        str: Hex digest.
+    """
+    return json_hash({field: property_data.get(field) for field in RANKING_FIELDS})
+
+def json_hash(value):
+    payload = json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def iter_dump(path):
+    """
+    Stream property objects from a scraper dump (a JSON array) without loading it whole.
+
+    Args:
+        path (str): Dump file.
+
+    Returns:
+        generator: Property dicts, in file order.
+    """
+    with open(path, 'rb') as f:
+        yield from ConcatenatedJSONReader(f, max_event_size=MAX_PROPERTY_SIZE)
+
+def upsert_sql(n_rows):
+    """
+    Multi-row upsert of `n_rows` properties. Rows whose hashes did not change are left untouched.
+    """
+    values = ', '.join(f'(:id_{i}, CAST(:data_{i} AS jsonb), :hash_{i}, :ranking_hash_{i})' for i in range(n_rows))
+    return text(f'''
+        INSERT INTO properties (id, data, content_hash, ranking_hash)
+        VALUES {values}
+        ON CONFLICT (id) DO UPDATE SET
+            data = EXCLUDED.data,
+            content_hash = EXCLUDED.content_hash,
+            ranking_hash = EXCLUDED.ranking_hash
+        WHERE properties.content_hash IS DISTINCT FROM EXCLUDED.content_hash
+            OR properties.ranking_hash IS DISTINCT FROM EXCLUDED.ranking_hash
+    ''')
+
+class PropertyIngester:
+    """
+    Load scraper dumps into `properties`, writing only new and changed properties.
+
+    The stored hashes are read once. Each dump is then stream-parsed and every property hashed;
+    properties whose hash matches are skipped, and the rest are upserted in multi-row statements of
+    `batch_size`. The result is a change set of added, updated and (with `prune`) removed property
+    ids that downstream indexes apply instead of rebuilding.
+
+    Properties are also hashed over RANKING_FIELDS, and only those whose ranking hash changed are
+    listed in `reranked` and re-projected into `rental_units`, which bumps the catalog version and
+    rebuilds every worker's snapshot and KNN index. When nothing ranked on changed, the run bumps
+    only the content version, which property details, search and ETags follow.
+
+    The re-projection runs in the same transaction as the upserts, so stored hashes never get
+    ahead of `rental_units`. A run with `sync=False` stores no ranking hash for the properties it
+    leaves unprojected, and deleted properties are found again by their orphaned units, so the
+    next synced run re-projects them.
+    """
+
+    def __init__(self, engine, batch_size=500):
+        self.engine = engine
+        self.batch_size = batch_size
+
+    def run(self, paths, prune=False, sync=True):
+        """
+        Ingest dumps.
+
+        Args:
+            paths (list of str): Scraper dumps.
+            prune (bool): Delete properties missing from every dump. Only for full catalog runs.
+            sync (bool): Re-project reranked properties into `rental_units`.
+
+        Returns:
+            dict: Change set with `added`, `updated` and `removed` property ids, the `reranked` ids
+                  (updated in a ranked field, or left unprojected by an earlier run), and
+                  `unchanged`, `synced` (unit rows written) and `seconds` counts.
+        """
+        start = time.perf_counter()
+        with self.engine.begin() as connection:
+            connection.execute(text(PROPERTY_HASH_DDL))
+            known = {
+                property_id: (digest, ranking_digest)
+                for property_id, digest, ranking_digest in connection.execute(text('SELECT id, content_hash, ranking_hash FROM properties'))
+            }
+
+            changes = {'added': [], 'updated': [], 'reranked': [], 'removed': [], 'unchanged': 0, 'synced': 0}
+            seen = set()
+            batch = []
+            for path in paths:
+                for property_data in iter_dump(path):
+                    property_id = property_data.get('id')
+                    if property_id is None or property_id in seen:
+                        continue
+                    seen.add(property_id)
+
+                    digest = content_hash(property_data)
+                    ranking_digest = ranking_hash(property_data)
+                    if property_id not in known:
+                        changes['added'].append(property_id)
+                    elif known[property_id][1] != ranking_digest:
+                        if known[property_id][0] != digest:
+                            changes['updated'].append(property_id)
+                        changes['reranked'].append(property_id)
+                    elif known[property_id][0] != digest:
+                        changes['updated'].append(property_id)
+                    else:
+                        changes['unchanged'] += 1
+                        continue
+
+                    # Unprojected properties keep no ranking hash, so a later synced run picks them up.
+                    if not sync and ranking_digest != known.get(property_id, (None, None))[1]:
+                        ranking_digest = None
+
+                    batch.append((property_id, property_data, digest, ranking_digest))
+                    if len(batch) == self.batch_size:
+                        self._upsert(connection, batch)
+                        batch = []
+
+            if batch:
+                self._upsert(connection, batch)
+
+            if prune:
+                changes['removed'] = sorted(set(known) - seen)
+                if changes['removed']:
+                    connection.execute(
+                        text('DELETE FROM properties WHERE id = ANY(:property_ids)'),
+                        {'property_ids': changes['removed']},
+                    )
+
+            if changed_ids(changes):
+                connection.execute(text(CATALOG_VERSION_DDL))
+                bump_content_version(connection)
+
+            if sync:
+                create_rental_units_table(connection)
+                orphaned = [property_id for property_id in connection.execute(ORPHANED_UNITS_SQL).scalars() if property_id not in changes['removed']]
+                changes['removed'] += orphaned
+                if reranked_ids(changes):
+                    changes['synced'] = project_rental_units(connection, reranked_ids(changes))
+
+        changes['seconds'] = time.perf_counter() - start
+        return changes
+
+    def _upsert(self, connection, batch):
+        params = {}
+        for i, (property_id, property_data, digest, ranking_digest) in enumerate(batch):
+            params[f'id_{i}'] = property_id
+            params[f'data_{i}'] = json.dumps(property_data, ensure_ascii=False)
+            params[f'hash_{i}'] = digest
+            params[f'ranking_hash_{i}'] = ranking_digest
+        connection.execute(upsert_sql(len(batch)), params)
+
+def changed_ids(changes):
+    """
+    Every property id a change set touches.
+    """
+    return changes['added'] + changes['updated'] + changes['removed']
+
+def reranked_ids(changes):
+    """
+    Every property id a change set touches in a field rankings depend on.
+    """
+    return changes['added'] + changes['reranked'] + changes['removed']
+
+def main():
+    parser = argparse.ArgumentParser(description='Load scraper dumps into properties, writing only changed properties.')
+    parser.add_argument('dumps', nargs='+', help='Scraper dumps (dataset_apartments-scraper_*.json).')
+    parser.add_argument('--batch-size', type=int, default=500, help='Properties per multi-row upsert.')
+    parser.add_argument('--prune', action='store_true', help='Delete properties missing from the dumps (full catalog runs only).')
+    parser.add_argument('--changes', default=None, help='Write the change set to this JSON file.')
+    parser.add_argument('--no-sync', action='store_true', help='Do not re-project reranked properties into rental_units; the next synced run does.')
+    args = parser.parse_args()
+
+    config = {
+        **dotenv_values(".env"),  # load development variables
+        **os.environ,  # override loaded values with environment variables
+    }
+
+    engine = create_engine(config['SQLALCHEMY_DATABASE_URL'])
+    changes = PropertyIngester(engine, args.batch_size).run(args.dumps, args.prune, not args.no_sync)
+    print(f"{len(changes['added'])} added, {len(changes['updated'])} updated, {len(changes['reranked'])} reranked, "
+          f"{len(changes['removed'])} removed, {changes['unchanged']} unchanged, {changes['synced']} rental unit rows synced "
+          f"in {changes['seconds']:.2f}s")
+
+    if args.changes:
+        with open(args.changes, 'w') as f:
+            json.dump(changes, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,297 @@
+from sqlalchemy import text
+from collections import Counter
+import bisect
+import copy
+import re
+import threading
+import numpy as np
+from catalog.snapshot import top_k
+
+# Searchable property text and how much each field's terms count. Names are weighted up so a
+# property's own name outranks passing mentions in other descriptions.
+SEARCH_FIELDS = {
+    'propertyName': 3.0,
+    'description': 1.0,
+    'neighborhoodDescription': 1.0,
+    'amenities': 1.0,
+    'transitAndPOI': 1.0,
+}
+
+# BM25 parameters.
+K1 = 1.2
+B = 0.75
+
+# Most index terms a typeahead prefix expands to; the most frequent are kept.
+MAX_PREFIX_TERMS = 64
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+SEARCH_DIGESTS_SQL = text(f'''
+    SELECT id, md5(jsonb_build_array({', '.join(f"data->'{field}'" for field in SEARCH_FIELDS)})::text)
+    FROM properties
+''')
+
+SEARCH_DOCUMENTS_SQL = text(f'''
+    SELECT id, jsonb_build_object({', '.join(f"'{field}', data->'{field}'" for field in SEARCH_FIELDS)})
+    FROM properties
+    WHERE id = ANY(:property_ids)
+''')
+
+def tokenize(value):
+    """
+    Split text into lowercase alphanumeric terms.
+    """
+    return TOKEN_PATTERN.findall(value.lower())
+
+def field_terms(field, value):
+    """
+    Terms of one searchable field of the property JSON.
+
+    Args:
+        field (str): Field name from SEARCH_FIELDS.
+        value: The field's JSON value.
+
+    Returns:
+        list of str: Terms.
+    """
+    if not value:
+        return []
+    if field == 'amenities':
+        return [term for group in value for name in group.get('value') or [] for term in tokenize(name)]
+    if field == 'transitAndPOI':
+        return [term for place in value for term in tokenize(place.get('name') or '')]
+    return tokenize(value) if isinstance(value, str) else []
+
+def document_terms(search_data):
+    """
+    Field-weighted term frequencies and length of a property's searchable text.
+
+    Args:
+        search_data (dict): The property's SEARCH_FIELDS values.
+
+    Returns:
+        tuple: ({term: weighted frequency}, weighted length).
+    """
+    frequencies = Counter()
+    for field, weight in SEARCH_FIELDS.items():
+        for term in field_terms(field, search_data.get(field)):
+            frequencies[term] += weight
+    return dict(frequencies), sum(frequencies.values())
+
+class SearchIndex:
+    """
+    BM25 inverted index over the searchable text of every property.
+
+    Postings are stored per term, sorted, with each posting's BM25 impact precomputed, so a query
+    term costs one vectorized add over its postings. `refresh` only re-reads properties whose
+    searchable text changed (compared by an md5 computed in Postgres) and rebuilds the postings
+    from the term frequencies carried over from the previous index. Term ids are stable across
+    refreshes, so carried-over documents are reused as arrays.
+    """
+
+    def __init__(self, previous=None):
+        self.version = None
+        self.content_version = None
+        self.vocabulary = dict(previous.vocabulary) if previous is not None else {}
+        self.documents = dict(previous.documents) if previous is not None else {}
+        self.property_ids = []
+        self.terms = []
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.postings = np.empty(0, dtype=np.int32)
+        self.impacts = np.empty(0, dtype=np.float32)
+        self.unit_docs = np.empty(0, dtype=np.intp)
+
+    def __len__(self):
+        return len(self.property_ids)
+
+    def is_current(self, snapshot):
+        """
+        Whether the index was refreshed for this snapshot at its current content version.
+        """
+        return self.version == snapshot.version and self.content_version == snapshot.content_version
+
+    def refresh(self, connection, snapshot):
+        """
+        Bring the index up to date with the `properties` table and map it onto a catalog snapshot.
+
+        Args:
+            connection (Connection): Open SQLAlchemy connection.
+            snapshot (CatalogSnapshot): Snapshot whose units search results are drawn from.
+
+        Returns:
+            int: Number of properties re-indexed.
+        """
+        digests = dict(connection.execute(SEARCH_DIGESTS_SQL).fetchall())
+        changed = [
+            property_id for property_id, digest in digests.items()
+            if self.documents.get(property_id, (None,))[0] != digest
+        ]
+
+        documents = {property_id: document for property_id, document in self.documents.items() if property_id in digests}
+        if changed:
+            rows = connection.execute(SEARCH_DOCUMENTS_SQL, {'property_ids': changed}).fetchall()
+            for property_id, search_data in rows:
+                frequencies, length = document_terms(search_data)
+                term_ids = np.array([self.vocabulary.setdefault(term, len(self.vocabulary)) for term in frequencies], dtype=np.int64)
+                documents[property_id] = (digests[property_id], term_ids, np.array(list(frequencies.values()), dtype=np.float64), length)
+
+        self.documents = documents
+        self._build()
+        self._map(snapshot)
+        self.content_version = snapshot.content_version
+        return len(changed)
+
+    def mapped_to(self, snapshot):
+        """
+        This index's documents mapped onto another snapshot's units, without re-reading any text.
+
+        Used to keep searching a stale index while a refresh runs; the copy is not current.
+
+        Args:
+            snapshot (CatalogSnapshot): Snapshot whose units results are drawn from.
+
+        Returns:
+            SearchIndex: This index, or a shallow copy with its own unit mapping.
+        """
+        if self.version == snapshot.version:
+            return self
+
+        index = copy.copy(self)
+        index._map(snapshot)
+        return index
+
+    def _map(self, snapshot):
+        doc_index = {property_id: doc for doc, property_id in enumerate(self.property_ids)}
+        property_docs = np.array([doc_index.get(property_id, -1) for property_id in snapshot.property_ids], dtype=np.intp)
+        self.unit_docs = property_docs[snapshot.unit_property]
+        self.version = snapshot.version
+
+    def _build(self):
+        self.property_ids = list(self.documents)
+        documents = [self.documents[property_id] for property_id in self.property_ids]
+        lengths = np.array([document[3] for document in documents], dtype=np.float64)
+        term_ids = np.concatenate([document[1] for document in documents] or [np.empty(0, dtype=np.int64)])
+        frequencies = np.concatenate([document[2] for document in documents] or [np.empty(0)])
+        docs = np.repeat(np.arange(len(documents), dtype=np.int32), [len(document[1]) for document in documents])
+
+        # Renumber terms in sorted order so prefixes are contiguous ranges.
+        self.terms = sorted(self.vocabulary)
+        rank = np.empty(len(self.vocabulary), dtype=np.int64)
+        rank[[self.vocabulary[term] for term in self.terms]] = np.arange(len(self.terms))
+        term_ids = rank[term_ids]
+
+        order = np.argsort(term_ids, kind='stable')
+        term_ids, docs, frequencies = term_ids[order], docs[order], frequencies[order]
+        df = np.bincount(term_ids, minlength=len(self.terms))
+        self.offsets = np.concatenate([[0], np.cumsum(df)])
+
+        n_docs = max(len(self.property_ids), 1)
+        idf = np.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+        norm = K1 * (1 - B + B * lengths[docs] / max(lengths.mean() if len(lengths) else 0, 1e-9))
+        self.postings = docs
+        self.impacts = (idf[term_ids] * frequencies * (K1 + 1) / (frequencies + norm)).astype(np.float32)
+
+    def _term_range(self, term, prefix=False):
+        start = bisect.bisect_left(self.terms, term)
+        if not prefix:
+            end = start + 1 if start < len(self.terms) and self.terms[start] == term else start
+        else:
+            end = bisect.bisect_left(self.terms, term + '\uffff')
+        return start, end
+
+    def score(self, query, prefix=True):
+        """
+        BM25 score of every property for a query. Every query term must match.
+
+        Args:
+            query (str): Search text.
+            prefix (bool): Match the last query term as a prefix, for typeahead.
+
+        Returns:
+            numpy.ndarray: Scores aligned with `property_ids`, 0 for properties that do not match.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        scores = np.zeros(len(self.property_ids), dtype=np.float32)
+        if not terms:
+            return scores
+
+        matched = np.zeros(len(self.property_ids), dtype=np.int32)
+        for i, term in enumerate(terms):
+            start, end = self._term_range(term, prefix and i == len(terms) - 1)
+            if end - start > MAX_PREFIX_TERMS:
+                df = self.offsets[start + 1:end + 1] - self.offsets[start:end]
+                expansions = start + np.argsort(-df, kind='stable')[:MAX_PREFIX_TERMS]
+            else:
+                expansions = range(start, end)
+
+            # A document matching several expansions of a prefix counts only the best one.
+            best = np.zeros(len(self.property_ids), dtype=np.float32)
+            for expansion in expansions:
+                docs = self.postings[self.offsets[expansion]:self.offsets[expansion + 1]]
+                best[docs] = np.maximum(best[docs], self.impacts[self.offsets[expansion]:self.offsets[expansion + 1]])
+            scores += best
+            matched += best > 0
+
+        scores[matched < len(terms)] = 0
+        return scores
+
+    def search(self, query, units, k, prefix=True):
+        """
+        Rank snapshot units by the BM25 score of their property.
+
+        Args:
+            query (str): Search text.
+            units (numpy.ndarray): Candidate unit indices of the snapshot the index was refreshed for,
+                                   e.g. from `CatalogSnapshot.filter`.
+            k (int): Number of units to return.
+            prefix (bool): Match the last query term as a prefix.
+
+        Returns:
+            tuple of numpy.ndarray: The top-k matching units and their scores, best first, in
+                                    candidate order on ties.
+        """
+        scores = self.score(query, prefix)
+        docs = self.unit_docs[units]
+        unit_scores = np.where(docs >= 0, scores[docs] if len(scores) else 0, 0)
+        keep = np.flatnonzero(unit_scores > 0)
+        top = keep[top_k(unit_scores[keep], keep, k)]
+        return units[top], unit_scores[top]
+
+_search_index = None
+_search_index_lock = threading.Lock()
+
+def get_search_index(engine, snapshot):
+    """
+    Return this worker's search index, refreshed for the given catalog snapshot.
+
+    A new index is built once per catalog content version, re-reading only the properties whose
+    searchable text changed. One thread at a time builds it; requests keep searching the previous
+    index, mapped onto their snapshot's units, while it is built. Only a worker's first search
+    blocks on the build.
+
+    Args:
+        engine (Engine): SQLAlchemy engine for the catalog database.
+        snapshot (CatalogSnapshot): The current catalog snapshot.
+
+    Returns:
+        SearchIndex: The index.
+    """
+    global _search_index
+
+    index = _search_index
+    if index is not None and index.is_current(snapshot):
+        return index
+
+    if not _search_index_lock.acquire(blocking=index is None):
+        return index.mapped_to(snapshot)
+
+    try:
+        if _search_index is None or not _search_index.is_current(snapshot):
+            index = SearchIndex(_search_index)
+            with engine.connect() as connection:
+                index.refresh(connection, snapshot)
+            _search_index = index
+
+        return _search_index
+    finally:
+        _search_index_lock.release()
@@ -0,0 +1,421 @@
+from sqlalchemy import text
+from catalog.units import get_catalog_versions
+from catalog.geo import GeoGrid, haversine_miles
+from catalog.amenities import AmenityIndex, normalize_amenity
+from catalog.facets import FacetIndex, month_codes
+import numpy as np
+import threading
+import time
+
+# How long a worker trusts its snapshot before asking the database for the catalog version again.
+VERSION_CHECK_INTERVAL = 30
+
+class CatalogSnapshot:
+    """
+    Columnar copy of `rental_units` held in memory by each worker.
+
+    Units are stored as parallel arrays indexed by unit number. Per-campus distances are a
+    (units x campuses) matrix, and each unit points back into the property JSON through
+    `unit_property` (index into `property_ids`) and `rental_index` (offset into `data->'rentals'`).
+    Unit coordinates are indexed by a `GeoGrid` for radius and bounding-box searches, and unit
+    amenities and details by an `AmenityIndex` for must-have filters. Facet rollups per campus
+    are kept in a `FacetIndex`.
+
+    `content_version` follows the catalog's content version, which also moves when only property
+    JSON that is not ranked on changed; the worker advances it in place without a reload.
+    """
+
+    def __init__(self, version, property_ids, unit_property, rental_index, rental_keys, rent, sqft, campuses, near, miles, latitude, longitude, beds, amenities, baths, available_month, content_version=None):
+        self.version = version
+        self.content_version = version if content_version is None else content_version
+        self.property_ids = property_ids
+        self.unit_property = unit_property
+        self.rental_index = rental_index
+        self.rental_keys = rental_keys
+        self.rent = rent
+        self.sqft = sqft
+        self.campuses = campuses
+        self.campus_index = {campus: i for i, campus in enumerate(campuses)}
+        self.near = near
+        self.miles = miles
+        self.latitude = latitude
+        self.longitude = longitude
+        self.geo = GeoGrid(latitude, longitude)
+        self.beds = beds
+        self.amenities = amenities
+        self.baths = baths
+        self.facets = FacetIndex(near, rent, sqft, beds, baths, available_month)
+        key_sort = np.argsort(rental_keys, kind='stable')
+        self.sorted_keys = rental_keys[key_sort]
+        self.key_order = np.empty(len(rental_keys), dtype=np.int32)
+        self.key_order[key_sort] = np.arange(len(rental_keys), dtype=np.int32)
+        self.key_units = {rental_key: unit for unit, rental_key in enumerate(rental_keys)}
+
+    def __len__(self):
+        return len(self.rental_keys)
+
+    def locate(self, rental_key):
+        """
+        Find where a rental lives in the property JSON.
+
+        Args:
+            rental_key (str): Rental key.
+
+        Returns:
+            tuple: (property_id, offset into `data->'rentals'`), or None for an unknown key.
+        """
+        unit = self.key_units.get(rental_key)
+        if unit is None:
+            return None
+        return self.property_ids[self.unit_property[unit]], int(self.rental_index[unit])
+
+    @classmethod
+    def load(cls, connection, version=None, content_version=None):
+        """
+        Build a snapshot from the `rental_units` table.
+
+        Args:
+            connection (Connection): Open SQLAlchemy connection.
+            version (int, optional): Catalog version the rows belong to. Read from the database when omitted.
+            content_version (int, optional): Content version read with `version`.
+
+        Returns:
+            CatalogSnapshot: The loaded snapshot.
+        """
+        if version is None:
+            version, content_version = get_catalog_versions(connection)
+
+        rows = connection.execute(text('''
+            SELECT property_id, rental_key, rental_index, campus, miles, rent, sqft, latitude, longitude, beds, amenities, baths, available_date
+            FROM rental_units
+            ORDER BY property_id, rental_index
+        ''')).fetchall()
+
+        property_ids = []
+        property_lookup = {}
+        campuses = []
+        campus_lookup = {}
+        units = {}
+        unit_property = []
+        rental_index = []
+        rental_keys = []
+        rent = []
+        sqft = []
+        latitude = []
+        longitude = []
+        beds = []
+        baths = []
+        available_dates = []
+        unit_amenities = []
+        unit_campus_miles = []
+
+        for property_id, rental_key, offset, campus, miles, unit_rent, unit_sqft, unit_lat, unit_lon, unit_beds, amenities, unit_baths, available_date in rows:
+            unit = units.get((property_id, rental_key))
+            if unit is None:
+                unit = units[(property_id, rental_key)] = len(rental_keys)
+                if property_id not in property_lookup:
+                    property_lookup[property_id] = len(property_ids)
+                    property_ids.append(property_id)
+                unit_property.append(property_lookup[property_id])
+                rental_index.append(offset)
+                rental_keys.append(rental_key)
+                rent.append(np.nan if unit_rent is None else unit_rent)
+                sqft.append(np.nan if unit_sqft is None else unit_sqft)
+                latitude.append(np.nan if unit_lat is None else unit_lat)
+                longitude.append(np.nan if unit_lon is None else unit_lon)
+                beds.append(np.nan if unit_beds is None else unit_beds)
+                baths.append(np.nan if unit_baths is None else unit_baths)
+                available_dates.append(available_date)
+                unit_amenities.append({normalize_amenity(name) for name in amenities or ()})
+
+            if campus is not None:
+                if campus not in campus_lookup:
+                    campus_lookup[campus] = len(campuses)
+                    campuses.append(campus)
+                unit_campus_miles.append((unit, campus_lookup[campus], np.nan if miles is None else miles))
+
+        near = np.zeros((len(rental_keys), len(campuses)), dtype=bool)
+        miles = np.full((len(rental_keys), len(campuses)), np.nan)
+        if unit_campus_miles:
+            unit_idx, campus_idx, campus_miles = zip(*unit_campus_miles)
+            near[unit_idx, campus_idx] = True
+            miles[unit_idx, campus_idx] = campus_miles
+
+        return cls(
+            version=version,
+            property_ids=np.array(property_ids, dtype=object),
+            unit_property=np.array(unit_property, dtype=np.int32),
+            rental_index=np.array(rental_index, dtype=np.int32),
+            rental_keys=np.array(rental_keys, dtype=object),
+            rent=np.array(rent, dtype=np.float64),
+            sqft=np.array(sqft, dtype=np.float64),
+            campuses=campuses,
+            near=near,
+            miles=miles,
+            latitude=np.array(latitude, dtype=np.float64),
+            longitude=np.array(longitude, dtype=np.float64),
+            beds=np.array(beds, dtype=np.float64),
+            amenities=AmenityIndex(unit_amenities),
+            baths=np.array(baths, dtype=np.float64),
+            available_month=month_codes(available_dates),
+            content_version=content_version,
+        )
+
+    def filter(self, prefs):
+        """
+        Select the units matching the campus, max_rent and min_sqft preferences.
+
+        Args:
+            prefs (dict): User preferences.
+
+        Returns:
+            numpy.ndarray: Indices of the matching units.
+        """
+        campus = self.campus_index.get(prefs.get("campus", "Texas A&M University"))
+        if campus is None:
+            return np.empty(0, dtype=np.intp)
+
+        mask = self.near[:, campus] & (self.rent <= prefs.get("max_rent", 10000)) & (self.sqft >= prefs.get("min_sqft", 0))
+        details = self.detail_mask(prefs)
+        if details is not None:
+            mask &= details
+        return np.flatnonzero(mask)
+
+    def detail_mask(self, prefs):
+        """
+        Units with every must-have amenity in `prefs['amenities']` and a bed count allowed by
+        `prefs['beds']` (exact counts) or `prefs['min_beds']`.
+
+        Args:
+            prefs (dict): User preferences, or just the filters.
+
+        Returns:
+            numpy.ndarray: Boolean mask over units, or None when no such filter is set.
+        """
+        mask = None
+        if prefs.get('amenities'):
+            mask = self.amenities.mask(prefs['amenities'])
+
+        beds = self.beds_mask(prefs)
+        if beds is not None:
+            mask = beds if mask is None else mask & beds
+
+        return mask
+
+    def beds_mask(self, prefs, units=None):
+        """
+        Units with a bed count allowed by `prefs['beds']` (exact counts) or `prefs['min_beds']`.
+
+        Args:
+            prefs (dict): User preferences, or just the filters.
+            units (numpy.ndarray, optional): Only test these units.
+
+        Returns:
+            numpy.ndarray: Boolean mask over units (or aligned with `units`), or None without a bed filter.
+        """
+        if not prefs.get('beds') and prefs.get('min_beds') is None:
+            return None
+
+        beds = self.beds if units is None else self.beds[units]
+        mask = np.isin(beds, prefs.get('beds') or [])
+        if prefs.get('min_beds') is not None:
+            mask |= beds >= prefs['min_beds']
+        return mask
+
+    def facet_counts(self, campus, filters):
+        """
+        Facet counts of a campus's units under the current filters.
+
+        Without filters this is the rollup computed when the snapshot loaded. Otherwise the
+        filters are evaluated on the campus's units only.
+
+        Args:
+            campus (str): Campus name.
+            filters (dict): Any of `max_rent`, `min_sqft`, `amenities`, `beds` and `min_beds`.
+
+        Returns:
+            dict: Counts from `FacetIndex.count`, or None for an unknown campus.
+        """
+        campus = self.campus_index.get(campus)
+        if campus is None:
+            return None
+        if not filters:
+            return self.facets.rollups[campus]
+
+        units = self.facets.campus_units[campus]
+        base = self.amenities.mask(filters['amenities'], units) if filters.get('amenities') else None
+        facet_filters = {}
+        if filters.get('max_rent') is not None:
+            facet_filters['rent'] = self.rent[units] <= filters['max_rent']
+        if filters.get('min_sqft') is not None:
+            facet_filters['squareFeet'] = self.sqft[units] >= filters['min_sqft']
+        beds = self.beds_mask(filters, units)
+        if beds is not None:
+            facet_filters['beds'] = beds
+
+        return self.facets.count(units, base, facet_filters)
+
+    def score(self, prefs, units):
+        """
+        Compute the weighted score used by `get_recs_query` for the given units.
+
+        Units without a distance to the campus score -inf so they sort last, like NULLs in SQL.
+
+        Args:
+            prefs (dict): User preferences including miles, sqft and rent weights.
+            units (numpy.ndarray): Unit indices to score.
+
+        Returns:
+            numpy.ndarray: Scores aligned with `units`.
+        """
+        campus = self.campus_index[prefs.get("campus", "Texas A&M University")]
+        scores = (
+            (prefs.get("miles_weight", 0.5) * -1 * 1000 * self.miles[units, campus]) +
+            (prefs.get("sqft_weight", 0.5) * 1 * 800 * self.sqft[units]) +
+            (prefs.get("rent_weight", 0.5) * -1 * self.rent[units])
+        )
+        scores[np.isnan(scores)] = -np.inf
+        return scores
+
+    def nearby(self, lat=None, lon=None, radius=None, bbox=None, max_rent=10000, min_sqft=0, filters=None):
+        """
+        Units within a radius of a point or inside a bounding box, nearest first.
+
+        Args:
+            lat (float, optional): Latitude of the search centre.
+            lon (float, optional): Longitude of the search centre.
+            radius (float, optional): Radius in miles around (lat, lon).
+            bbox (tuple, optional): (min_lat, min_lon, max_lat, max_lon), used instead of a radius.
+                                    Units are then ordered by distance to (lat, lon) when given,
+                                    or to the box centre.
+            max_rent (float): Maximum rent.
+            min_sqft (float): Minimum square footage.
+            filters (dict, optional): `amenities`/`beds`/`min_beds` filters, as for `detail_mask`.
+
+        Returns:
+            tuple of numpy.ndarray: Unit indices and their distances in miles, nearest first,
+                                    ties broken by rental key.
+        """
+        if bbox is not None:
+            units = self.geo.within_bbox(*bbox)
+            if lat is None or lon is None:
+                lat, lon = (bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2
+            distances = haversine_miles(lat, lon, self.latitude[units], self.longitude[units])
+        else:
+            units, distances = self.geo.within_radius(lat, lon, radius)
+
+        keep = (self.rent[units] <= max_rent) & (self.sqft[units] >= min_sqft)
+        details = self.detail_mask(filters or {})
+        if details is not None:
+            keep &= details[units]
+        units, distances = units[keep], distances[keep]
+        order = np.lexsort((self.key_order[units], distances))
+        return units[order], distances[order]
+
+    def seek(self, units, scores, after):
+        """
+        Keep only the units ranked strictly after a (score, rental_key) position.
+
+        Args:
+            units (numpy.ndarray): Unit indices.
+            scores (numpy.ndarray): Scores aligned with `units`.
+            after (tuple): (score, rental_key) of the last unit already returned. A score of
+                           None stands for a unit without a distance, which ranks last.
+
+        Returns:
+            tuple of numpy.ndarray: The remaining units and their scores.
+        """
+        after_score, after_key = after
+        if after_score is None:
+            after_score = -np.inf
+
+        key_position = np.searchsorted(self.sorted_keys, after_key, side='right')
+        keep = (scores < after_score) | ((scores == after_score) & (self.key_order[units] >= key_position))
+        return units[keep], scores[keep]
+
+    def rank(self, prefs, k, after=None):
+        """
+        Return the top-k units for the preferences, best first, ties broken by rental key.
+
+        Args:
+            prefs (dict): User preferences.
+            k (int): Number of units to return.
+            after (tuple, optional): (score, rental_key) cursor position to resume after.
+
+        Returns:
+            tuple of numpy.ndarray: Unit indices and their scores.
+        """
+        units = self.filter(prefs)
+        if len(units) == 0 or k <= 0:
+            return units[:0], np.empty(0)
+
+        scores = self.score(prefs, units)
+        if after is not None:
+            units, scores = self.seek(units, scores, after)
+        top = top_k(scores, self.key_order[units], k)
+        return units[top], scores[top]
+
+def top_k(scores, tiebreak, k):
+    """
+    Positions of the k highest scores in descending order, using a partial sort.
+
+    Args:
+        scores (numpy.ndarray): Scores to rank.
+        tiebreak (numpy.ndarray): Ascending secondary sort key for equal scores.
+        k (int): Number of positions to return.
+
+    Returns:
+        numpy.ndarray: Positions into `scores`.
+    """
+    if k < len(scores):
+        threshold = np.partition(scores, len(scores) - k)[len(scores) - k]
+        selected = np.flatnonzero(scores >= threshold)
+    else:
+        selected = np.arange(len(scores))
+
+    order = np.lexsort((tiebreak[selected], -scores[selected]))[:k]
+    return selected[order]
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+_last_version_check = 0.0
+
+def get_catalog_snapshot(engine):
+    """
+    Return this worker's catalog snapshot, reloading it when the catalog version has been bumped.
+
+    The version is checked at most every VERSION_CHECK_INTERVAL seconds, by one thread at a time.
+    While that thread checks the version or loads a new snapshot, other requests keep being served
+    the previous snapshot without waiting; only a worker's first request blocks on the load.
+    When only the content version moved, the snapshot is kept and its `content_version` advanced.
+
+    Args:
+        engine (Engine): SQLAlchemy engine for the catalog database.
+
+    Returns:
+        CatalogSnapshot: The current snapshot.
+    """
+    global _snapshot, _last_version_check
+
+    snapshot = _snapshot
+    if snapshot is not None and time.monotonic() - _last_version_check < VERSION_CHECK_INTERVAL:
+        return snapshot
+
+    if not _snapshot_lock.acquire(blocking=snapshot is None):
+        return snapshot
+
+    try:
+        if _snapshot is not None and time.monotonic() - _last_version_check < VERSION_CHECK_INTERVAL:
+            return _snapshot
+
+        with engine.connect() as connection:
+            version, content_version = get_catalog_versions(connection)
+            if _snapshot is None or _snapshot.version != version:
+                _snapshot = CatalogSnapshot.load(connection, version, content_version)
+            else:
+                _snapshot.content_version = content_version
+
+        _last_version_check = time.monotonic()
+        return _snapshot
+    finally:
+        _snapshot_lock.release()
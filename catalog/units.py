@@ -0,0 +1,221 @@
+from sqlalchemy import create_engine, text
+import os
+from dotenv import dotenv_values
+
+# One row per (rental unit, campus) so the recommendation queries can filter and
+# score with plain column predicates instead of unnesting `properties.data`.
+RENTAL_UNITS_DDL = '''
+    CREATE TABLE IF NOT EXISTS rental_units (
+        property_id VARCHAR NOT NULL,
+        rental_key VARCHAR NOT NULL,
+        rental_index INTEGER NOT NULL,
+        campus VARCHAR,
+        miles DOUBLE PRECISION,
+        rent INTEGER,
+        sqft INTEGER,
+        beds REAL,
+        baths REAL,
+        availability INTEGER,
+        available_date TIMESTAMP,
+        latitude DOUBLE PRECISION,
+        longitude DOUBLE PRECISION,
+        amenities VARCHAR[]
+    );
+    ALTER TABLE rental_units ADD COLUMN IF NOT EXISTS latitude DOUBLE PRECISION;
+    ALTER TABLE rental_units ADD COLUMN IF NOT EXISTS longitude DOUBLE PRECISION;
+    ALTER TABLE rental_units ADD COLUMN IF NOT EXISTS amenities VARCHAR[];
+    CREATE UNIQUE INDEX IF NOT EXISTS rental_units_unit_campus_idx ON rental_units (property_id, rental_key, campus);
+    CREATE INDEX IF NOT EXISTS rental_units_rental_key_idx ON rental_units (rental_key);
+    CREATE INDEX IF NOT EXISTS rental_units_campus_rent_sqft_idx ON rental_units (campus, rent, sqft);
+    CREATE INDEX IF NOT EXISTS rental_units_campus_miles_idx ON rental_units (campus, miles);
+    CREATE INDEX IF NOT EXISTS rental_units_amenities_idx ON rental_units USING GIN (amenities);
+'''
+
+# Single-row counters so in-process copies of the catalog know when to reload. `version` is
+# bumped by every sync of `rental_units`, which is what rankings and the KNN index are built
+# from. `content_version` is also bumped when only property JSON that is not ranked on changed,
+# which the property detail cache, search index and response ETags follow.
+CATALOG_VERSION_DDL = '''
+    CREATE TABLE IF NOT EXISTS catalog_version (
+        id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+        version BIGINT NOT NULL DEFAULT 0,
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    );
+    ALTER TABLE catalog_version ADD COLUMN IF NOT EXISTS content_version BIGINT NOT NULL DEFAULT 0;
+    INSERT INTO catalog_version (id) VALUES (TRUE) ON CONFLICT (id) DO NOTHING;
+'''
+
+# Projects every rental of the selected properties onto each of the property's
+# colleges. Properties without colleges still get a row (campus NULL) so saved
+# apartments can be resolved through this table. `amenities` holds the unit's
+# interior amenities and `details` labels, normalized like
+# `catalog.amenities.normalize_amenity`.
+SYNC_RENTAL_UNITS_SQL = '''
+    INSERT INTO rental_units (
+        property_id, rental_key, rental_index, campus, miles,
+        rent, sqft, beds, baths, availability, available_date,
+        latitude, longitude, amenities
+    )
+    SELECT
+        p.id,
+        r.rental_object->>'key',
+        (r.ordinality - 1)::int,
+        c.college->>'name',
+        COALESCE(
+            (c.college->>'miles')::float,
+            NULLIF(regexp_replace(c.college->>'distance', '[^0-9.]', '', 'g'), '')::float
+        ),
+        round((r.rental_object->>'rent')::numeric)::int,
+        round((r.rental_object->>'squareFeet')::numeric)::int,
+        (r.rental_object->>'beds')::real,
+        (r.rental_object->>'baths')::real,
+        (r.rental_object->>'availability')::int,
+        (r.rental_object->>'availableDate')::timestamp,
+        CASE WHEN jsonb_typeof(p.data->'coordinates'->'latitude') = 'number'
+            THEN (p.data->'coordinates'->>'latitude')::float END,
+        CASE WHEN jsonb_typeof(p.data->'coordinates'->'longitude') = 'number'
+            THEN (p.data->'coordinates'->>'longitude')::float END,
+        ARRAY(
+            SELECT DISTINCT lower(btrim(regexp_replace(a.amenity, '\\s+', ' ', 'g')))
+            FROM (
+                SELECT jsonb_array_elements_text(COALESCE(sc.sub_category->'amenities', '[]'::jsonb))
+                FROM jsonb_array_elements(COALESCE(r.rental_object->'interiorAmenities'->'subCategories', '[]'::jsonb)) AS sc(sub_category)
+                UNION ALL
+                SELECT jsonb_array_elements_text(COALESCE(r.rental_object->'details', '[]'::jsonb))
+            ) AS a(amenity)
+        )
+    FROM
+        properties p
+    CROSS JOIN LATERAL
+        jsonb_array_elements(p.data->'rentals') WITH ORDINALITY AS r(rental_object, ordinality)
+    LEFT JOIN LATERAL
+        jsonb_array_elements(COALESCE(p.data->'schools'->'colleges', '[]'::jsonb)) AS c(college) ON TRUE
+    WHERE
+        r.rental_object->>'key' IS NOT NULL
+        {property_filter}
+    ON CONFLICT (property_id, rental_key, campus) DO NOTHING
+'''
+
+def create_rental_units_table(connection):
+    """
+    Create the `rental_units` projection table, its indexes and the catalog version row if they do not exist.
+
+    Args:
+        connection (Connection): Open SQLAlchemy connection.
+    """
+    connection.execute(text(RENTAL_UNITS_DDL))
+    connection.execute(text(CATALOG_VERSION_DDL))
+
+def get_catalog_version(connection):
+    """
+    Read the current catalog version.
+
+    Args:
+        connection (Connection): Open SQLAlchemy connection.
+
+    Returns:
+        int: Catalog version, 0 if the catalog has never been synced.
+    """
+    version = connection.execute(text('SELECT version FROM catalog_version')).scalar()
+    return version or 0
+
+def get_catalog_versions(connection):
+    """
+    Read the current catalog version and content version.
+
+    Args:
+        connection (Connection): Open SQLAlchemy connection.
+
+    Returns:
+        tuple: (catalog version, content version), 0 for a catalog that has never been synced.
+    """
+    row = connection.execute(text('SELECT version, content_version FROM catalog_version')).first()
+    if row is None:
+        return 0, 0
+    return row[0] or 0, row[1] or 0
+
+def bump_catalog_version(connection):
+    """
+    Increment the catalog version, and with it the content version, so in-process catalog copies reload.
+
+    Args:
+        connection (Connection): Open SQLAlchemy connection, inside the sync transaction.
+
+    Returns:
+        int: The new catalog version.
+    """
+    return connection.execute(text('''
+        UPDATE catalog_version
+        SET version = version + 1, content_version = content_version + 1, updated_at = now()
+        RETURNING version
+    ''')).scalar()
+
+def bump_content_version(connection):
+    """
+    Increment only the content version, after property JSON changed in fields nothing is ranked on.
+
+    Snapshots and KNN indexes are kept; property details, the search index and ETags are refreshed.
+
+    Args:
+        connection (Connection): Open SQLAlchemy connection, inside the write transaction.
+
+    Returns:
+        int: The new content version.
+    """
+    return connection.execute(text('''
+        UPDATE catalog_version SET content_version = content_version + 1, updated_at = now() RETURNING content_version
+    ''')).scalar()
+
+def sync_rental_units(engine, property_ids=None):
+    """
+    Rebuild the `rental_units` rows from the `properties` JSON.
+
+    Args:
+        engine (Engine): SQLAlchemy engine for the catalog database.
+        property_ids (list of str, optional): Only re-project these properties. When omitted
+                                              the whole table is rebuilt.
+
+    Returns:
+        int: Number of unit rows written.
+    """
+    with engine.begin() as connection:
+        return project_rental_units(connection, property_ids)
+
+def project_rental_units(connection, property_ids=None):
+    """
+    `sync_rental_units` inside the caller's transaction, so the projection commits together with
+    the `properties` writes it follows from.
+
+    Args:
+        connection (Connection): Open SQLAlchemy connection, inside a transaction.
+        property_ids (list of str, optional): Only re-project these properties. When omitted
+                                              the whole table is rebuilt.
+
+    Returns:
+        int: Number of unit rows written.
+    """
+    create_rental_units_table(connection)
+
+    if property_ids is None:
+        connection.execute(text('TRUNCATE rental_units'))
+        result = connection.execute(text(SYNC_RENTAL_UNITS_SQL.format(property_filter='')))
+    else:
+        params = {'property_ids': list(property_ids)}
+        connection.execute(text('DELETE FROM rental_units WHERE property_id = ANY(:property_ids)'), params)
+        result = connection.execute(
+            text(SYNC_RENTAL_UNITS_SQL.format(property_filter='AND p.id = ANY(:property_ids)')),
+            params,
+        )
+
+    bump_catalog_version(connection)
+
+    return result.rowcount
+
+if __name__ == '__main__':
+    config = {
+        **dotenv_values(".env"),  # load development variables
+        **os.environ,  # override loaded values with environment variables
+    }
+
+    engine = create_engine(config['SQLALCHEMY_DATABASE_URL'])
+    print(f'Synced {sync_rental_units(engine)} rental unit rows')
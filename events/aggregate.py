@@ -0,0 +1,119 @@
+from contextlib import closing
+from events.backfill import backfill
+from events.profiles import UserProfileStore
+from events.sources import open_store, partition_hours_before, partition_of
+from events.stream import iter_events
+import argparse
+import os
+import time
+
+# Hours of partitions before the watermark that are still listed, for objects Firehose delivers
+# late into an older hour (e.g. after delivery retries).
+LATE_ARRIVAL_HOURS = 24
+
+class IncrementalAggregator:
+    """
+    Fold new event objects into a persisted UserProfileStore.
+
+    The checkpoint saved with the store is a ledger of processed object keys plus a watermark,
+    the newest partition seen. Each run lists only partitions from `grace_hours` before the
+    watermark onwards and skips keys already in the ledger, so only new objects are parsed,
+    including objects delivered late into a partition that is no longer the newest. Keys of
+    partitions older than that window are dropped from the ledger; objects arriving there later
+    than the window are not picked up.
+    """
+
+    def __init__(self, store, state_path='user_profiles.npz', checkpoint_every=100, grace_hours=LATE_ARRIVAL_HOURS):
+        self.store = store
+        self.state_path = state_path
+        self.checkpoint_every = checkpoint_every
+        self.grace_hours = grace_hours
+
+        if os.path.exists(state_path):
+            self.profiles, checkpoint = UserProfileStore.load(state_path)
+        else:
+            self.profiles, checkpoint = UserProfileStore(), {}
+
+        self.watermark = checkpoint.get('watermark')
+        self.processed = set(checkpoint.get('processed', []))
+
+    def list_start(self):
+        """
+        Oldest partition still listed: `grace_hours` before the watermark, or None before the first run.
+        """
+        return partition_hours_before(self.watermark, self.grace_hours) if self.watermark else None
+
+    def pending_keys(self):
+        """
+        Object keys not yet folded into the profiles, in partition order.
+        """
+        return [key for key in self.store.list_keys(since=self.list_start()) if key not in self.processed]
+
+    def run(self, keys=None, workers=1):
+        """
+        Process pending objects and save the profiles with an updated checkpoint.
+
+        Args:
+            keys (list of str, optional): Objects to process. Defaults to `pending_keys()`.
+            workers (int): Worker processes. Above 1, objects are aggregated in parallel with
+                `events.backfill.backfill` and the checkpoint is saved once at the end.
+
+        Returns:
+            dict: Number of objects and events processed and the elapsed seconds.
+        """
+        start = time.perf_counter()
+        keys = self.pending_keys() if keys is None else keys
+        n_events = 0
+
+        if workers > 1:
+            _, n_events = backfill(self.store, keys, workers, self.profiles)
+            for key in keys:
+                self.mark_processed(key)
+            self.save()
+            return {'objects': len(keys), 'events': n_events, 'seconds': time.perf_counter() - start}
+
+        for i, key in enumerate(keys, 1):
+            with closing(self.store.open(key)) as body:
+                for event in iter_events(body):
+                    self.profiles.add_event(event)
+                    n_events += 1
+            self.mark_processed(key)
+
+            if i % self.checkpoint_every == 0:
+                self.save()
+
+        self.save()
+        return {'objects': len(keys), 'events': n_events, 'seconds': time.perf_counter() - start}
+
+    def mark_processed(self, key):
+        self.processed.add(key)
+        partition = partition_of(key)
+        if self.watermark is None or partition > self.watermark:
+            self.watermark = partition
+
+    def checkpoint(self):
+        start = self.list_start()
+        processed = sorted(key for key in self.processed if partition_of(key) >= start) if start else []
+        return {'watermark': self.watermark, 'processed': processed}
+
+    def save(self):
+        checkpoint = self.checkpoint()
+        self.processed = set(checkpoint['processed'])
+        self.profiles.save(self.state_path, checkpoint)
+
+def main():
+    parser = argparse.ArgumentParser(description='Fold new analytics event objects into the saved user profiles.')
+    parser.add_argument('source', help='Event store: a local directory laid out as YYYY/MM/DD/HH/<object>, or s3://bucket.')
+    parser.add_argument('--state', default='user_profiles.npz', help='Profile state and checkpoint file.')
+    parser.add_argument('--profile', default=None, help='AWS profile for s3:// sources.')
+    parser.add_argument('--workers', type=int, default=1, help='Worker processes for backfilling many objects.')
+    parser.add_argument('--grace-hours', type=int, default=LATE_ARRIVAL_HOURS, help='Hours of partitions before the watermark re-listed for late objects.')
+    args = parser.parse_args()
+
+    aggregator = IncrementalAggregator(open_store(args.source, args.profile), args.state, grace_hours=args.grace_hours)
+    stats = aggregator.run(workers=args.workers)
+    print(f"Processed {stats['objects']} objects, {stats['events']} events in {stats['seconds']:.2f}s; "
+          f"{len(aggregator.profiles)} users, watermark {aggregator.watermark}")
+
+if __name__ == '__main__':
+    main()
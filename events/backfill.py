@@ -0,0 +1,79 @@
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from events.profiles import UserProfileStore
+from events.stream import iter_events
+import os
+
+def aggregate_objects(store, keys):
+    """
+    Map step: aggregate a batch of event objects into a partial UserProfileStore.
+
+    Args:
+        store: Object store the keys belong to.
+        keys (list of str): Objects to parse.
+
+    Returns:
+        tuple: (partial UserProfileStore, number of events).
+    """
+    profiles = UserProfileStore()
+    n_events = 0
+    for key in keys:
+        with closing(store.open(key)) as body:
+            for event in iter_events(body):
+                profiles.add_event(event)
+                n_events += 1
+    return profiles, n_events
+
+def batches(keys, n_batches):
+    """
+    Split keys into at most n_batches contiguous runs of near-equal length.
+    """
+    n_batches = max(1, min(n_batches, len(keys)))
+    size, extra = divmod(len(keys), n_batches)
+    start = 0
+    for i in range(n_batches):
+        end = start + size + (i < extra)
+        yield keys[start:end]
+        start = end
+
+def backfill(store, keys, workers=None, profiles=None, batches_per_worker=4):
+    """
+    Aggregate many event objects across a process pool.
+
+    Keys are split into contiguous batches that workers aggregate independently. The partial
+    stores are merged in batch order, not completion order, so the result is the same as
+    aggregating the keys serially, whatever the number of workers.
+
+    Args:
+        store: Object store the keys belong to. Must be picklable.
+        keys (list of str): Objects to parse, in the order they should be applied.
+        workers (int, optional): Worker processes. Defaults to the CPU count; 1 runs in-process.
+        profiles (UserProfileStore, optional): Store to merge into. A new one is created when omitted.
+        batches_per_worker (int): Batches queued per worker, to even out uneven object sizes.
+
+    Returns:
+        tuple: (UserProfileStore, number of events).
+    """
+    workers = workers or os.cpu_count() or 1
+    profiles = profiles if profiles is not None else UserProfileStore()
+    key_batches = list(batches(keys, workers * batches_per_worker))
+    stores = [store] * len(key_batches)
+
+    if workers == 1:
+        return merge_partials(profiles, map(aggregate_objects, stores, key_batches))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return merge_partials(profiles, pool.map(aggregate_objects, stores, key_batches))
+
+def merge_partials(profiles, results):
+    """
+    Reduce step: merge (partial store, event count) results into profiles, in order.
+
+    Returns:
+        tuple: (UserProfileStore, number of events).
+    """
+    n_events = 0
+    for partial, count in results:
+        profiles.merge(partial)
+        n_events += count
+    return profiles, n_events
@@ -0,0 +1,293 @@
+import json
+import numpy as np
+import os
+
+SAVE_ACTION = 'SAVE_APARTMENT'
+
+# Property attributes summed per user so preference averages can be derived without the raw events.
+FEATURES = ('rent', 'squareFeet', 'rating')
+
+def event_fields(event):
+    """
+    Pull the fields aggregated per user out of an analytics event.
+
+    Returns:
+        tuple: (user_id, property_id, action, time_spent, feature values or None).
+    """
+    apartment = event.get('apartmentProperty') or {}
+    try:
+        time_spent = int(event.get('metrics', {}).get('totalTime', 0))
+    except (TypeError, ValueError):
+        time_spent = 0
+
+    values = []
+    for feature in FEATURES:
+        try:
+            values.append(float(apartment.get(feature)))
+        except (TypeError, ValueError):
+            values.append(None)
+
+    return event.get('userId', 'unknown'), apartment.get('propertyId', 'N/A'), event.get('type'), time_spent, values
+
+def bit_indices(bits):
+    """
+    Indices of the set bits of an int, lowest first.
+    """
+    indices = []
+    while bits:
+        low = bits & -bits
+        indices.append(low.bit_length() - 1)
+        bits ^= low
+    return indices
+
+class UserProfileStore:
+    """
+    Per-user interaction aggregates in columnar form.
+
+    Users and properties are interned to dense indices. Per user it keeps event and time totals,
+    running sums and counts of FEATURES, and bitsets of viewed and saved properties (Python ints,
+    bit i = property index i). Time spent per (user, property) is a sparse table of three parallel
+    arrays. Nothing per event is retained, so state grows with users x properties touched, not
+    with event volume.
+    """
+
+    def __init__(self):
+        self.user_ids = []
+        self.property_ids = []
+        self.views = []
+        self.saves = []
+        self._users = {}
+        self._properties = {}
+        self._pairs = {}
+        self.n_pairs = 0
+
+        self.event_counts = np.zeros(0, dtype=np.int64)
+        self.total_time = np.zeros(0, dtype=np.int64)
+        self.feature_sums = np.zeros((0, len(FEATURES)), dtype=np.float64)
+        self.feature_counts = np.zeros((0, len(FEATURES)), dtype=np.int64)
+        self.pair_user = np.zeros(0, dtype=np.int32)
+        self.pair_property = np.zeros(0, dtype=np.int32)
+        self.pair_time = np.zeros(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def user_index(self, user_id):
+        index = self._users.get(user_id)
+        if index is None:
+            index = self._users[user_id] = len(self.user_ids)
+            self.user_ids.append(user_id)
+            self.views.append(0)
+            self.saves.append(0)
+            if index == len(self.event_counts):
+                capacity = max(64, 2 * index)
+                self.event_counts = grow(self.event_counts, capacity)
+                self.total_time = grow(self.total_time, capacity)
+                self.feature_sums = grow(self.feature_sums, capacity)
+                self.feature_counts = grow(self.feature_counts, capacity)
+        return index
+
+    def property_index(self, property_id):
+        index = self._properties.get(property_id)
+        if index is None:
+            index = self._properties[property_id] = len(self.property_ids)
+            self.property_ids.append(property_id)
+        return index
+
+    def pair_row(self, user, prop):
+        key = (user, prop)
+        row = self._pairs.get(key)
+        if row is None:
+            row = self._pairs[key] = self.n_pairs
+            if row == len(self.pair_user):
+                capacity = max(256, 2 * row)
+                self.pair_user = grow(self.pair_user, capacity)
+                self.pair_property = grow(self.pair_property, capacity)
+                self.pair_time = grow(self.pair_time, capacity)
+            self.pair_user[row] = user
+            self.pair_property[row] = prop
+            self.n_pairs += 1
+        return row
+
+    def add_event(self, event):
+        """
+        Fold one analytics event into the aggregates.
+
+        Args:
+            event (dict): Decoded Firehose event.
+        """
+        user_id, property_id, action, time_spent, values = event_fields(event)
+        user = self.user_index(user_id)
+        prop = self.property_index(property_id)
+
+        row = self.pair_row(user, prop)
+        self.pair_time[row] += time_spent
+        self.event_counts[user] += 1
+        self.total_time[user] += time_spent
+        for i, value in enumerate(values):
+            if value is not None:
+                self.feature_sums[user, i] += value
+                self.feature_counts[user, i] += 1
+
+        self.views[user] |= 1 << prop
+        if action == SAVE_ACTION:
+            self.saves[user] |= 1 << prop
+
+    def merge(self, other):
+        """
+        Add another store's aggregates into this one.
+
+        Users and properties new to this store are appended in the other store's order, so merging
+        the same partial stores in the same order always gives the same result.
+
+        Args:
+            other (UserProfileStore): Aggregates to add.
+        """
+        users = [self.user_index(user_id) for user_id in other.user_ids]
+        props = [self.property_index(property_id) for property_id in other.property_ids]
+        if not users:
+            return
+
+        n = len(other)
+        self.event_counts[users] += other.event_counts[:n]
+        self.total_time[users] += other.total_time[:n]
+        self.feature_sums[users] += other.feature_sums[:n]
+        self.feature_counts[users] += other.feature_counts[:n]
+
+        # Every event touches a (user, property) pair and sets its view bit, so the other store's
+        # view bitsets are exactly its pairs and are rebuilt from them here.
+        rows = []
+        for user, prop in zip(other.pair_user[:other.n_pairs].tolist(), other.pair_property[:other.n_pairs].tolist()):
+            user, prop = users[user], props[prop]
+            rows.append(self.pair_row(user, prop))
+            self.views[user] |= 1 << prop
+        np.add.at(self.pair_time, rows, other.pair_time[:other.n_pairs])
+
+        for i, user in enumerate(users):
+            if other.saves[i]:
+                self.saves[user] |= remap_bits(other.saves[i], props)
+
+    def profile(self, user_id):
+        """
+        Aggregates of one user in the shape `event_parser.py` works with.
+
+        Returns:
+            dict: `property_time_spent`, `viewed_properties`, `saved_properties`, `events`,
+            `total_time` and `feature_means`, or None for an unknown user.
+        """
+        user = self._users.get(user_id)
+        if user is None:
+            return None
+
+        return self._profile(user, np.flatnonzero(self.pair_user[:self.n_pairs] == user))
+
+    def to_profiles(self):
+        """
+        All users' aggregates, keyed by user id.
+        """
+        order = np.argsort(self.pair_user[:self.n_pairs], kind='stable')
+        bounds = np.searchsorted(self.pair_user[:self.n_pairs][order], np.arange(len(self) + 1))
+        return {
+            user_id: self._profile(user, order[bounds[user]:bounds[user + 1]])
+            for user, user_id in enumerate(self.user_ids)
+        }
+
+    def _profile(self, user, rows):
+        counts = self.feature_counts[user]
+        return {
+            'property_time_spent': {
+                self.property_ids[self.pair_property[row]]: int(self.pair_time[row]) for row in rows
+            },
+            'viewed_properties': [self.property_ids[i] for i in bit_indices(self.views[user])],
+            'saved_properties': [self.property_ids[i] for i in bit_indices(self.saves[user])],
+            'events': int(self.event_counts[user]),
+            'total_time': int(self.total_time[user]),
+            'feature_means': {
+                feature: float(self.feature_sums[user, i] / counts[i]) if counts[i] else None
+                for i, feature in enumerate(FEATURES)
+            },
+        }
+
+    def save(self, path, metadata=None):
+        """
+        Write the store to a single `.npz` file, replacing it atomically.
+
+        Args:
+            path (str): Output file.
+            metadata (dict, optional): JSON-serialisable data stored alongside, e.g. a checkpoint.
+        """
+        n = len(self)
+        width = (len(self.property_ids) + 7) // 8
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(
+                f,
+                meta=np.array(json.dumps({
+                    'user_ids': self.user_ids,
+                    'property_ids': self.property_ids,
+                    'metadata': metadata or {},
+                })),
+                event_counts=self.event_counts[:n],
+                total_time=self.total_time[:n],
+                feature_sums=self.feature_sums[:n],
+                feature_counts=self.feature_counts[:n],
+                views=pack_bitsets(self.views, width),
+                saves=pack_bitsets(self.saves, width),
+                pair_user=self.pair_user[:self.n_pairs],
+                pair_property=self.pair_property[:self.n_pairs],
+                pair_time=self.pair_time[:self.n_pairs],
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read a store written by `save`.
+
+        Returns:
+            tuple: (UserProfileStore, metadata dict).
+        """
+        store = cls()
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            store.user_ids = meta['user_ids']
+            store.property_ids = meta['property_ids']
+            store._users = {user_id: i for i, user_id in enumerate(store.user_ids)}
+            store._properties = {property_id: i for i, property_id in enumerate(store.property_ids)}
+
+            store.event_counts = data['event_counts'].copy()
+            store.total_time = data['total_time'].copy()
+            store.feature_sums = data['feature_sums'].copy()
+            store.feature_counts = data['feature_counts'].copy()
+            store.views = unpack_bitsets(data['views'])
+            store.saves = unpack_bitsets(data['saves'])
+
+            store.pair_user = data['pair_user'].copy()
+            store.pair_property = data['pair_property'].copy()
+            store.pair_time = data['pair_time'].copy()
+            store.n_pairs = len(store.pair_user)
+            store._pairs = {
+                (int(user), int(prop)): row for row, (user, prop) in enumerate(zip(store.pair_user, store.pair_property))
+            }
+
+        return store, meta['metadata']
+
+def grow(array, capacity):
+    grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+def remap_bits(bits, mapping):
+    remapped = 0
+    for i in bit_indices(bits):
+        remapped |= 1 << int(mapping[i])
+    return remapped
+
+def pack_bitsets(bitsets, width):
+    packed = np.zeros((len(bitsets), width), dtype=np.uint8)
+    for i, bits in enumerate(bitsets):
+        packed[i] = np.frombuffer(bits.to_bytes(width, 'little'), dtype=np.uint8)
+    return packed
+
+def unpack_bitsets(packed):
+    return [int.from_bytes(row.tobytes(), 'little') for row in packed]
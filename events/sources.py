@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+import boto3
+import os
+
+# Firehose writes objects under `YYYY/MM/DD/HH/` prefixes of the delivery bucket.
+PARTITION_DEPTH = 4
+
+def partition_of(key):
+    """
+    Partition (`YYYY/MM/DD/HH`) of an event object key.
+    """
+    return '/'.join(key.split('/')[:PARTITION_DEPTH])
+
+def partition_hours_before(partition, hours):
+    """
+    The partition `hours` hours before a `YYYY/MM/DD/HH` partition.
+    """
+    return (datetime.strptime(partition, '%Y/%m/%d/%H') - timedelta(hours=hours)).strftime('%Y/%m/%d/%H')
+
+class LocalObjectStore:
+    """
+    Event objects in a local directory laid out like the event bucket (`<root>/YYYY/MM/DD/HH/<object>`).
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def list_keys(self, since=None):
+        """
+        List object keys in partition order.
+
+        Args:
+            since (str, optional): Skip partitions older than this one.
+
+        Returns:
+            generator: Object keys, sorted.
+        """
+        yield from self._walk('', 0, since)
+
+    def _walk(self, prefix, depth, since):
+        path = os.path.join(self.root, prefix)
+        for name in sorted(os.listdir(path)):
+            key = f'{prefix}{name}'
+            if depth < PARTITION_DEPTH:
+                # Prune whole years, days or hours that sort before the checkpoint.
+                if since is not None and key < since[:len(key)]:
+                    continue
+                if os.path.isdir(os.path.join(path, name)):
+                    yield from self._walk(f'{key}/', depth + 1, since)
+            elif os.path.isfile(os.path.join(path, name)):
+                yield key
+
+    def open(self, key):
+        return open(os.path.join(self.root, key), 'rb')
+
+class S3ObjectStore:
+    """
+    Event objects in the S3 event bucket.
+    """
+
+    def __init__(self, bucket, profile_name=None):
+        self.bucket = bucket
+        self.profile_name = profile_name
+        self.s3 = boto3.Session(profile_name=profile_name).client('s3')
+
+    def __getstate__(self):
+        # Clients cannot be pickled; backfill workers create their own.
+        return {'bucket': self.bucket, 'profile_name': self.profile_name}
+
+    def __setstate__(self, state):
+        self.__init__(state['bucket'], state['profile_name'])
+
+    def list_keys(self, since=None):
+        """
+        List object keys in partition order.
+
+        Args:
+            since (str, optional): Skip partitions older than this one.
+
+        Returns:
+            generator: Object keys, sorted.
+        """
+        params = {'Bucket': self.bucket}
+        if since is not None:
+            params['StartAfter'] = since
+        for page in self.s3.get_paginator('list_objects_v2').paginate(**params):
+            for item in page.get('Contents', []):
+                yield item['Key']
+
+    def open(self, key):
+        return self.s3.get_object(Bucket=self.bucket, Key=key)['Body']
+
+def open_store(location, profile_name=None):
+    """
+    Object store for an `s3://bucket` URL or a local directory.
+    """
+    if location.startswith('s3://'):
+        return S3ObjectStore(location[len('s3://'):].strip('/'), profile_name)
+    return LocalObjectStore(location)
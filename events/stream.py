@@ -0,0 +1,99 @@
+import codecs
+import json
+import re
+
+# Firehose writes records back to back with no delimiter (or with whitespace in between), so a
+# record boundary is a closing brace followed by an opening one. The comma allows reading the
+# elements of a JSON array of objects the same way.
+OBJECT_BOUNDARY = re.compile(r'\}\s*,?\s*\{')
+WHITESPACE = re.compile(r'\s*')
+
+class ConcatenatedJSONReader:
+    """
+    Incrementally decode concatenated JSON objects from a chunked stream.
+
+    The stream is anything with `read(size)` returning bytes or str: an S3 `StreamingBody`, a
+    local file or an `io.StringIO`. Only the unconsumed tail of the current chunk is kept in
+    memory, so memory is bounded by `chunk_size + max_event_size` and each byte is decoded once.
+
+    A top-level JSON array of objects reads the same way: the brackets and commas between
+    elements are skipped like stray bytes between records.
+
+    A record that does not decode is skipped by resyncing to the next object boundary. Because a
+    decode error may only mean the record continues in the next chunk, a record is declared bad
+    once the stream ends or `max_event_size` characters have been buffered without completing it.
+    """
+
+    def __init__(self, stream, chunk_size=1 << 20, max_event_size=1 << 20):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.max_event_size = max_event_size
+        self.skipped = 0
+        self._decoder = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+    def __iter__(self):
+        buffer = ''
+        pos = 0
+        eof = False
+        resyncing = False
+
+        while True:
+            if resyncing:
+                match = OBJECT_BOUNDARY.search(buffer, pos)
+                if match is not None:
+                    pos = match.end() - 1
+                    resyncing = False
+                    continue
+                else:
+                    # Keep the last character: it may be the closing brace of a boundary that
+                    # spans two chunks.
+                    pos = max(pos, len(buffer) - 1)
+            else:
+                pos = WHITESPACE.match(buffer, pos).end()
+                if pos < len(buffer) and buffer[pos] != '{':
+                    # Stray bytes between records; the next opening brace starts a record.
+                    start = buffer.find('{', pos)
+                    pos = start if start != -1 else len(buffer)
+
+                if pos < len(buffer):
+                    try:
+                        obj, end = self._decoder.raw_decode(buffer, pos)
+                    except json.JSONDecodeError:
+                        if eof or len(buffer) - pos >= self.max_event_size:
+                            self.skipped += 1
+                            pos += 1
+                            resyncing = True
+                            continue
+                    else:
+                        pos = end
+                        if isinstance(obj, dict):
+                            yield obj
+                        else:
+                            self.skipped += 1
+                        continue
+
+            if eof:
+                return
+
+            data = self.stream.read(self.chunk_size)
+            eof = not data
+            if isinstance(data, bytes):
+                data = self._utf8.decode(data, final=eof)
+
+            buffer = buffer[pos:] + data
+            pos = 0
+
+def iter_events(stream, chunk_size=1 << 20, max_event_size=1 << 20):
+    """
+    Yield events from a stream of concatenated JSON objects, skipping malformed records.
+
+    Args:
+        stream: Object with `read(size)` returning bytes or str.
+        chunk_size (int): Bytes read per call.
+        max_event_size (int): Longest record, in characters, before an undecodable record is skipped.
+
+    Returns:
+        generator: Event dicts, in stream order.
+    """
+    return iter(ConcatenatedJSONReader(stream, chunk_size, max_event_size))
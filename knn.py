@@ -4,112 +4,101 @@ from sklearn.pipeline import Pipeline
 from sklearn.neighbors import NearestNeighbors
 from sklearn.impute import SimpleImputer
 import pandas as pd
-from flask import Flask, request, jsonify
-from supabase import create_client, Client
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine
+import argparse
+import glob
+import hashlib
+import json
 import os
 from dotenv import dotenv_values
 from joblib import dump
+from catalog.units import get_catalog_version
+from recs.knn_index import FEATURE_COLUMNS, CompactPreprocessor, KNNServingIndex, campus_properties, feature_row, load_properties
 
-config = {
-    **dotenv_values(".env"),  # load development variables
-    **os.environ,  # override loaded values with environment variables
-}
+# Bump when the features or the training pipeline change, so the same inputs get a new version.
+TRAINING_FORMAT = 1
 
-supabase = create_client(config['SUPABASE_URL'], config['SUPABASE_KEY'])
-engine = create_engine(config['SQLALCHEMY_DATABASE_URL'])
+CATEGORICAL_FEATURES = ['details']
+NUMERICAL_FEATURES = ['rent', 'squareFeet', 'walkScore', 'rating', 'latitude', 'longitude']
 
-def get_recs_query_v2(prefs, user_id):
+def load_property_files(paths):
     """
-    Generate and execute a raw SQL query to find property recommendations based on user preferences.
+    Read properties from scraper dumps or database exports.
+
+    Scraper dumps (`dataset_apartments-scraper_*.json`) are JSON arrays of property objects.
+    Database exports are JSON arrays or JSON lines of `{"id": ..., "data": {...}}` rows of the
+    `properties` table.
 
     Args:
-        prefs (dict): User preferences including filters for campus name, maximum rent, and minimum square footage.
+        paths (list of str): Input files.
 
     Returns:
-        list of dicts: List of properties with details.
+        list of tuples: (property_id, property_data) pairs, in file order.
     """
-    query = text(f'''
-        SELECT
-            p.id AS property_id,
-            p.data AS property_data,
-            rental_object,
-            CASE WHEN ua.rental_key IS NOT NULL
-                THEN 1
-                ELSE 0
-            END AS isSaved
-        FROM
-            properties p,
-            jsonb_array_elements(p.data->'schools'->'colleges') AS c(college)
-        CROSS JOIN LATERAL
-            jsonb_array_elements(p.data->'rentals') AS rental_object
-        LEFT JOIN
-            user_apartment ua ON CAST(rental_object->>'key' AS VARCHAR) = ua.rental_key AND ua.user_id = '{user_id}'
-        WHERE
-            c.college @> '{{"name": "{prefs.get("campus", "Texas A&M University")}"}}'
-            AND (rental_object->>'rent')::int <= {prefs.get("max_rent", 10000)}
-            AND (rental_object->>'squareFeet')::int >= {prefs.get("min_sqft", 0)}
-    ''')
-    
-    with engine.connect() as connection:
-        result = connection.execute(query).fetchall()
-
-    data = []
-    for row in result:
-        row_data = {
-            "property_id": row[0],
-            "property_data": row[1],
-            "rental_object": row[2],
-            "isSaved": bool(row[3]),
-        }
-        data.append(row_data)
-
-    return data
-
-
-def get_prefs_query(id):
+    properties = []
+    for path in paths:
+        with open(path) as f:
+            if path.endswith('.jsonl') or path.endswith('.ndjson'):
+                items = [json.loads(line) for line in f if line.strip()]
+            else:
+                items = json.load(f)
+
+        for item in items:
+            if 'data' in item and 'rentals' not in item:
+                properties.append((item['id'], item['data']))
+            else:
+                properties.append((item['id'], item))
+
+    return properties
+
+def build_training_rows(properties):
     """
-	Retrieve user preferences from the Supabase 'User' table by user ID.
-
-	Args:
-    	id (int): User ID.
-
-	Returns:
-    	dict: User preferences stored in the database.
-	"""
-    result = supabase.table("User").select("preferences").eq("id", id).execute()
-
-    preferences = result.data[0]['preferences']
-
-    return preferences
-
+    Flatten properties into one feature row per rental.
 
+    Args:
+        properties (list of tuples): (property_id, property_data) pairs, e.g. from `campus_properties`.
 
-def knn_recommender(data, save_model=False):
+    Returns:
+        tuple: (rental keys, feature rows), aligned.
+    """
+    keys = []
+    rows = []
+    for _, property_data in properties:
+        for rental_object in property_data.get('rentals', []):
+            if rental_object.get('key') is None:
+                continue
+            keys.append(rental_object['key'])
+            rows.append(feature_row(property_data, rental_object))
+
+    return keys, rows
+
+def knn_recommender(rows):
+    """
+    Fit the preprocessor and the nearest-neighbour model on feature rows.
 
-    property_data = pd.DataFrame(data)
-    # print(property_data.info())
-    
-    property_data['rating'].fillna(property_data['rating'].mean(), inplace=True)
-    property_data['details'] = property_data['details'].apply(lambda x: ', '.join(x))
+    Args:
+        rows (list of dicts): Rows with FEATURE_COLUMNS.
 
-    categorical_features = ['details']
-    numerical_features = ['rent', 'squareFeet', 'walkScore', 'rating', 'latitude', 'longitude']
+    Returns:
+        tuple: (fitted ColumnTransformer, fitted NearestNeighbors).
+    """
+    property_data = pd.DataFrame(rows, columns=FEATURE_COLUMNS)
+    property_data['rating'] = property_data['rating'].fillna(property_data['rating'].mean())
 
     numerical_transformer = Pipeline(steps=[
-        ('imputer', SimpleImputer(strategy='mean')),  
+        ('imputer', SimpleImputer(strategy='mean')),
         ('scaler', StandardScaler())
     ])
 
     categorical_transformer = Pipeline(steps=[
-        ('imputer', SimpleImputer(strategy='constant', fill_value='missing')),  
+        ('imputer', SimpleImputer(strategy='constant', fill_value='missing')),
         ('onehot', OneHotEncoder(handle_unknown='ignore'))
     ])
 
     preprocessor = ColumnTransformer(
         transformers=[
-            ('num', numerical_transformer, numerical_features),
-            ('cat', categorical_transformer, categorical_features)
+            ('num', numerical_transformer, NUMERICAL_FEATURES),
+            ('cat', categorical_transformer, CATEGORICAL_FEATURES)
         ]
     )
 
@@ -118,41 +107,125 @@ def knn_recommender(data, save_model=False):
     knn = NearestNeighbors(n_neighbors=20, algorithm='ball_tree')
     knn.fit(X)
 
-    if save_model:
-        dump(preprocessor, 'preprocessor.joblib')
-        dump(knn, 'knn_model.joblib')
-
-prefs = get_prefs_query('user_2d3jvU6lHeJc1cSDkB7GVx7QpqB')
-recs = get_recs_query_v2(prefs, 'user_2d3jvU6lHeJc1cSDkB7GVx7QpqB')
-simplified_recs = []
-for rec in recs:
-    price = rec['property_data']['models'][0].get('rentLabel', 'N/A')
-    price_cleaned = price.replace('/ Person', '').strip()
-    simplified_rec = {
-        'propertyId': rec['property_id'],
-        'key': rec['rental_object'].get('key', 'N/A'),  # Set default as 'N/A' if key is missing
-        'name': rec['property_data'].get('propertyName', 'N/A'),
-        'modelName': rec['rental_object'].get('modelName', 'N/A'),
-        'rent': rec['rental_object'].get('rent', 0),  # Default rent as 0 if missing
-        'modelImage': rec['rental_object'].get('image', 'N/A'),
-        'address': rec['property_data']['location'].get('fullAddress', 'N/A'),
-        'latitude': rec['property_data']['coordinates'].get('latitude', 0),  # Default to 0 if missing
-        'longitude': rec['property_data']['coordinates'].get('longitude', 0),
-        'walkScore': rec['property_data']['scores'].get('walkScore', 0),
-        'price': price_cleaned,
-        'photos': rec['property_data'].get('photos', []),
-        'details': rec['rental_object'].get('details', {}),
-        'squareFeet': rec['rental_object'].get('squareFeet', 0),
-        'availableDate': rec['rental_object'].get('availableDate', 'N/A'),
-        'isNew': rec['rental_object'].get('isNew', False),
-        'features': rec['rental_object'].get('interiorAmenities', []),
-        'rating': rec['property_data'].get('rating', 0),
-        'hasKnownAvailabilities': rec['rental_object'].get('hasKnownAvailabilities', False),
-        'isSaved': rec['isSaved'],
+    return preprocessor, knn
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def input_checksum(properties, campus):
+    digest = hashlib.sha256()
+    digest.update(json.dumps({'training_format': TRAINING_FORMAT, 'campus': campus}).encode('utf-8'))
+    for property_id, property_data in properties:
+        digest.update(json.dumps([property_id, property_data], sort_keys=True, separators=(',', ':')).encode('utf-8'))
+    return digest.hexdigest()
+
+def train(properties, output_dir='artifacts', campus=None, catalog_version=None):
+    """
+    Train and write a versioned set of artifacts.
+
+    The version is derived from a checksum of the inputs and training options, so retraining on
+    the same data reproduces the same version directory. Artifacts are written to
+    `<output_dir>/<version>/` and `<output_dir>/LATEST` is pointed at it last.
+
+    Args:
+        properties (list of tuples): (property_id, property_data) pairs.
+        output_dir (str): Artifact root directory.
+        campus (str, optional): Only train on properties near this campus.
+        catalog_version (int, optional): Catalog version the properties correspond to, stamped on the serving index.
+                                         Without it, the serving registry rebuilds the index for
+                                         the current catalog in the background once it is loaded.
+
+    Returns:
+        dict: The written manifest.
+    """
+    checksum = input_checksum(properties, campus)
+
+    # The serving index is built from the same properties the model is fit on.
+    properties = campus_properties(properties, campus)
+    keys, rows = build_training_rows(properties)
+    if not rows:
+        raise ValueError('No rentals to train on')
+
+    version = checksum[:16]
+    artifact_dir = os.path.join(output_dir, version)
+    os.makedirs(artifact_dir, exist_ok=True)
+
+    preprocessor, knn = knn_recommender(rows)
+    dump(preprocessor, os.path.join(artifact_dir, 'preprocessor.joblib'))
+    dump(knn, os.path.join(artifact_dir, 'knn_model.joblib'))
+    KNNServingIndex.build(properties, CompactPreprocessor.from_sklearn(preprocessor), catalog_version).save(
+        os.path.join(artifact_dir, 'knn_index')
+    )
+
+    with open(os.path.join(artifact_dir, 'row_keys.json'), 'w') as f:
+        json.dump(keys, f)
+
+    files = {}
+    for root, _, names in os.walk(artifact_dir):
+        for name in sorted(names):
+            if name == 'manifest.json':
+                continue
+            path = os.path.join(root, name)
+            files[os.path.relpath(path, artifact_dir)] = file_checksum(path)
+
+    manifest = {
+        'version': version,
+        'training_format': TRAINING_FORMAT,
+        'input_checksum': checksum,
+        'catalog_version': catalog_version,
+        'campus': campus,
+        'n_properties': len(properties),
+        'n_rows': len(rows),
+        'feature_schema': {
+            'numerical': NUMERICAL_FEATURES,
+            'categorical': CATEGORICAL_FEATURES,
+            'n_features': CompactPreprocessor.from_sklearn(preprocessor).n_features,
+        },
+        'row_keys': 'row_keys.json',
+        'files': dict(sorted(files.items())),
     }
-    simplified_recs.append(simplified_rec)
+    with open(os.path.join(artifact_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
 
-def get_simplified_recs():
-    return pd.DataFrame(simplified_recs)
+    latest = os.path.join(output_dir, 'LATEST')
+    with open(latest + '.tmp', 'w') as f:
+        f.write(version)
+    os.replace(latest + '.tmp', latest)
+
+    return manifest
+
+def get_config():
+    return {
+        **dotenv_values(".env"),  # load development variables
+        **os.environ,  # override loaded values with environment variables
+    }
 
-knn_recommender(simplified_recs, prefs)
\ No newline at end of file
+def main():
+    parser = argparse.ArgumentParser(description='Train the apartment KNN model and write versioned artifacts.')
+    parser.add_argument('inputs', nargs='*', help='Scraper dumps or properties exports (.json/.jsonl). Defaults to dataset_apartments-scraper_*.json.')
+    parser.add_argument('--from-db', action='store_true', help='Read properties from SQLALCHEMY_DATABASE_URL instead of files.')
+    parser.add_argument('--output', default='artifacts', help='Artifact root directory.')
+    parser.add_argument('--campus', default=None, help='Only train on properties near this campus.')
+    parser.add_argument('--catalog-version', type=int, default=None, help='Catalog version the inputs correspond to. Read from the database with --from-db.')
+    args = parser.parse_args()
+
+    catalog_version = args.catalog_version
+    if args.from_db:
+        engine = create_engine(get_config()['SQLALCHEMY_DATABASE_URL'])
+        if catalog_version is None:
+            # Read before the properties, so the stamp is never newer than the data.
+            with engine.connect() as connection:
+                catalog_version = get_catalog_version(connection)
+        properties = load_properties(engine)
+    else:
+        properties = load_property_files(args.inputs or sorted(glob.glob('dataset_apartments-scraper_*.json')))
+
+    manifest = train(properties, args.output, args.campus, catalog_version)
+    print(f"Trained version {manifest['version']} on {manifest['n_rows']} rentals from {manifest['n_properties']} properties")
+
+if __name__ == '__main__':
+    main()
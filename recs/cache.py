@@ -0,0 +1,328 @@
+from collections import OrderedDict
+import hashlib
+import json
+import math
+import threading
+import time
+import numpy as np
+
+try:
+    import redis
+except ImportError:  # the shared backend is optional
+    redis = None
+
+def prefs_hash(prefs):
+    """
+    Stable hash of a preferences dict, used in cache keys.
+
+    Args:
+        prefs (dict): User preferences.
+
+    Returns:
+        str: Hex digest.
+    """
+    return hashlib.sha1(json.dumps(prefs, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+def entry_size(entry):
+    """
+    Approximate bytes held by a cache entry: array buffers, plus a flat allowance per other value
+    and per item of a list or set.
+    """
+    size = 0
+    for value in entry.values():
+        if isinstance(value, np.ndarray):
+            size += value.nbytes
+        elif isinstance(value, (list, set, tuple)):
+            size += 64 * (len(value) + 1)
+        else:
+            size += 64
+    return size
+
+def encode_entry(entry):
+    """
+    Serialize an entry for Redis: a JSON header line with the plain fields and the dtype and
+    length of each array, followed by the raw array buffers.
+    """
+    arrays = [(name, value) for name, value in entry.items() if isinstance(value, np.ndarray)]
+    header = {
+        'fields': {name: value for name, value in entry.items() if not isinstance(value, np.ndarray)},
+        'arrays': [[name, value.dtype.str, len(value)] for name, value in arrays],
+    }
+    return b''.join([json.dumps(header).encode('utf-8'), b'\n'] + [np.ascontiguousarray(value).tobytes() for _, value in arrays])
+
+def decode_entry(payload):
+    """
+    Inverse of `encode_entry`. Arrays are read-only views of the payload.
+    """
+    newline = payload.index(b'\n')
+    header = json.loads(payload[:newline])
+    entry = header['fields']
+    offset = newline + 1
+    for name, dtype, length in header['arrays']:
+        dtype = np.dtype(dtype)
+        entry[name] = np.frombuffer(payload, dtype=dtype, count=length, offset=offset)
+        offset += dtype.itemsize * length
+    return entry
+
+class LocalBackend:
+    """
+    Bounded in-process LRU with a per-entry TTL.
+
+    Bounded by entry count and, when `max_bytes` is set, by the `entry_size` of the entries.
+    Entries are stored by reference and must not be modified once set.
+    """
+
+    def __init__(self, max_entries=1024, ttl=300, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+
+            expires, _, entry = item
+            if expires < time.monotonic():
+                self._discard(key)
+                return None
+
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        size = entry_size(entry) if self.max_bytes is not None else 0
+        with self._lock:
+            if key in self._entries:
+                self._discard(key)
+            self._entries[key] = (time.monotonic() + self.ttl, size, entry)
+            self.size += size
+
+            while len(self._entries) > self.max_entries or (self.max_bytes is not None and self.size > self.max_bytes):
+                oldest = next(iter(self._entries))
+                self._discard(oldest)
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._discard(key)
+
+    def _discard(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.size -= size
+
+class RedisBackend:
+    """
+    Shared backend so every worker serves pages from the same ranking. Entries are stored in the
+    `encode_entry` format, so rankings are read as arrays without parsing a list per page.
+    """
+
+    def __init__(self, url, ttl=300, prefix='oc:ranked:'):
+        if redis is None:
+            raise RuntimeError('The redis package is required for the shared ranked-result cache')
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        payload = self.client.get(self.prefix + key)
+        return decode_entry(payload) if payload is not None else None
+
+    def set(self, key, entry):
+        self.client.set(self.prefix + key, encode_entry(entry), ex=self.ttl)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+class RankedResultCache:
+    """
+    Caches the top of the ranking for a (user, preferences hash, campus) so that recommendation
+    pages are slices of one ranking instead of a new scoring pass each.
+
+    A ranking entry holds `user_id`, the catalog `version` it was ranked against, and parallel
+    `units` (int32 snapshot unit indices) and `scores` (float64, -inf ranks last) arrays in rank
+    order. Only the first `depth` units are kept; `complete` tells whether that is all of them.
+    Unit indices are only meaningful for the snapshot of `version`, which every worker loads in
+    the same order.
+
+    The user's saved keys are cached separately, one small entry per user together with the user
+    state version (`recs.versions`) they were read at, so saving an apartment drops that entry
+    without touching the rankings.
+    """
+
+    def __init__(self, backend, depth=500):
+        self.backend = backend
+        self.depth = depth
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Build the cache from app config.
+
+        Uses Redis when RANKED_CACHE_REDIS_URL is set, otherwise an in-process LRU bounded by
+        RANKED_CACHE_SIZE entries and RANKED_CACHE_BYTES bytes. Entries expire after
+        RANKED_CACHE_TTL seconds. Rankings are cut at RANKED_CACHE_DEPTH units.
+
+        Args:
+            config (dict): App configuration.
+
+        Returns:
+            RankedResultCache: The configured cache.
+        """
+        ttl = int(config.get('RANKED_CACHE_TTL', 300))
+        depth = int(config.get('RANKED_CACHE_DEPTH', 500))
+        if config.get('RANKED_CACHE_REDIS_URL'):
+            return cls(RedisBackend(config['RANKED_CACHE_REDIS_URL'], ttl=ttl), depth)
+
+        backend = LocalBackend(
+            max_entries=int(config.get('RANKED_CACHE_SIZE', 1024)),
+            ttl=ttl,
+            max_bytes=int(config.get('RANKED_CACHE_BYTES', 32 << 20)),
+        )
+        return cls(backend, depth)
+
+    @staticmethod
+    def cache_key(user_id, prefs):
+        return f'{user_id}:{prefs_hash(prefs)}:{prefs.get("campus", "Texas A&M University")}'
+
+    @staticmethod
+    def saved_key(user_id):
+        return f'saved:{user_id}'
+
+    def get(self, user_id, prefs, version):
+        """
+        Look up the ranking for a user and preferences.
+
+        Args:
+            user_id (str): User ID.
+            prefs (dict): User preferences.
+            version (int): Current catalog version. Entries ranked against another version are ignored.
+
+        Returns:
+            dict or None: The cached entry.
+        """
+        entry = self.backend.get(self.cache_key(user_id, prefs))
+        if entry is None or entry['version'] != version:
+            return None
+
+        return entry
+
+    def put(self, user_id, prefs, version, units, scores):
+        """
+        Store the top of a ranking.
+
+        Args:
+            user_id (str): User ID.
+            prefs (dict): User preferences the ranking was computed for.
+            version (int): Catalog version the ranking was computed against.
+            units (numpy.ndarray): Snapshot unit indices in rank order, at most `depth` of them
+                                   (e.g. `CatalogSnapshot.rank(prefs, cache.depth)`).
+            scores (numpy.ndarray): Scores aligned with `units`.
+
+        Returns:
+            dict: The stored entry.
+        """
+        entry = {
+            'user_id': user_id,
+            'version': version,
+            'complete': len(units) < self.depth,
+            'units': np.asarray(units[:self.depth], dtype=np.int32),
+            'scores': np.asarray(scores[:self.depth], dtype=np.float64),
+        }
+        self.backend.set(self.cache_key(user_id, prefs), entry)
+        return entry
+
+    def get_saved(self, user_id, user_version=None):
+        """
+        Look up the rental keys a user has saved.
+
+        Args:
+            user_id (str): User ID.
+            user_version (int, optional): Current user state version. When given, keys read at
+                                          another version are ignored.
+
+        Returns:
+            set of str or None: The saved keys.
+        """
+        entry = self.backend.get(self.saved_key(user_id))
+        if entry is None or (user_version is not None and entry['user_version'] != user_version):
+            return None
+
+        return set(entry['saved'])
+
+    def put_saved(self, user_id, saved_keys, user_version=None):
+        """
+        Store the rental keys a user has saved.
+
+        Args:
+            user_id (str): User ID.
+            saved_keys (iterable of str): Saved rental keys.
+            user_version (int, optional): User state version the keys were read at.
+        """
+        self.backend.set(self.saved_key(user_id), {'user_id': user_id, 'user_version': user_version, 'saved': sorted(saved_keys)})
+
+    def invalidate_saved(self, user_id):
+        """
+        Drop a user's cached saved keys after they save or remove an apartment.
+
+        Args:
+            user_id (str): User ID.
+        """
+        self.backend.delete(self.saved_key(user_id))
+
+def ranked_page(ranking, snapshot, prefs, page, limit, cursor=None):
+    """
+    Units and scores of one page of a cached ranking. Pages past the cached depth are ranked
+    again from the snapshot.
+
+    Args:
+        ranking (dict): Cached ranking from `RankedResultCache`.
+        snapshot (CatalogSnapshot): Snapshot of the ranking's catalog version.
+        prefs (dict): Preferences the ranking was computed for.
+        page (int): Page number. Ignored when a cursor is given.
+        limit (int): Number of items per page.
+        cursor (tuple, optional): Decoded (score, rental_key) position to resume after.
+
+    Returns:
+        tuple of numpy.ndarray: Unit indices and their scores.
+    """
+    start = position_after(ranking, cursor, snapshot) if cursor is not None else (page - 1) * limit
+    if start + limit <= len(ranking['units']) or ranking['complete']:
+        return ranking['units'][start:start + limit], ranking['scores'][start:start + limit]
+    if cursor is not None:
+        return snapshot.rank(prefs, limit, after=cursor)
+
+    units, scores = snapshot.rank(prefs, start + limit)
+    return units[start:], scores[start:]
+
+def score_values(scores):
+    """
+    Scores as JSON values: floats, with None for units that rank last.
+    """
+    return [float(score) if math.isfinite(score) else None for score in scores]
+
+def position_after(entry, cursor, snapshot):
+    """
+    Index of the first ranked unit after a cursor position.
+
+    Args:
+        entry (dict): Cached ranking.
+        cursor (tuple): Decoded (score, rental_key).
+        snapshot (CatalogSnapshot): Snapshot of the entry's catalog version, for rental key order.
+
+    Returns:
+        int: Position in `entry['units']`.
+    """
+    score, rental_key = cursor
+    if score is None:
+        score = -np.inf
+
+    key_position = np.searchsorted(snapshot.sorted_keys, rental_key, side='right')
+    scores = entry['scores']
+    ranked_before = (scores > score) | ((scores == score) & (snapshot.key_order[entry['units']] < key_position))
+    return int(np.count_nonzero(ranked_before))
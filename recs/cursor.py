@@ -0,0 +1,44 @@
+import base64
+import json
+import math
+
+def encode_cursor(score, rental_key):
+    """
+    Encode the position of the last recommendation on a page into an opaque cursor.
+
+    Args:
+        score (float or None): Weighted score of the last unit. None for units that sort last.
+        rental_key (str): Rental key of the last unit, used to break score ties.
+
+    Returns:
+        str: URL-safe cursor string.
+    """
+    if score is not None and not math.isfinite(score):
+        score = None
+
+    payload = json.dumps([score, rental_key], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor produced by `encode_cursor`.
+
+    Args:
+        cursor (str): Cursor string from a previous page.
+
+    Returns:
+        tuple: (score, rental_key).
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        score, rental_key = json.loads(payload)
+    except (TypeError, ValueError) as e:
+        raise ValueError('Invalid cursor') from e
+
+    if (score is not None and not isinstance(score, (int, float))) or not isinstance(rental_key, str):
+        raise ValueError('Invalid cursor')
+
+    return score, rental_key
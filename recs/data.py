@@ -0,0 +1,106 @@
+from sqlalchemy import text
+from recs.cache import LocalBackend
+
+# Preferences and saved keys in one statement over the pooled engine, instead of a Supabase
+# HTTP call followed by a separate query.
+USER_CONTEXT_SQL = text('''
+    SELECT
+        (SELECT preferences FROM "User" WHERE id = :user_id) AS preferences,
+        ARRAY(SELECT rental_key FROM user_apartment WHERE user_id = :user_id) AS saved_keys
+''')
+
+class UserContextLoader:
+    """
+    Loads what the recommendation endpoints need to know about a user.
+
+    Preferences are kept in a short-TTL LRU. Callers that change a user's preferences (or
+    anything else stored on the `User` row) must call `invalidate`. Callers that know the user's
+    state version (`recs.versions`) pass it to `load`, so preferences written elsewhere are
+    reloaded as soon as the version moves instead of when the entry expires.
+    """
+
+    def __init__(self, engine, prefs_ttl=60, max_entries=4096):
+        self.engine = engine
+        self.preferences = LocalBackend(max_entries=max_entries, ttl=prefs_ttl)
+
+    def load(self, user_id, version=None):
+        """
+        Get a user's preferences, and their saved rental keys when the preferences were not cached.
+
+        Args:
+            user_id (str): User ID.
+            version (int, optional): The user's state version, read before this call. Cached
+                                     preferences stored under another version are reloaded.
+
+        Returns:
+            tuple: (preferences dict, set of saved rental keys or None if the preferences came from the cache).
+
+        Raises:
+            LookupError: If the user has no preferences.
+        """
+        cached = self._cached(user_id, version)
+        if cached is not None:
+            return cached['preferences'], None
+
+        with self.engine.connect() as connection:
+            preferences, saved_keys = connection.execute(USER_CONTEXT_SQL, {'user_id': user_id}).one()
+
+        return self._store(user_id, version, preferences, saved_keys)
+
+    async def load_async(self, user_id, async_engine, version=None):
+        """
+        `load` over an async engine, for the async request path.
+
+        Args:
+            user_id (str): User ID.
+            async_engine (AsyncEngine): SQLAlchemy async engine for the catalog database.
+            version (int, optional): The user's state version, as for `load`.
+
+        Returns:
+            tuple: (preferences dict, set of saved rental keys or None if the preferences came from the cache).
+
+        Raises:
+            LookupError: If the user has no preferences.
+        """
+        cached = self._cached(user_id, version)
+        if cached is not None:
+            return cached['preferences'], None
+
+        async with async_engine.connect() as connection:
+            preferences, saved_keys = (await connection.execute(USER_CONTEXT_SQL, {'user_id': user_id})).one()
+
+        return self._store(user_id, version, preferences, saved_keys)
+
+    def _cached(self, user_id, version):
+        cached = self.preferences.get(user_id)
+        if cached is None or (version is not None and cached.get('version') != version):
+            return None
+        return cached
+
+    def _store(self, user_id, version, preferences, saved_keys):
+        if preferences is None:
+            raise LookupError(f'No preferences found for user {user_id}')
+
+        self.preferences.set(user_id, {'user_id': user_id, 'version': version, 'preferences': preferences})
+        return preferences, set(saved_keys)
+
+    def get_preferences(self, user_id):
+        """
+        Get a user's preferences, from the cache when possible.
+
+        Args:
+            user_id (str): User ID.
+
+        Returns:
+            dict: User preferences.
+        """
+        return self.load(user_id)[0]
+
+    def invalidate(self, user_id):
+        """
+        Drop a user's cached preferences.
+
+        Args:
+            user_id (str): User ID.
+        """
+        self.preferences.delete(user_id)
@@ -0,0 +1,205 @@
+from sqlalchemy import create_engine, text
+from recs.knn_index import feature_row
+from recs.neighbors import make_neighbors
+import numpy as np
+import os
+from dotenv import dotenv_values
+
+# Precomputed interaction-based recommendations, one row per user, written by the batch job
+# below and read by `/get_recommendations?mode=interactions` with a primary-key lookup.
+USER_RECOMMENDATIONS_DDL = '''
+    CREATE TABLE IF NOT EXISTS user_recommendations (
+        user_id VARCHAR PRIMARY KEY,
+        rental_keys VARCHAR[] NOT NULL,
+        scores REAL[] NOT NULL,
+        model_version VARCHAR,
+        catalog_version BIGINT,
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    );
+'''
+
+UPSERT_USER_RECOMMENDATIONS_SQL = text('''
+    INSERT INTO user_recommendations (user_id, rental_keys, scores, model_version, catalog_version, updated_at)
+    VALUES (:user_id, :rental_keys, :scores, :model_version, :catalog_version, now())
+    ON CONFLICT (user_id) DO UPDATE SET
+        rental_keys = EXCLUDED.rental_keys,
+        scores = EXCLUDED.scores,
+        model_version = EXCLUDED.model_version,
+        catalog_version = EXCLUDED.catalog_version,
+        updated_at = EXCLUDED.updated_at
+''')
+
+class RentalMatrix:
+    """
+    Every rental in the catalog in model space, plus each property's mean rental vector.
+    """
+
+    def __init__(self, properties, preprocessor):
+        rental_keys = []
+        rental_property = []
+        rows = []
+        property_ids = []
+        for property_id, property_data in properties:
+            rentals = [r for r in property_data.get('rentals', []) if r.get('key') is not None]
+            if not rentals:
+                continue
+            for rental_object in rentals:
+                rental_keys.append(rental_object['key'])
+                rental_property.append(len(property_ids))
+                rows.append(feature_row(property_data, rental_object))
+            property_ids.append(property_id)
+
+        self.rental_keys = np.array(rental_keys)
+        self.rental_property = np.array(rental_property, dtype=np.intp)
+        self.features = preprocessor.transform(rows)
+        self.property_ids = property_ids
+        self.property_index = {property_id: i for i, property_id in enumerate(property_ids)}
+
+        sums = np.zeros((len(property_ids), self.features.shape[1]), dtype=np.float64)
+        np.add.at(sums, self.rental_property, self.features)
+        counts = np.bincount(self.rental_property, minlength=len(property_ids))
+        self.property_features = (sums / np.maximum(counts, 1)[:, None]).astype(np.float32)
+
+def interaction_vectors(profiles, rentals):
+    """
+    Time-weighted mean property vector of every user with interactions on catalog properties.
+
+    The user x property time-spent table is joined to the property vectors in one indexed step:
+    the profile store's property ids are mapped to catalog rows once, then every (user, property)
+    pair gathers its row. Each interaction weighs 1 plus its time spent in seconds, so views
+    without a recorded duration still count.
+
+    Args:
+        profiles (UserProfileStore): Aggregated interactions.
+        rentals (RentalMatrix): Catalog in model space.
+
+    Returns:
+        tuple: (user ids, float32 matrix with one row per user).
+    """
+    catalog_row = np.array(
+        [rentals.property_index.get(property_id, -1) for property_id in profiles.property_ids],
+        dtype=np.intp,
+    )
+    pair_user = profiles.pair_user[:profiles.n_pairs]
+    pair_row = catalog_row[profiles.pair_property[:profiles.n_pairs]]
+    known = pair_row >= 0
+    pair_user = pair_user[known]
+    pair_row = pair_row[known]
+    weights = 1.0 + profiles.pair_time[:profiles.n_pairs][known] / 1000.0
+
+    sums = np.zeros((len(profiles), rentals.property_features.shape[1]), dtype=np.float64)
+    np.add.at(sums, pair_user, weights[:, None] * rentals.property_features[pair_row])
+    totals = np.bincount(pair_user, weights=weights, minlength=len(profiles))
+
+    users = np.flatnonzero(totals > 0)
+    vectors = (sums[users] / totals[users, None]).astype(np.float32)
+    return [profiles.user_ids[user] for user in users], vectors
+
+def recommend_for_users(profiles, properties, preprocessor, n_recommendations=50, batch_size=1024, backend='exact'):
+    """
+    Top rentals for every user, nearest to the properties they spent time on.
+
+    Args:
+        profiles (UserProfileStore): Aggregated interactions.
+        properties (iterable): (property_id, property_data) pairs of the catalog.
+        preprocessor (CompactPreprocessor): Preprocessor of the active model.
+        n_recommendations (int): Rentals kept per user.
+        batch_size (int): Users per `kneighbors` call.
+        backend (str): Nearest-neighbour backend from `recs.neighbors.BACKENDS`.
+
+    Returns:
+        generator: (user_id, rental keys, scores) per user, best first. Scores are 1 / (1 + distance).
+    """
+    rentals = RentalMatrix(properties, preprocessor)
+    if len(rentals.rental_keys) == 0:
+        return
+
+    user_ids, vectors = interaction_vectors(profiles, rentals)
+    model = make_neighbors(backend, n_rows=len(rentals.features)).fit(rentals.features)
+
+    for start in range(0, len(user_ids), batch_size):
+        distances, indices = model.kneighbors(vectors[start:start + batch_size], n_neighbors=n_recommendations)
+        scores = 1.0 / (1.0 + distances)
+        for i, user_id in enumerate(user_ids[start:start + batch_size]):
+            yield user_id, rentals.rental_keys[indices[i]].tolist(), scores[i].tolist()
+
+def write_user_recommendations(engine, recommendations, model_version=None, catalog_version=None, batch_size=1000):
+    """
+    Upsert precomputed recommendations into `user_recommendations`.
+
+    Args:
+        engine (Engine): SQLAlchemy engine for the catalog database.
+        recommendations (iterable): (user_id, rental keys, scores) tuples.
+        model_version (str, optional): Model the recommendations came from.
+        catalog_version (int, optional): Catalog version they were computed against.
+        batch_size (int): Rows per executemany batch.
+
+    Returns:
+        int: Number of users written.
+    """
+    written = 0
+    with engine.begin() as connection:
+        connection.execute(text(USER_RECOMMENDATIONS_DDL))
+
+        batch = []
+        for user_id, rental_keys, scores in recommendations:
+            batch.append({
+                'user_id': user_id,
+                'rental_keys': rental_keys,
+                'scores': scores,
+                'model_version': model_version,
+                'catalog_version': catalog_version,
+            })
+            if len(batch) == batch_size:
+                connection.execute(UPSERT_USER_RECOMMENDATIONS_SQL, batch)
+                written += len(batch)
+                batch = []
+
+        if batch:
+            connection.execute(UPSERT_USER_RECOMMENDATIONS_SQL, batch)
+            written += len(batch)
+
+    return written
+
+def get_user_recommendations(connection, user_id):
+    """
+    Read a user's precomputed recommendations.
+
+    Args:
+        connection (Connection): Open SQLAlchemy connection.
+        user_id (str): User ID.
+
+    Returns:
+        tuple: (rental keys, scores), or None when nothing was precomputed for the user.
+    """
+    row = connection.execute(
+        text('SELECT rental_keys, scores FROM user_recommendations WHERE user_id = :user_id'),
+        {'user_id': user_id},
+    ).one_or_none()
+    return None if row is None else (list(row[0]), list(row[1]))
+
+if __name__ == '__main__':
+    from catalog.units import get_catalog_version
+    from events.profiles import UserProfileStore
+    from recs.knn_index import load_properties
+    from recs.registry import ModelRegistry
+
+    config = {
+        **dotenv_values(".env"),  # load development variables
+        **os.environ,  # override loaded values with environment variables
+    }
+
+    engine = create_engine(config['SQLALCHEMY_DATABASE_URL'])
+    profiles, _ = UserProfileStore.load(config.get('PROFILE_STATE', 'user_profiles.npz'))
+    model = ModelRegistry(
+        engine,
+        artifact_dir=config.get('MODEL_ARTIFACT_DIR', 'artifacts'),
+        fallback_path=config.get('KNN_INDEX_PATH', 'knn_index'),
+    ).current()
+
+    with engine.connect() as connection:
+        catalog_version = get_catalog_version(connection)
+
+    recommendations = recommend_for_users(profiles, load_properties(engine), model.index.preprocessor, backend=config.get('KNN_BACKEND', 'exact'))
+    written = write_user_recommendations(engine, recommendations, model.version, catalog_version)
+    print(f'Wrote interaction recommendations for {written} users with model {model.version}')
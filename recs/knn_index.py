@@ -0,0 +1,381 @@
+from sqlalchemy import create_engine, text
+from recs.neighbors import make_neighbors
+import numpy as np
+import json
+import os
+from dotenv import dotenv_values
+
+# NumPy-only serving path for `/get_recommendations/v2`. The fitted sklearn preprocessor is
+# exported once into a flat directory (a JSON manifest plus .npy arrays) that is memory-mapped
+# at load, so neither sklearn nor pandas is imported on the request path.
+
+FORMAT_VERSION = 1
+FEATURE_COLUMNS = ['details', 'rent', 'squareFeet', 'walkScore', 'rating', 'latitude', 'longitude']
+
+def feature_row(property_data, rental_object):
+    """
+    Build the model features for one rental, with the same defaults `knn.py` trains with.
+
+    Args:
+        property_data (dict): Property JSON.
+        rental_object (dict): One entry of the property's `rentals`.
+
+    Returns:
+        dict: Values for FEATURE_COLUMNS.
+    """
+    return {
+        'details': ', '.join(rental_object.get('details', [])),
+        'rent': rental_object.get('rent', 0),
+        'squareFeet': rental_object.get('squareFeet', 0),
+        'walkScore': property_data.get('scores', {}).get('walkScore', 0),
+        'rating': property_data.get('rating', 0),
+        'latitude': property_data.get('coordinates', {}).get('latitude', 0),
+        'longitude': property_data.get('coordinates', {}).get('longitude', 0),
+    }
+
+def query_row(prefs):
+    """
+    Build the model features for a user's preferences.
+
+    Args:
+        prefs (dict): User preferences with `rent`, `squareFeet` and `details`.
+
+    Returns:
+        dict: Values for FEATURE_COLUMNS.
+    """
+    details = prefs.get("details")
+    if isinstance(details, list):
+        details = ', '.join(details)
+
+    return {
+        'details': details,
+        'rent': prefs.get("rent"),
+        'squareFeet': prefs.get("squareFeet"),
+        'walkScore': 40,
+        'rating': 4.2,
+        'latitude': 30.5,
+        'longitude': -96.3,
+    }
+
+class CompactPreprocessor:
+    """
+    The fitted `knn.py` ColumnTransformer reduced to its parameters: mean imputation and standard
+    scaling of the numeric columns, then a one-hot encoding of `details` that ignores unknown values.
+    """
+
+    def __init__(self, numeric_columns, impute, mean, scale, categorical_column, fill_value, vocabulary):
+        self.numeric_columns = list(numeric_columns)
+        self.impute = np.asarray(impute, dtype=np.float64)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.categorical_column = categorical_column
+        self.fill_value = fill_value
+        self.vocabulary = list(vocabulary)
+        self.category_index = {category: i for i, category in enumerate(self.vocabulary)}
+
+    @property
+    def n_features(self):
+        return len(self.numeric_columns) + len(self.vocabulary)
+
+    @classmethod
+    def from_sklearn(cls, preprocessor):
+        """
+        Extract the parameters of the fitted preprocessor saved by `knn.py`.
+
+        Args:
+            preprocessor (ColumnTransformer): Fitted preprocessor with `num` and `cat` transformers.
+
+        Returns:
+            CompactPreprocessor: Equivalent NumPy preprocessor.
+        """
+        columns = {name: columns for name, _, columns in preprocessor.transformers_}
+        numeric = preprocessor.named_transformers_['num'].named_steps
+        categorical = preprocessor.named_transformers_['cat'].named_steps
+
+        return cls(
+            numeric_columns=columns['num'],
+            impute=numeric['imputer'].statistics_,
+            mean=numeric['scaler'].mean_,
+            scale=numeric['scaler'].scale_,
+            categorical_column=columns['cat'][0],
+            fill_value=categorical['imputer'].fill_value,
+            vocabulary=[str(category) for category in categorical['onehot'].categories_[0]],
+        )
+
+    def to_dict(self):
+        return {
+            'numeric_columns': self.numeric_columns,
+            'impute': self.impute.tolist(),
+            'mean': self.mean.tolist(),
+            'scale': self.scale.tolist(),
+            'categorical_column': self.categorical_column,
+            'fill_value': self.fill_value,
+            'vocabulary': self.vocabulary,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def transform(self, rows):
+        """
+        Transform feature rows into model space.
+
+        Args:
+            rows (list of dicts): Rows with the preprocessor's columns.
+
+        Returns:
+            numpy.ndarray: float32 matrix of shape (len(rows), n_features).
+        """
+        numeric = np.array(
+            [[np.nan if row.get(column) is None else row[column] for column in self.numeric_columns] for row in rows],
+            dtype=np.float64,
+        ).reshape(len(rows), len(self.numeric_columns))
+        numeric = np.where(np.isnan(numeric), self.impute, numeric)
+
+        X = np.zeros((len(rows), self.n_features), dtype=np.float32)
+        X[:, :len(self.numeric_columns)] = (numeric - self.mean) / self.scale
+
+        for i, row in enumerate(rows):
+            category = row.get(self.categorical_column)
+            category = self.category_index.get(self.fill_value if category is None else category)
+            if category is not None:
+                X[i, len(self.numeric_columns) + category] = 1.0
+
+        return X
+
+class CampusPartition:
+    """
+    KNN index over every rental near one campus. Row i of the index is `rental_keys[i]`.
+    """
+
+    def __init__(self, rental_keys, rent, sqft, features, backend='exact'):
+        self.rental_keys = rental_keys
+        self.rent = rent
+        self.sqft = sqft
+        self.features = features
+        self.model = make_neighbors(backend, n_rows=len(features)).fit(features)
+
+    def __len__(self):
+        return len(self.rental_keys)
+
+class KNNServingIndex:
+    """
+    Per-campus nearest-neighbour indexes built from the full catalog with the exported preprocessor.
+
+    Exported at deploy time with `python -m recs.knn_index` (or by `knn.py` after training) and
+    memory-mapped at startup. When the catalog version moves on, the partitions are rebuilt from
+    the database with the same preprocessor.
+    """
+
+    def __init__(self, preprocessor, partitions, version=None):
+        self.preprocessor = preprocessor
+        self.partitions = partitions
+        self.version = version
+
+    @classmethod
+    def build(cls, properties, preprocessor, version=None, backend='exact'):
+        """
+        Build the index.
+
+        Args:
+            properties (iterable): (property_id, property_data) pairs.
+            preprocessor (CompactPreprocessor): Exported preprocessor.
+            version (int, optional): Catalog version the properties belong to.
+            backend (str): Nearest-neighbour backend from `recs.neighbors.BACKENDS`.
+
+        Returns:
+            KNNServingIndex: The built index.
+        """
+        campus_rows = {}
+        for _, property_data in properties:
+            colleges = property_data.get('schools', {}).get('colleges', [])
+            for rental_object in property_data.get('rentals', []):
+                if rental_object.get('key') is None:
+                    continue
+
+                row = feature_row(property_data, rental_object)
+                for college in colleges:
+                    campus_rows.setdefault(college.get('name'), []).append((rental_object['key'], row))
+
+        partitions = {}
+        for campus, rows in campus_rows.items():
+            keys, features = zip(*rows)
+            partitions[campus] = CampusPartition(
+                rental_keys=np.array(keys),
+                rent=np.array([np.nan if f['rent'] is None else f['rent'] for f in features], dtype=np.float32),
+                sqft=np.array([np.nan if f['squareFeet'] is None else f['squareFeet'] for f in features], dtype=np.float32),
+                features=preprocessor.transform(features),
+                backend=backend,
+            )
+
+        return cls(preprocessor, partitions, version)
+
+    def save(self, path):
+        """
+        Write the index as a manifest plus flat .npy arrays, partitions stored back to back.
+
+        Args:
+            path (str): Output directory.
+        """
+        os.makedirs(path, exist_ok=True)
+
+        campuses = {}
+        offset = 0
+        for campus, partition in self.partitions.items():
+            campuses[campus] = [offset, offset + len(partition)]
+            offset += len(partition)
+
+        partitions = list(self.partitions.values())
+        empty = np.empty((0, self.preprocessor.n_features), dtype=np.float32)
+        np.save(os.path.join(path, 'features.npy'), np.concatenate([p.features for p in partitions] or [empty]))
+        np.save(os.path.join(path, 'rent.npy'), np.concatenate([p.rent for p in partitions] or [np.empty(0, np.float32)]))
+        np.save(os.path.join(path, 'sqft.npy'), np.concatenate([p.sqft for p in partitions] or [np.empty(0, np.float32)]))
+        np.save(os.path.join(path, 'keys.npy'), np.concatenate([p.rental_keys.astype(str) for p in partitions] or [np.empty(0, str)]))
+
+        with open(os.path.join(path, 'manifest.json'), 'w') as f:
+            json.dump({
+                'format_version': FORMAT_VERSION,
+                'catalog_version': self.version,
+                'preprocessor': self.preprocessor.to_dict(),
+                'campuses': campuses,
+            }, f)
+
+    @classmethod
+    def load(cls, path, backend='exact'):
+        """
+        Memory-map an index written by `save`.
+
+        Args:
+            path (str): Index directory.
+            backend (str): Nearest-neighbour backend from `recs.neighbors.BACKENDS`.
+
+        Returns:
+            KNNServingIndex: The loaded index.
+        """
+        with open(os.path.join(path, 'manifest.json')) as f:
+            manifest = json.load(f)
+
+        if manifest['format_version'] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported KNN index format {manifest['format_version']} in {path}")
+
+        arrays = {
+            name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+            for name in ['features', 'rent', 'sqft', 'keys']
+        }
+
+        partitions = {}
+        for campus, (start, end) in manifest['campuses'].items():
+            partitions[campus] = CampusPartition(
+                rental_keys=arrays['keys'][start:end],
+                rent=arrays['rent'][start:end],
+                sqft=arrays['sqft'][start:end],
+                features=arrays['features'][start:end],
+                backend=backend,
+            )
+
+        return cls(CompactPreprocessor.from_dict(manifest['preprocessor']), partitions, manifest['catalog_version'])
+
+    def query(self, prefs, n_neighbors=20, allowed=None):
+        """
+        Find the rentals nearest to the user's preferences on their campus.
+
+        Neighbours are filtered to the campus, `max_rent`, `min_sqft` and preferred `rent` with a
+        vectorized mask. The index is searched wider than `n_neighbors` so the filter still leaves
+        a full page when possible.
+
+        Args:
+            prefs (dict): User preferences.
+            n_neighbors (int): Number of rentals to return.
+            allowed (numpy.ndarray, optional): Rental keys the results are restricted to, e.g. the
+                                               units passing amenity filters.
+
+        Returns:
+            list of str: Rental keys, nearest first.
+        """
+        partition = self.partitions.get(prefs.get("campus", "Texas A&M University"))
+        if partition is None or len(partition) == 0:
+            return []
+
+        max_rent = prefs.get("max_rent", 10000)
+        if prefs.get("rent") is not None:
+            max_rent = min(max_rent, prefs["rent"])
+
+        X = self.preprocessor.transform([query_row(prefs)])
+        k = min(len(partition), n_neighbors * 4)
+        while True:
+            _, indices = partition.model.kneighbors(X, n_neighbors=k)
+            indices = indices[0]
+            keep = (partition.rent[indices] <= max_rent) & (partition.sqft[indices] >= prefs.get("min_sqft", 0))
+            if allowed is not None:
+                keep &= np.isin(partition.rental_keys[indices], allowed)
+            if keep.sum() >= n_neighbors or k == len(partition):
+                break
+            k = min(len(partition), k * 4)
+
+        return [str(key) for key in partition.rental_keys[indices[keep][:n_neighbors]]]
+
+def campus_properties(properties, campus=None):
+    """
+    Keep the properties near a campus, the set a campus model is trained and served on.
+
+    Args:
+        properties (iterable): (property_id, property_data) pairs.
+        campus (str, optional): Campus name. All properties are kept when omitted.
+
+    Returns:
+        list of tuples: The matching (property_id, property_data) pairs.
+    """
+    if campus is None:
+        return list(properties)
+
+    return [
+        (property_id, property_data) for property_id, property_data in properties
+        if any(college.get('name') == campus for college in property_data.get('schools', {}).get('colleges', []))
+    ]
+
+def load_properties(engine):
+    """
+    Read every property's JSON.
+
+    Args:
+        engine (Engine): SQLAlchemy engine for the catalog database.
+
+    Returns:
+        list of tuples: (property_id, property_data) pairs.
+    """
+    with engine.connect() as connection:
+        return connection.execute(text('SELECT id, data FROM properties')).fetchall()
+
+def export_serving_index(engine, preprocessor, path='knn_index'):
+    """
+    Export a fitted sklearn preprocessor and the current catalog as a serving index.
+
+    Args:
+        engine (Engine): SQLAlchemy engine for the catalog database.
+        preprocessor (ColumnTransformer): Fitted preprocessor from `knn.py`.
+        path (str): Output directory.
+
+    Returns:
+        KNNServingIndex: The exported index.
+    """
+    from catalog.units import get_catalog_version
+
+    with engine.connect() as connection:
+        version = get_catalog_version(connection)
+
+    index = KNNServingIndex.build(load_properties(engine), CompactPreprocessor.from_sklearn(preprocessor), version)
+    index.save(path)
+    return index
+
+if __name__ == '__main__':
+    from joblib import load
+
+    config = {
+        **dotenv_values(".env"),  # load development variables
+        **os.environ,  # override loaded values with environment variables
+    }
+
+    engine = create_engine(config['SQLALCHEMY_DATABASE_URL'])
+    index = export_serving_index(engine, load('preprocessor.joblib'), config.get('KNN_INDEX_PATH', 'knn_index'))
+    print(f'Exported KNN serving index for {len(index.partitions)} campuses at catalog version {index.version}')
@@ -0,0 +1,163 @@
+import numpy as np
+
+# Nearest-neighbour backends for the KNN serving index. They all follow sklearn's
+# NearestNeighbors interface (`fit(X)`, `kneighbors(X, n_neighbors)` returning distances and
+# indices, nearest first), so callers can switch between exact and approximate search.
+
+class ExactNeighbors:
+    """
+    Brute-force Euclidean nearest neighbours.
+    """
+
+    def fit(self, X):
+        self._X = X
+        self._norms = np.einsum('ij,ij->i', X, X)
+        return self
+
+    def kneighbors(self, X, n_neighbors=5):
+        """
+        Find the nearest fitted rows.
+
+        Args:
+            X (numpy.ndarray): Query rows.
+            n_neighbors (int): Number of neighbours per query, capped at the number of fitted rows.
+
+        Returns:
+            tuple of numpy.ndarray: (distances, indices), each of shape (len(X), n_neighbors), nearest first.
+        """
+        X = np.asarray(X, dtype=np.float32)
+        k = min(n_neighbors, len(self._X))
+        d2 = self._norms[None, :] - 2 * (X @ self._X.T) + np.einsum('ij,ij->i', X, X)[:, None]
+        np.maximum(d2, 0, out=d2)
+
+        if k < d2.shape[1]:
+            indices = np.argpartition(d2, k - 1, axis=1)[:, :k]
+        else:
+            indices = np.tile(np.arange(d2.shape[1]), (len(X), 1))
+
+        order = np.argsort(np.take_along_axis(d2, indices, axis=1), axis=1, kind='stable')
+        indices = np.take_along_axis(indices, order, axis=1)
+        return np.sqrt(np.take_along_axis(d2, indices, axis=1)), indices
+
+class IVFNeighbors:
+    """
+    Approximate nearest neighbours with an inverted-file index.
+
+    Rows are clustered with k-means into `n_lists` lists (sqrt(n) by default). A query is compared
+    with the centroids and only the rows of the `n_probe` closest lists are searched exactly.
+    More probes trade speed for recall.
+    """
+
+    def __init__(self, n_lists=None, n_probe=8, n_iter=10, max_train_rows=65536, seed=0):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.n_iter = n_iter
+        self.max_train_rows = max_train_rows
+        self.seed = seed
+
+    def fit(self, X):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_lists = min(self.n_lists or max(1, int(np.sqrt(len(X)))), len(X))
+
+        rng = np.random.default_rng(self.seed)
+        sample = X
+        if len(X) > self.max_train_rows:
+            sample = X[rng.choice(len(X), self.max_train_rows, replace=False)]
+
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+        for _ in range(self.n_iter):
+            assignment = nearest_centroids(sample, centroids)
+            counts = np.bincount(assignment, minlength=n_lists)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+
+        assignment = nearest_centroids(X, centroids)
+        self.centroids = centroids
+        self.order = np.argsort(assignment, kind='stable')
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=n_lists))])
+        self._X = X[self.order]
+        self._norms = np.einsum('ij,ij->i', self._X, self._X)
+        return self
+
+    def kneighbors(self, X, n_neighbors=5):
+        """
+        Find approximate nearest fitted rows.
+
+        Args:
+            X (numpy.ndarray): Query rows.
+            n_neighbors (int): Number of neighbours per query, capped at the number of fitted rows.
+
+        Returns:
+            tuple of numpy.ndarray: (distances, indices), each of shape (len(X), n_neighbors), nearest first.
+        """
+        X = np.asarray(X, dtype=np.float32)
+        k = min(n_neighbors, len(self._X))
+        list_sizes = np.diff(self.offsets)
+        probe_order = np.argsort(squared_distances(X, self.centroids), axis=1)
+
+        distances = np.empty((len(X), k), dtype=np.float32)
+        indices = np.empty((len(X), k), dtype=np.intp)
+        for i, query in enumerate(X):
+            # Probe n_probe lists, or more when those lists hold fewer than k rows.
+            covered = np.cumsum(list_sizes[probe_order[i]])
+            n_probe = max(min(self.n_probe, len(self.centroids)), int(np.searchsorted(covered, k)) + 1)
+            rows = np.concatenate([
+                np.arange(self.offsets[l], self.offsets[l + 1]) for l in probe_order[i, :n_probe]
+            ])
+
+            d2 = self._norms[rows] - 2 * (self._X[rows] @ query) + query @ query
+            top = np.argpartition(d2, k - 1)[:k] if k < len(rows) else np.arange(len(rows))
+            top = top[np.argsort(d2[top], kind='stable')]
+            distances[i] = np.sqrt(np.maximum(d2[top], 0))
+            indices[i] = self.order[rows[top]]
+
+        return distances, indices
+
+def squared_distances(X, Y):
+    """
+    Pairwise squared Euclidean distances between the rows of X and Y.
+    """
+    d2 = np.einsum('ij,ij->i', X, X)[:, None] - 2 * (X @ Y.T) + np.einsum('ij,ij->i', Y, Y)[None, :]
+    return np.maximum(d2, 0)
+
+def nearest_centroids(X, centroids, batch_size=65536):
+    """
+    Index of the nearest centroid for each row of X, computed in batches to bound memory.
+    """
+    if len(X) == 0:
+        return np.empty(0, dtype=np.intp)
+
+    return np.concatenate([
+        np.argmin(squared_distances(X[start:start + batch_size], centroids), axis=1)
+        for start in range(0, len(X), batch_size)
+    ])
+
+BACKENDS = {
+    'exact': ExactNeighbors,
+    'ivf': IVFNeighbors,
+}
+
+# Partitions smaller than this are always searched exactly; the ANN index would not pay for itself.
+MIN_ANN_ROWS = 4096
+
+def make_neighbors(backend='exact', n_rows=None, **params):
+    """
+    Create an unfitted nearest-neighbour backend.
+
+    Args:
+        backend (str): One of BACKENDS.
+        n_rows (int, optional): Number of rows it will be fitted on. Small inputs fall back to exact search.
+        **params: Backend options, e.g. `n_probe` for 'ivf'.
+
+    Returns:
+        object: Backend with `fit` and `kneighbors`.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f'Unknown nearest-neighbour backend {backend!r}')
+
+    if n_rows is not None and n_rows < MIN_ANN_ROWS:
+        return ExactNeighbors()
+
+    return BACKENDS[backend](**params)
@@ -0,0 +1,182 @@
+from recs.knn_index import KNNServingIndex, campus_properties, load_properties
+from datetime import datetime, timezone
+import json
+import os
+import threading
+import time
+import traceback
+
+class ModelVersion:
+    """
+    One loaded model: its artifact version, serving index and when it was loaded.
+    """
+
+    def __init__(self, version, index, loaded_at, manifest=None):
+        self.version = version
+        self.index = index
+        self.loaded_at = loaded_at
+        self.manifest = manifest
+
+    def to_dict(self):
+        return {
+            'version': self.version,
+            'loadedAt': self.loaded_at.isoformat(),
+            'catalogVersion': self.index.version,
+            'campuses': sorted(self.index.partitions),
+        }
+
+class ModelRegistry:
+    """
+    Serves the active KNN model and hot-swaps it when a new version is published.
+
+    Versions come from the artifact directory written by `knn.py` (`<artifact_dir>/LATEST` naming
+    `<artifact_dir>/<version>/knn_index`). Without a LATEST file, the exported index at
+    `fallback_path` is served as a fixed version.
+
+    `LATEST` is checked at most every `poll_interval` seconds from the request path. A new version
+    is loaded in a background thread and swapped in with a single reference assignment, so
+    requests that already hold the previous model finish with it. Serving indexes are rebuilt for
+    a new catalog version the same way, while requests keep using the current index. One
+    background load or rebuild runs at a time, and `_active` is only replaced under `_lock`. A
+    rebuild that failed is not retried for the same catalog version until `poll_interval` seconds
+    have passed, so a broken catalog read does not turn into back-to-back full reloads.
+    """
+
+    def __init__(self, engine, artifact_dir='artifacts', fallback_path='knn_index', backend='exact', poll_interval=30):
+        self.engine = engine
+        self.artifact_dir = artifact_dir
+        self.fallback_path = fallback_path
+        self.backend = backend
+        self.poll_interval = poll_interval
+        self._active = None
+        self._last_poll = 0.0
+        self._loading = None
+        self._failed_rebuild = None
+        self._lock = threading.Lock()
+
+    def current(self):
+        """
+        Return the active model, loading the first one synchronously and scheduling a check for a newer one.
+
+        Returns:
+            ModelVersion: The active model.
+        """
+        if self._active is None:
+            with self._lock:
+                if self._active is None:
+                    version, path = self._published()
+                    self._active = self._load(version, path)
+                    self._last_poll = time.monotonic()
+
+        if time.monotonic() - self._last_poll >= self.poll_interval:
+            self.poll()
+
+        return self._active
+
+    def index_for(self, catalog_version):
+        """
+        Return the active serving index, starting a background rebuild when it is for another catalog version.
+
+        Until the rebuild is swapped in, the current index keeps being served; callers drop
+        recommended keys that are not in their catalog snapshot.
+
+        Args:
+            catalog_version (int): Current catalog version.
+
+        Returns:
+            KNNServingIndex: The serving index.
+        """
+        active = self.current()
+        if active.index.version != catalog_version and not self._backing_off(catalog_version):
+            with self._lock:
+                self._start(self._rebuild, catalog_version)
+
+        return active.index
+
+    def poll(self):
+        """
+        Start loading the published version in the background if it differs from the active one.
+        """
+        with self._lock:
+            self._last_poll = time.monotonic()
+            version, path = self._published()
+            if self._active is not None and version == self._active.version:
+                return
+
+            self._start(self._swap, version, path)
+
+    def _backing_off(self, catalog_version):
+        failed = self._failed_rebuild
+        return (
+            failed is not None and failed[0] == catalog_version
+            and time.monotonic() - failed[1] < self.poll_interval
+        )
+
+    def _start(self, target, *args):
+        # Called with `_lock` held. A job already running wins; the next request retries.
+        if self._loading is not None and self._loading.is_alive():
+            return
+
+        self._loading = threading.Thread(target=target, args=args, name='model-load', daemon=True)
+        self._loading.start()
+
+    def _rebuild(self, catalog_version):
+        try:
+            active = self._active
+            if active.index.version == catalog_version:
+                return
+
+            model = self._build(active, catalog_version)
+            with self._lock:
+                # Only replace the model the index was rebuilt for; a newer one may have been swapped in.
+                if self._active is active:
+                    self._active = model
+                self._failed_rebuild = None
+            print(f'Rebuilt serving index of model version {active.version} for catalog version {catalog_version}')
+        except Exception:
+            traceback.print_exc()
+            with self._lock:
+                self._failed_rebuild = (catalog_version, time.monotonic())
+
+    def _swap(self, version, path):
+        try:
+            model = self._load(version, path)
+
+            # Bring the new model up to the catalog being served before it takes traffic.
+            serving_catalog = self._active.index.version if self._active is not None else None
+            if serving_catalog is not None and model.index.version != serving_catalog:
+                model = self._build(model, serving_catalog)
+
+            with self._lock:
+                self._active = model
+            print(f'Swapped in model version {version}')
+        except Exception:
+            traceback.print_exc()
+
+    def _build(self, model, catalog_version):
+        # A campus model is served on the same properties it was trained on.
+        campus = model.manifest.get('campus') if model.manifest else None
+        properties = campus_properties(load_properties(self.engine), campus)
+        index = KNNServingIndex.build(properties, model.index.preprocessor, catalog_version, self.backend)
+        return ModelVersion(model.version, index, model.loaded_at, model.manifest)
+
+    def _published(self):
+        try:
+            with open(os.path.join(self.artifact_dir, 'LATEST')) as f:
+                version = f.read().strip()
+        except FileNotFoundError:
+            return os.path.basename(os.path.normpath(self.fallback_path)), self.fallback_path
+
+        return version, os.path.join(self.artifact_dir, version, 'knn_index')
+
+    def _load(self, version, path):
+        # Only published versions have a manifest, next to their index; the fallback index has none.
+        manifest = None
+        version_dir = os.path.normpath(os.path.join(self.artifact_dir, version))
+        manifest_path = os.path.join(version_dir, 'manifest.json')
+        if os.path.normpath(os.path.dirname(path)) == version_dir and os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+
+        index = KNNServingIndex.load(path, self.backend)
+        return ModelVersion(version, index, datetime.now(timezone.utc), manifest)
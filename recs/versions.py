@@ -0,0 +1,122 @@
+from sqlalchemy import create_engine, text
+import hashlib
+import os
+from dotenv import dotenv_values
+
+# Per-user counter bumped by triggers whenever a user's saved apartments or `User` row change,
+# whoever writes them (this API, Supabase clients or the dashboard). Together with the catalog
+# content version it stamps everything a listing response depends on, so ETags can be derived from two
+# primary-key reads instead of running the recommendation query.
+USER_STATE_VERSION_DDL = '''
+    CREATE TABLE IF NOT EXISTS user_state_version (
+        user_id VARCHAR PRIMARY KEY,
+        version BIGINT NOT NULL DEFAULT 0
+    );
+
+    CREATE OR REPLACE FUNCTION bump_user_state_version() RETURNS trigger AS $$
+    DECLARE
+        changed_user VARCHAR;
+    BEGIN
+        IF TG_TABLE_NAME = 'User' THEN
+            changed_user := CASE WHEN TG_OP = 'DELETE' THEN OLD.id ELSE NEW.id END;
+        ELSE
+            changed_user := CASE WHEN TG_OP = 'DELETE' THEN OLD.user_id ELSE NEW.user_id END;
+        END IF;
+
+        INSERT INTO user_state_version (user_id, version) VALUES (changed_user, 1)
+        ON CONFLICT (user_id) DO UPDATE SET version = user_state_version.version + 1;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS user_apartment_state_version ON user_apartment;
+    CREATE TRIGGER user_apartment_state_version
+        AFTER INSERT OR UPDATE OR DELETE ON user_apartment
+        FOR EACH ROW EXECUTE FUNCTION bump_user_state_version();
+
+    DROP TRIGGER IF EXISTS user_state_version ON "User";
+    CREATE TRIGGER user_state_version
+        AFTER UPDATE OR DELETE ON "User"
+        FOR EACH ROW EXECUTE FUNCTION bump_user_state_version();
+'''
+
+VERSION_STAMPS_SQL = text('''
+    SELECT
+        (SELECT content_version FROM catalog_version) AS catalog_version,
+        (SELECT version FROM user_state_version WHERE user_id = :user_id) AS user_version
+''')
+
+VERSION_STAMPS_WITH_RECOMMENDATIONS_SQL = text('''
+    SELECT
+        (SELECT content_version FROM catalog_version) AS catalog_version,
+        (SELECT version FROM user_state_version WHERE user_id = :user_id) AS user_version,
+        (SELECT updated_at FROM user_recommendations WHERE user_id = :user_id) AS recommendations_updated_at
+''')
+
+def create_user_state_version_table(connection):
+    """
+    Create the `user_state_version` table and the triggers that maintain it if they do not exist.
+
+    Args:
+        connection (Connection): Open SQLAlchemy connection.
+    """
+    connection.execute(text(USER_STATE_VERSION_DDL))
+
+def get_version_stamps(engine, user_id, include_recommendations=False):
+    """
+    Read the version stamps a user's listing responses depend on, in one round trip.
+
+    Args:
+        engine (Engine): SQLAlchemy engine for the catalog database.
+        user_id (str): User ID.
+        include_recommendations (bool): Also stamp the user's precomputed interaction recommendations.
+
+    Returns:
+        tuple: Catalog content version, user state version (0 if never bumped) and, when requested, when
+               the user's precomputed recommendations were last written.
+    """
+    query = VERSION_STAMPS_WITH_RECOMMENDATIONS_SQL if include_recommendations else VERSION_STAMPS_SQL
+    with engine.connect() as connection:
+        row = connection.execute(query, {'user_id': user_id}).one()
+
+    return version_stamps(row, include_recommendations)
+
+async def get_version_stamps_async(async_engine, user_id, include_recommendations=False):
+    """
+    `get_version_stamps` over an async engine, for the async request path.
+    """
+    query = VERSION_STAMPS_WITH_RECOMMENDATIONS_SQL if include_recommendations else VERSION_STAMPS_SQL
+    async with async_engine.connect() as connection:
+        row = (await connection.execute(query, {'user_id': user_id})).one()
+
+    return version_stamps(row, include_recommendations)
+
+def version_stamps(row, include_recommendations):
+    catalog_version, user_version = row[0] or 0, row[1] or 0
+    if include_recommendations:
+        return catalog_version, user_version, row[2].isoformat() if row[2] is not None else None
+    return catalog_version, user_version
+
+def make_etag(*parts):
+    """
+    Derive an opaque ETag value from version stamps and request parameters.
+
+    Args:
+        *parts: Values identifying the response, e.g. endpoint, user, stamps and query arguments.
+
+    Returns:
+        str: ETag value, unquoted.
+    """
+    digest = hashlib.sha256(repr(parts).encode('utf-8')).hexdigest()
+    return digest[:32]
+
+if __name__ == '__main__':
+    config = {
+        **dotenv_values(".env"),  # load development variables
+        **os.environ,  # override loaded values with environment variables
+    }
+
+    engine = create_engine(config['SQLALCHEMY_DATABASE_URL'])
+    with engine.begin() as connection:
+        create_user_state_version_table(connection)
+    print('Created user_state_version and its triggers')
@@ -0,0 +1,54 @@
+from flask import Response
+from flask.json.provider import DefaultJSONProvider
+import orjson
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+# Same output as Flask's provider (sorted keys, dates/decimals/UUIDs via its default hook), but
+# encoded by orjson straight to bytes.
+ORJSON_OPTIONS = (
+    orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_DATETIME
+)
+
+def dumps_bytes(obj):
+    """
+    Encode a value as compact JSON bytes.
+    """
+    return orjson.dumps(obj, default=DefaultJSONProvider.default, option=ORJSON_OPTIONS)
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider that encodes with orjson, used by `jsonify` for every endpoint.
+
+    Calls that pass stdlib `json.dumps` options (e.g. `indent` in debug mode) fall back to the
+    default provider.
+    """
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return dumps_bytes(obj).decode('utf-8')
+
+    def response(self, *args, **kwargs):
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj) + b'\n', mimetype=self.mimetype)
+
+def ndjson_response(rows, headers=None):
+    """
+    Stream rows as newline-delimited JSON, one encoded row per chunk.
+
+    Args:
+        rows (iterable of dicts): Rows to send. Consumed lazily while the response is written.
+        headers (dict, optional): Extra response headers.
+
+    Returns:
+        Response: Streaming `application/x-ndjson` response.
+    """
+    def generate():
+        for row in rows:
+            yield dumps_bytes(row) + b'\n'
+
+    return Response(generate(), mimetype=NDJSON_MIMETYPE, headers=headers)